@@ -0,0 +1,125 @@
+"""
+    Benchmark of the read endpoints served through ASGI, with asynchronous views and with synchronous ones.
+
+    Each mode runs in its own process against its own database, seeded like the HTTP endpoint benchmark:
+    `ASYNC_VIEWS` on, where the views deriving from `AsyncAPIView` run on the event loop, then off, where
+    Django runs the same views on its thread like any synchronous view. Concurrent clients call every endpoint
+    through the ASGI handler, authenticated by token, for a fixed time; the benchmark reports requests per
+    second and p50/p99 latencies for both modes.
+
+    Usage:
+        python -m benchmarks.async_views [--concurrency 50] [--seconds 3] [--only course_list,chat_inbox]
+                                         [--students 500] [--courses 50] [--messages 50]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from .utils import setup_django
+
+MODES = {'async': True, 'sync': False}
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def endpoints(data):
+    """
+        Lists the benchmarked read requests as (name, path, user).
+    """
+    from django.urls import reverse
+
+    return [
+        ('course_list', reverse('course_list'), data['student']),
+        ('course_detail', reverse('course_detail', kwargs={'id': data['course'].pk}), data['teacher']),
+        ('chat_inbox', reverse('chat_inbox'), data['student']),
+        ('status_feed', reverse('status_feed'), data['student']),
+    ]
+
+
+async def load(client, path, token, concurrency, seconds):
+    """
+        Calls a path from `concurrency` clients for `seconds`, returning the latencies in milliseconds.
+    """
+    headers = {'Authorization': 'Token ' + token}
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError("{} returned {}".format(path, response.status_code))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def run_mode(mode, options, results):
+    from .http_endpoints import seed
+
+    setup_django(ASYNC_VIEWS=MODES[mode], DEBUG=False, ALLOWED_HOSTS=['testserver'], SQL_N_PLUS_ONE_THRESHOLD=0,
+                 PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+    from django.test import AsyncClient
+    from rest_framework.authtoken.models import Token
+
+    data = seed(options['students'], options['teachers'], options['courses'], options['messages'])
+    selected = set(options['only'].split(',')) if options['only'] else None
+    client = AsyncClient()
+
+    measurements = {}
+    for name, path, user in endpoints(data):
+        if selected is not None and name not in selected:
+            continue
+        token, _ = Token.objects.get_or_create(user=user)
+        # Warms up the URL resolver, the connections and the caches.
+        asyncio.run(load(client, path, token.key, 1, 0.2))
+        latencies = asyncio.run(load(client, path, token.key, options['concurrency'], options['seconds']))
+        measurements[name] = {
+            'rps': len(latencies) / options['seconds'],
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+        }
+
+    results.put((mode, measurements))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=50, help='number of concurrent clients')
+    parser.add_argument('--seconds', type=float, default=3, help='duration of the load on every endpoint')
+    parser.add_argument('--only', help='comma-separated names of the endpoints to run')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--teachers', type=int, default=20)
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=50, help='messages per chat room')
+    args = parser.parse_args()
+
+    measurements = {}
+    for mode in MODES:
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_mode, args=(mode, vars(args), results))
+        process.start()
+        _, measurements[mode] = results.get()
+        process.join()
+
+    print('{:<15} {:<6} {:>9} {:>9} {:>9}'.format('endpoint', 'mode', 'req/s', 'p50 ms', 'p99 ms'))
+    for name in measurements['async']:
+        for mode in MODES:
+            result = measurements[mode][name]
+            print('{:<15} {:<6} {:>9.1f} {:>9.2f} {:>9.2f}'.format(
+                name, mode, result['rps'], result['p50'], result['p99']))
+        print('{:<15} async/sync throughput: {:.2f}x'.format(
+            name, measurements['async'][name]['rps'] / measurements['sync'][name]['rps']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+    Benchmark of the channel layers usable by the chat consumers.
+
+    A sender broadcasts messages to a group whose members are spread over several receiver processes
+    and reports delivered messages per second and end-to-end latency percentiles. The in-memory layer
+    cannot cross processes, so its members all live in the sender's process; it is the single-process
+    upper bound the other layers are compared to. Redis is only measured when `channels_redis` is
+    installed and `--redis` points to a running server.
+
+    Usage:
+        python -m benchmarks.channel_layers [--processes 4] [--members 25] [--messages 2000]
+                                            [--redis redis://127.0.0.1:6379]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import tempfile
+import time
+
+GROUP = 'bench_group'
+
+
+def make_layer(kind, options):
+    """
+        Builds a channel layer of the given kind with a capacity large enough for the benchmark.
+    """
+    capacity = options['messages'] * 2
+    if kind == 'memory':
+        from channels.layers import InMemoryChannelLayer
+        return InMemoryChannelLayer(capacity=capacity)
+    if kind == 'unix':
+        from communications.layers import UnixSocketChannelLayer
+        return UnixSocketChannelLayer(path=options['path'], capacity=capacity)
+    if kind == 'redis':
+        from channels_redis.core import RedisChannelLayer
+        return RedisChannelLayer(hosts=[options['redis']], capacity=capacity)
+    raise ValueError(kind)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def receive_all(layer, channels, expected, idle_timeout=2.0):
+    """
+        Receives on every channel until `expected` messages arrived or the layer went idle.
+        Returns the latency, in milliseconds, of every received message and the wall time of the last one.
+    """
+    latencies = []
+    last_received = 0.0
+
+    async def consume(channel):
+        nonlocal last_received
+        for _ in range(expected):
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), idle_timeout)
+            except asyncio.TimeoutError:
+                return
+            last_received = time.time()
+            latencies.append((last_received - message['sent']) * 1000)
+
+    await asyncio.gather(*(consume(channel) for channel in channels))
+    return latencies, last_received
+
+
+def receiver_process(kind, options, ready, results):
+    async def run():
+        layer = make_layer(kind, options)
+        channels = [await layer.new_channel() for _ in range(options['members'])]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        ready.release()
+
+        results.put(await receive_all(layer, channels, options['messages']))
+        if hasattr(layer, 'close'):
+            await layer.close()
+
+    asyncio.run(run())
+
+
+async def send_all(layer, messages):
+    for index in range(messages):
+        await layer.group_send(GROUP, {'type': 'bench.message', 'sent': time.time(), 'index': index})
+        # Yields regularly so receivers sharing the CPU can drain their sockets.
+        if index % 50 == 0:
+            await asyncio.sleep(0.001)
+
+
+def run_single_process(options):
+    async def run():
+        layer = make_layer('memory', options)
+        channels = [await layer.new_channel()
+                    for _ in range(options['members'] * options['processes'])]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+
+        start = time.time()
+        receiving = asyncio.create_task(receive_all(layer, channels, options['messages'], 0.5))
+        await send_all(layer, options['messages'])
+        latencies, last_received = await receiving
+        return latencies, last_received - start
+
+    return asyncio.run(run())
+
+
+def run_multi_process(kind, options):
+    context = multiprocessing.get_context('fork')
+    ready = context.Semaphore(0)
+    results = context.Queue()
+    workers = [context.Process(target=receiver_process, args=(kind, options, ready, results))
+               for _ in range(options['processes'])]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.acquire()
+
+    async def run():
+        layer = make_layer(kind, options)
+        await layer.new_channel()
+        start = time.time()
+        await send_all(layer, options['messages'])
+        if hasattr(layer, 'close'):
+            await layer.close()
+        return start
+
+    start = asyncio.run(run())
+    latencies, last_received = [], start
+    for _ in workers:
+        worker_latencies, worker_last_received = results.get()
+        latencies.extend(worker_latencies)
+        last_received = max(last_received, worker_last_received)
+    for worker in workers:
+        worker.join()
+
+    return latencies, last_received - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--members', type=int, default=25,
+                        help='group members per receiver process')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--redis', default=None)
+    args = parser.parse_args()
+
+    options = {
+        'processes': args.processes,
+        'members': args.members,
+        'messages': args.messages,
+        'path': tempfile.mkdtemp(prefix='codecraft-layer-'),
+        'redis': args.redis,
+    }
+    expected = args.processes * args.members * args.messages
+
+    runs = [('memory', lambda: run_single_process(options)),
+            ('unix', lambda: run_multi_process('unix', options))]
+    if args.redis:
+        runs.append(('redis', lambda: run_multi_process('redis', options)))
+
+    print('{:>8} {:>12} {:>10} {:>12} {:>10} {:>10}'.format(
+        'layer', 'delivered', 'seconds', 'deliveries/s', 'p50 ms', 'p99 ms'))
+    for name, run in runs:
+        # Elapsed time runs until the last delivery, excluding the idle timeout that ends the receivers.
+        latencies, elapsed = run()
+        print('{:>8} {:>12} {:>10.2f} {:>12.0f} {:>10.2f} {:>10.2f}'.format(
+            name, '{}/{}'.format(len(latencies), expected), elapsed,
+            len(latencies) / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99)))
+
+
+if __name__ == '__main__':
+    main()
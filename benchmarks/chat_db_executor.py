@@ -0,0 +1,96 @@
+"""
+    Load test for the database executor used by the chat consumers.
+
+    Runs the same history query from many concurrent coroutines, first on the single thread-sensitive
+    thread (pool size 0) and then on executors of increasing size, and reports queries per second.
+
+    SQLite runs in-process, so scaling is bounded by the available cores. `--latency` adds a blocking
+    delay per query to model the network round trip of a server database, where the pool lets
+    connections overlap their waits.
+
+    Usage:
+        python -m benchmarks.chat_db_executor [--clients 64] [--queries 20] [--pools 0,1,2,4,8,16]
+                                              [--latency 2]
+"""
+import argparse
+import asyncio
+import time
+
+from .utils import setup_django
+
+
+def seed(messages):
+    """
+        Creates two users sharing a chat room with the given number of messages.
+    """
+    from communications.models import Message
+    from communications.rooms import resolve_room
+    from users.models import User
+
+    user1 = User.objects.create_user('bench1', 'bench1@example.com', 'password123')
+    user2 = User.objects.create_user('bench2', 'bench2@example.com', 'password123')
+    room_id, _ = resolve_room(user1.pk, user2.pk)
+
+    Message.objects.bulk_create([
+        Message(sender=user1 if i % 2 else user2, room_id=room_id,
+                content='benchmark message number {}'.format(i))
+        for i in range(messages)
+    ])
+
+    return room_id
+
+
+async def run_clients(room_id, clients, queries, latency):
+    """
+        Runs `clients` coroutines issuing `queries` history lookups each, returning the elapsed time.
+    """
+    from communications.db import database_executor
+    from communications.models import Message
+
+    @database_executor
+    def search_history(term):
+        if latency:
+            time.sleep(latency / 1000)
+        return Message.objects.filter(room_id=room_id, content__contains=term).count()
+
+    async def client(index):
+        for query in range(queries):
+            await search_history(str(index * queries + query))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--pools', default='0,1,2,4,8,16')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated round trip per query, in milliseconds')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from communications.db import shutdown_executor
+
+    room_id = seed(args.messages)
+    total = args.clients * args.queries
+
+    print('{:>10} {:>10} {:>12}'.format('pool', 'seconds', 'queries/s'))
+    for pool in [int(size) for size in args.pools.split(',')]:
+        settings.CHAT_DB_EXECUTOR_WORKERS = pool
+        shutdown_executor()
+        elapsed = asyncio.run(run_clients(
+            room_id, args.clients, args.queries, args.latency))
+        label = pool if pool else 'shared'
+        print('{:>10} {:>10.2f} {:>12.1f}'.format(label, elapsed, total / elapsed))
+
+    shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+    Load test for the chat consumers.
+
+    Simulates pairs of clients chatting in their own rooms: every client connects, then sends messages
+    to its partner as fast as they are delivered. Reports connect latency, end-to-end message latency
+    percentiles, delivered messages per second and the memory held per open connection.
+
+    By default clients talk to the ASGI application in-process through `WebsocketCommunicator`, which
+    measures the consumers themselves without any network or server overhead. With `--url`, clients
+    connect to a real ASGI server instead, started separately against the same database, e.g.
+    `daphne codecraft.asgi:application`; this mode requires the `websockets` package and seeds users
+    in the server's database, so only run it against a disposable one.
+
+    Usage:
+        python -m benchmarks.chat_load [--clients 1000] [--messages 20] [--concurrency 200]
+                                       [--url ws://127.0.0.1:8000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+
+from .utils import setup_django
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def rss_bytes():
+    """
+        Returns the resident memory of the process, or 0 where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def seed(clients):
+    """
+        Creates `clients` users with an authentication token each, paired two by two.
+        Returns the (user ID, partner ID, token) of every client.
+    """
+    from rest_framework.authtoken.models import Token
+    from users.models import User
+
+    users = User.objects.bulk_create([
+        User(username='load{}_{}'.format(os.getpid(), i), first_name='Load', last_name=str(i))
+        for i in range(clients)
+    ])
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+
+    return [(user.pk, users[i ^ 1].pk, token.key)
+            for i, (user, token) in enumerate(zip(users, tokens))]
+
+
+class InProcessClient:
+    """
+        Client talking to the ASGI application of the current process.
+    """
+
+    def __init__(self, app, partner_id, token):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(
+            app, 'ws/chat/{}/?token={}'.format(partner_id, token))
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise ConnectionError("Connection refused")
+
+    async def send(self, text):
+        await self.communicator.send_to(text_data=text)
+
+    async def receive(self, timeout):
+        return await self.communicator.receive_from(timeout=timeout)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class ServerClient:
+    """
+        Client talking to an ASGI server over a real WebSocket connection.
+    """
+
+    def __init__(self, url, partner_id, token):
+        self.url = '{}/ws/chat/{}/?token={}'.format(url.rstrip('/'), partner_id, token)
+        self.connection = None
+
+    async def connect(self):
+        import websockets
+        self.connection = await websockets.connect(self.url, open_timeout=30)
+
+    async def send(self, text):
+        await self.connection.send(text)
+
+    async def receive(self, timeout):
+        return await asyncio.wait_for(self.connection.recv(), timeout)
+
+    async def close(self):
+        await self.connection.close()
+
+
+async def run(make_client, accounts, messages, concurrency, timeout):
+    """
+        Connects every client, exchanges the messages and disconnects, collecting the measurements.
+    """
+    results = {'connect': [], 'latency': [], 'errors': 0}
+    clients = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def connect(user_id, partner_id, token):
+        client = make_client(partner_id, token)
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await client.connect()
+            except (ConnectionError, OSError, asyncio.TimeoutError):
+                results['errors'] += 1
+                return
+            results['connect'].append((time.perf_counter() - start) * 1000)
+        clients.append((user_id, client))
+
+    memory_before = rss_bytes()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(*account) for account in accounts))
+    results['connect_seconds'] = time.perf_counter() - start
+    results['connected'] = len(clients)
+    if clients:
+        results['rss_per_connection'] = (rss_bytes() - memory_before) / len(clients)
+        results['traced_per_connection'] = (tracemalloc.get_traced_memory()[0] - traced_before) / len(clients)
+
+    # Every message reaches both members of the room; only the copy delivered to the partner is timed.
+    # Messages carry their sender and send time, as the broadcast payload does not include the sender.
+    async def chat(user_id, client):
+        for _ in range(messages):
+            await client.send(json.dumps({'msg': '{}:{!r}'.format(user_id, time.time())}))
+        received = 0
+        while received < messages:
+            try:
+                event = json.loads(await client.receive(timeout))
+            except (asyncio.TimeoutError, ConnectionError):
+                results['errors'] += 1
+                return
+            if 'content' not in event:
+                continue
+            sender, sent = event['content'].split(':')
+            if int(sender) != user_id:
+                results['latency'].append((time.time() - float(sent)) * 1000)
+                received += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(user_id, client) for user_id, client in clients))
+    results['chat_seconds'] = time.perf_counter() - start
+
+    await asyncio.gather(*(client.close() for _, client in clients), return_exceptions=True)
+    return results
+
+
+def report(results):
+    connect = results['connect']
+    latency = results['latency']
+    print('connections: {} ok, {} errors'.format(results['connected'], results['errors']))
+    print('connect latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  ({:.1f} connections/s)'.format(
+        percentile(connect, 0.5), percentile(connect, 0.95), percentile(connect, 0.99),
+        len(connect) / results['connect_seconds']))
+    print('message latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}'.format(
+        percentile(latency, 0.5), percentile(latency, 0.95), percentile(latency, 0.99)))
+    print('delivered: {} messages in {:.2f}s ({:.1f} messages/s)'.format(
+        len(latency), results['chat_seconds'], len(latency) / results['chat_seconds']))
+    if 'rss_per_connection' in results:
+        print('memory per connection: {:.1f} KiB resident'.format(results['rss_per_connection'] / 1024))
+    if tracemalloc.is_tracing() and 'traced_per_connection' in results:
+        print('python allocations per connection: {:.1f} KiB'.format(results['traced_per_connection'] / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=1000,
+                        help='number of simulated clients, two per room')
+    parser.add_argument('--messages', type=int, default=20,
+                        help='messages sent by every client')
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='maximum number of connections being opened at once')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='seconds to wait for a message before counting an error')
+    parser.add_argument('--url', help='base WebSocket URL of a running ASGI server')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='also trace Python allocations per connection (slow)')
+    args = parser.parse_args()
+
+    if args.url:
+        # The server reads the database configured in the settings, so clients are seeded there.
+        import django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'codecraft.settings')
+        django.setup()
+    else:
+        setup_django()
+
+    accounts = seed(args.clients + args.clients % 2)[:args.clients]
+
+    if args.url:
+        def make_client(partner_id, token):
+            return ServerClient(args.url, partner_id, token)
+    else:
+        from communications.routing import websocket_urlpatterns
+        from communications.token_auth_middleware import TokenAuthMiddleware
+        from channels.routing import URLRouter
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+        def make_client(partner_id, token):
+            return InProcessClient(app, partner_id, token)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    results = asyncio.run(run(make_client, accounts, args.messages, args.concurrency, args.timeout))
+    report(results)
+
+    from communications.db import shutdown_executor
+    shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+    Benchmark of the HTTP endpoints of the users, courses and communications apps.
+
+    Seeds a database with realistic volumes of users, courses, enrollments, chats and status updates,
+    then calls every endpoint repeatedly through the Django test client and reports p50/p99 latency,
+    requests per second and the number of SQL queries per request.
+
+    Results are compared to the baselines stored in `benchmarks/baselines/http_endpoints.json`: the run
+    fails if an endpoint runs more queries than its baseline, or if its p50 latency grows by more than
+    `--threshold` (a fraction, 0.5 by default) plus `--slack` milliseconds. Tail latencies are too noisy on
+    shared machines to fail a run by default; `--gate-p99` applies the same rule to p99. Query counts are
+    deterministic, latencies depend on the machine, so record baselines with `--save` on the machine
+    running the comparison.
+
+    Passwords are hashed with a fast hasher so login and signup measure the application rather than
+    the key derivation.
+
+    Usage:
+        python -m benchmarks.http_endpoints [--iterations 50] [--threshold 0.5] [--slack 5] [--gate-p99]
+                                            [--only course_list,chat_inbox] [--save]
+                                            [--students 500] [--courses 50] [--messages 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from .utils import setup_django
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines', 'http_endpoints.json')
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed(students, teachers, courses, messages):
+    """
+        Creates the users, courses with their content and enrollments, chat rooms with messages,
+        and status updates measured by the benchmark.
+
+        Returns:
+            dict: The objects the endpoints are called with.
+    """
+    from django.contrib.auth.hashers import make_password
+    from courses.models import Course, CourseStudent, Resource, Section, TextElement, VideoElement
+    from communications.feed import post_status
+    from communications.models import ChatRoom, Message
+    from users.models import User
+
+    password = make_password('password123')
+    teacher_users = User.objects.bulk_create([
+        User(username='teacher{}'.format(i), email='teacher{}@example.com'.format(i), first_name='Teacher',
+             last_name=str(i), user_type=User.UserType.TEACHER, password=password)
+        for i in range(teachers)
+    ])
+    student_users = User.objects.bulk_create([
+        User(username='student{}'.format(i), email='student{}@example.com'.format(i), first_name='Student',
+             last_name=str(i), user_type=User.UserType.STUDENT, password=password)
+        for i in range(students)
+    ])
+
+    course_objects = Course.objects.bulk_create([
+        Course(teacher=teacher_users[i % teachers], name='Course {}'.format(i),
+               description='Description of course {}'.format(i))
+        for i in range(courses)
+    ])
+    sections = Section.objects.bulk_create([
+        Section(course=course, name='Section {}'.format(i))
+        for course in course_objects for i in range(5)
+    ])
+    TextElement.objects.bulk_create([
+        TextElement(section=section, order=i, title='Text {}'.format(i), content='Lorem ipsum ' * 50)
+        for section in sections for i in range(3)
+    ])
+    VideoElement.objects.bulk_create([
+        VideoElement(section=section, order=3 + i, title='Video {}'.format(i),
+                     content='https://example.com/video/{}'.format(i))
+        for section in sections for i in range(2)
+    ])
+    Resource.objects.bulk_create([
+        Resource(course=course, name='Resource {}'.format(i), url='https://example.com/{}'.format(i))
+        for course in course_objects for i in range(3)
+    ])
+
+    # Every student takes five courses.
+    CourseStudent.objects.bulk_create([
+        CourseStudent(student=student, course=course_objects[(index + offset) % courses])
+        for index, student in enumerate(student_users) for offset in range(5)
+    ])
+
+    # The first student chats with twenty classmates.
+    reader = student_users[0]
+    rooms = [ChatRoom.objects.create(user1=reader, user2=other) for other in student_users[1:21]]
+    Message.objects.bulk_create([
+        Message(sender=reader if i % 2 else room.user2, room=room,
+                content='Message {} about homework and exams'.format(i))
+        for room in rooms for i in range(messages)
+    ])
+    for room in rooms:
+        Message.objects.create(sender=room.user2, room=room, content='Latest message')
+
+    for teacher in teacher_users:
+        post_status(teacher, 'Office hours moved to Friday')
+    for student in student_users[:50]:
+        post_status(student, 'Looking for a study group')
+
+    return {
+        'student': reader,
+        'teacher': teacher_users[0],
+        'course': course_objects[0],
+        'other_course': [course for course in course_objects
+                         if not course.students.filter(pk=reader.pk).exists()][0],
+        'enrolled': course_objects[0].students.first(),
+        'room': rooms[0],
+    }
+
+
+def endpoints(data):
+    """
+        Lists the benchmarked requests, one per endpoint and method.
+
+        Each entry is (name, method, path, user, body, prepare): `user` is authenticated, `body` is a dict
+        or a function returning one, and `prepare` restores the state the request needs before each call.
+    """
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+    from courses.models import CourseStudent
+
+    student, teacher, room = data['student'], data['teacher'], data['room']
+    course, other_course, enrolled = data['course'], data['other_course'], data['enrolled']
+    counter = iter(range(10 ** 9))
+
+    def signup_body():
+        number = next(counter)
+        return {'username': 'new{}'.format(number), 'email': 'new{}@example.com'.format(number),
+                'password': 'password123', 'first_name': 'New', 'last_name': 'User'}
+
+    def restore_token():
+        Token.objects.get_or_create(user=student)
+
+    def unenroll():
+        CourseStudent.objects.filter(student=student, course=other_course).delete()
+
+    def enroll():
+        CourseStudent.objects.get_or_create(student=enrolled, course=course)
+
+    return [
+        ('login', 'post', reverse('login'), None,
+         {'username': student.username, 'password': 'password123'}, None),
+        ('logout', 'post', reverse('logout'), student, None, restore_token),
+        ('signup', 'post', reverse('signup'), None, signup_body, None),
+        ('list_students', 'get', reverse('list_students') + '?search=1', student, None, None),
+        ('list_teachers', 'get', reverse('list_teachers') + '?search=1', teacher, None, None),
+        ('course_list', 'get', reverse('course_list'), student, None, None),
+        ('course_detail', 'get', reverse('course_detail', kwargs={'id': course.pk}), teacher, None, None),
+        ('course_enroll', 'post', reverse('course_enroll'), student,
+         {'course_id': other_course.pk}, unenroll),
+        ('course_remove', 'delete', reverse('course_remove'), teacher,
+         {'student_id': enrolled.pk, 'course_id': course.pk}, enroll),
+        ('course_create', 'post', reverse('course_edit'), teacher,
+         {'name': 'New course', 'description': 'Created by the benchmark'}, None),
+        ('course_update', 'patch', reverse('course_edit'), teacher,
+         {'course_id': course.pk, 'description': 'Updated by the benchmark'}, None),
+        ('chat_history', 'get', reverse('chat_history', kwargs={'room_id': room.pk}), student, None, None),
+        ('chat_history_page', 'get', reverse('chat_history', kwargs={'room_id': room.pk}) + '?before=10000000',
+         student, None, None),
+        ('chat_inbox', 'get', reverse('chat_inbox'), student, None, None),
+        ('chat_search', 'get', reverse('chat_search') + '?q=homework', student, None, None),
+        ('status_feed', 'get', reverse('status_feed'), student, None, None),
+        ('status_post', 'post', reverse('status_feed'), teacher, {'content': 'New status'}, None),
+    ]
+
+
+def measure(client, endpoint, iterations, warmup):
+    """
+        Calls an endpoint repeatedly and returns its latencies in milliseconds and query count.
+
+        Queries are counted on every database alias, as reads are routed to the replicas.
+    """
+    from contextlib import ExitStack
+
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    name, method, path, user, body, prepare = endpoint
+    client.force_authenticate(user=user)
+    latencies = []
+    queries = 0
+    # Test mirrors share the connection of the database they mirror, which is only counted once.
+    databases = list({id(connections[alias]): connections[alias] for alias in connections}.values())
+
+    for iteration in range(warmup + iterations):
+        if prepare is not None:
+            prepare()
+        payload = body() if callable(body) else body
+
+        with ExitStack() as stack:
+            captures = []
+            for connection in databases:
+                # The query log is bounded; clearing it keeps the captured count exact on long runs.
+                connection.queries_log.clear()
+                captures.append(stack.enter_context(CaptureQueriesContext(connection)))
+            start = time.perf_counter()
+            response = getattr(client, method)(path, payload, format='json')
+            elapsed = (time.perf_counter() - start) * 1000
+
+        if response.status_code >= 400:
+            raise RuntimeError("{} returned {}: {}".format(name, response.status_code, response.content[:200]))
+        if iteration >= warmup:
+            latencies.append(elapsed)
+            queries = max(queries, sum(len(captured) for captured in captures))
+
+    return {
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'rps': len(latencies) / (sum(latencies) / 1000),
+        'queries': queries,
+    }
+
+
+def compare(results, baselines, threshold, slack, metrics=('p50',)):
+    """
+        Returns the descriptions of the regressions of the results against the baselines.
+        Latencies may exceed their baseline by `threshold` times the baseline plus `slack` milliseconds,
+        which keeps sub-millisecond noise on fast endpoints from failing the run.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if result['queries'] > baseline['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(name, result['queries'], baseline['queries']))
+        for metric in metrics:
+            if result[metric] > baseline[metric] * (1 + threshold) + slack:
+                regressions.append('{}: {} {:.2f}ms, baseline {:.2f}ms'.format(
+                    name, metric, result[metric], baseline[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='allowed latency growth over the baseline, as a fraction')
+    parser.add_argument('--slack', type=float, default=5,
+                        help='allowed latency growth over the baseline on top of the threshold, in milliseconds')
+    parser.add_argument('--gate-p99', action='store_true', help='also fail on p99 latency regressions')
+    parser.add_argument('--only', help='comma-separated names of the endpoints to run')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--teachers', type=int, default=20)
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=50, help='messages per chat room')
+    args = parser.parse_args()
+
+    # Known N+1 queries are gated by their baseline query counts rather than reported on every request.
+    setup_django(ALLOWED_HOSTS=['testserver'], SQL_N_PLUS_ONE_THRESHOLD=0,
+                 PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+    from rest_framework.test import APIClient
+
+    data = seed(args.students, args.teachers, args.courses, args.messages)
+    selected = set(args.only.split(',')) if args.only else None
+    client = APIClient()
+
+    results = {}
+    print('{:<20} {:>9} {:>9} {:>9} {:>8}'.format('endpoint', 'p50 ms', 'p99 ms', 'req/s', 'queries'))
+    for endpoint in endpoints(data):
+        if selected is not None and endpoint[0] not in selected:
+            continue
+        result = results[endpoint[0]] = measure(client, endpoint, args.iterations, args.warmup)
+        print('{:<20} {:>9.2f} {:>9.2f} {:>9.1f} {:>8}'.format(
+            endpoint[0], result['p50'], result['p99'], result['rps'], result['queries']))
+
+    if args.save:
+        baselines = {}
+        if os.path.exists(BASELINES):
+            with open(BASELINES) as file:
+                baselines = json.load(file)
+        baselines.update({name: {key: round(value, 3) for key, value in result.items()}
+                          for name, result in results.items()})
+        os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+        with open(BASELINES, 'w') as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print('Saved baselines to {}'.format(BASELINES))
+        return
+
+    if not os.path.exists(BASELINES):
+        print('No baselines to compare to, run with --save to record them.')
+        return
+
+    metrics = ('p50', 'p99') if args.gate_p99 else ('p50',)
+    with open(BASELINES) as file:
+        regressions = compare(results, json.load(file), args.threshold, args.slack, metrics)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+    Benchmark of concurrent reads and writes on the SQLite database.
+
+    Writer threads post chat messages while reader threads load room histories and inboxes, first with
+    SQLite defaults (rollback journal, full fsync, a single connection alias), then with the tuned
+    configuration of the settings (write-ahead logging, `SQLITE_PRAGMAS` and reads routed to the read
+    alias). Each configuration runs in its own process against its own database. Reports operations
+    per second, p99 latencies, which include the time spent waiting on the database lock, and the
+    operations that failed with "database is locked".
+
+    Usage:
+        python -m benchmarks.sqlite_concurrency [--readers 8] [--writers 2] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+
+from .utils import setup_django
+
+CONFIGURATIONS = {
+    'defaults': {'SQLITE_PRAGMAS': {}, 'DATABASE_ROUTERS': []},
+    'tuned': {},
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed(rooms, messages):
+    """
+        Creates chat rooms between pairs of users, each with some history.
+    """
+    from communications.models import ChatRoom, Message
+    from users.models import User
+
+    users = User.objects.bulk_create([
+        User(username='sqlite{}'.format(i), first_name='Bench', last_name=str(i)) for i in range(rooms * 2)
+    ])
+    room_objects = [ChatRoom.objects.create(user1=users[2 * i], user2=users[2 * i + 1]) for i in range(rooms)]
+    Message.objects.bulk_create([
+        Message(sender=room.user1, room=room, content='History message {}'.format(i))
+        for room in room_objects for i in range(messages)
+    ])
+    return [(room.pk, room.user1_id) for room in room_objects]
+
+
+def run_configuration(name, options, results):
+    from django.db import OperationalError, connections
+
+    setup_django(**CONFIGURATIONS[name])
+
+    from communications.models import ChatMembership, Message
+
+    rooms = seed(options['rooms'], options['messages'])
+    stats = {'read': [], 'write': [], 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + options['seconds']
+
+    def timed(kind, operation):
+        start = time.perf_counter()
+        try:
+            operation()
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            with lock:
+                stats['locked'] += 1
+            return
+        with lock:
+            stats[kind].append((time.perf_counter() - start) * 1000)
+
+    def writer(index):
+        room_id, sender_id = rooms[index % len(rooms)]
+        while time.perf_counter() < deadline:
+            timed('write', lambda: Message.objects.create(room_id=room_id, sender_id=sender_id, content='Live'))
+        connections.close_all()
+
+    def reader(index):
+        room_id, user_id = rooms[index % len(rooms)]
+
+        def read():
+            list(Message.objects.filter(room_id=room_id).order_by('-id')[:50])
+            list(ChatMembership.objects.filter(user_id=user_id).select_related('room__last_message'))
+
+        while time.perf_counter() < deadline:
+            timed('read', read)
+        connections.close_all()
+
+    threads = ([threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+               + [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results.put((name, stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=500, help='history messages per room')
+    args = parser.parse_args()
+    options = vars(args)
+
+    print('{:<10} {:>9} {:>12} {:>9} {:>12} {:>8}'.format(
+        'config', 'reads/s', 'read p99 ms', 'writes/s', 'write p99 ms', 'locked'))
+    for name in CONFIGURATIONS:
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_configuration, args=(name, options, results))
+        process.start()
+        _, stats = results.get()
+        process.join()
+
+        print('{:<10} {:>9.1f} {:>12.2f} {:>9.1f} {:>12.2f} {:>8}'.format(
+            name, len(stats['read']) / args.seconds, percentile(stats['read'], 0.99),
+            len(stats['write']) / args.seconds, percentile(stats['write'], 0.99), stats['locked']))
+
+
+if __name__ == '__main__':
+    main()
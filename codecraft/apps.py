@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class CodecraftConfig(AppConfig):
+    name = 'codecraft'
+
+    def ready(self):
+        # Tunes every SQLite connection as it is opened.
+        from django.db.backends.signals import connection_created
+
+        from .db import configure_sqlite
+        from .instrumentation import install_query_recorder
+
+        connection_created.connect(configure_sqlite)
+        # Records the queries of every connection in the statistics of the request being handled.
+        connection_created.connect(install_query_recorder)
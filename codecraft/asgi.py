@@ -1,18 +1,62 @@
 import os
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-
-from communications.routing import websocket_urlpatterns
-from communications.token_auth_middleware import TokenAuthMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'codecraft.settings')
 
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": TokenAuthMiddleware(
-        URLRouter(
-            websocket_urlpatterns
+# Sets Django up before anything below imports models.
+django_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter  # noqa: E402
+
+
+class LazyApplication:
+    """
+        ASGI application built by a factory when it handles its first connection.
+
+        Workers are started and stopped often, and many of them never serve a WebSocket, so the chat
+        consumers and everything they import are only loaded once one is needed.
+
+        Attributes:
+            factory (callable): Returns the application to delegate to.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.application = None
+
+    def load(self):
+        """
+            Builds the application now rather than on the first connection, and returns it.
+        """
+        if self.application is None:
+            self.application = self.factory()
+        return self.application
+
+    async def __call__(self, scope, receive, send):
+        return await self.load()(scope, receive, send)
+
+
+def websocket_application():
+    from channels.routing import URLRouter
+
+    from codecraft.instrumentation import WebsocketQueryInstrumentationMiddleware
+    from codecraft.metrics import WebsocketMetricsMiddleware
+    from communications.routing import websocket_urlpatterns
+    from communications.token_auth_middleware import TokenAuthMiddleware
+
+    return WebsocketMetricsMiddleware(
+        WebsocketQueryInstrumentationMiddleware(
+            TokenAuthMiddleware(
+                URLRouter(
+                    websocket_urlpatterns
+                )
+            )
         )
     )
+
+
+application = ProtocolTypeRouter({
+    "http": django_application,
+    "websocket": LazyApplication(websocket_application)
 })
@@ -0,0 +1,141 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.functional import classproperty
+from rest_framework import exceptions
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+
+
+async def call_check(check, name, *args):
+    """
+        Calls the asynchronous variant of an authentication or permission method, `a<name>`, when the class
+        defines one, and the synchronous method on a thread otherwise, as it may query the database. Checks
+        inherited from `BasePermission` allow everything and are called inline.
+    """
+    async_method = getattr(check, 'a' + name, None)
+    if async_method is not None:
+        return await async_method(*args)
+
+    method = getattr(check, name)
+    if getattr(type(check), name) is getattr(BasePermission, name, None):
+        return method(*args)
+    return await sync_to_async(method)(*args)
+
+
+class AsyncAPIView(APIView):
+    """
+        An APIView whose handlers run on the event loop when served through ASGI.
+
+        Subclasses implement their handlers twice: `get`, `post`... as usual, and `aget`, `apost`... as
+        coroutines using the asynchronous ORM. When `ASYNC_VIEWS` is set as the URLs are loaded, the view is
+        a coroutine: requests are authenticated, checked and handled without the thread hop Django makes for
+        every synchronous view, and methods without an asynchronous handler fall back to the synchronous one
+        on a thread. Otherwise, as WSGI deployments should configure it, the view runs the synchronous
+        handlers like any APIView.
+
+        Authentication and permission classes take part the same way: `aauthenticate`, `ahas_permission` and
+        `ahas_object_permission` are awaited when defined, and the synchronous methods are run on a thread
+        otherwise. Throttles and content negotiation do not touch the database and run inline.
+    """
+
+    # Whether the view was made a coroutine, as `ASYNC_VIEWS` was set when the URLs were loaded.
+    run_async = None
+
+    @classproperty
+    def view_is_async(cls):
+        return getattr(settings, 'ASYNC_VIEWS', True)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return super().as_view(**initkwargs, run_async=cls.view_is_async)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.run_async:
+            return super().dispatch(request, *args, **kwargs)
+        return self.adispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+            Asynchronous version of `APIView.dispatch`.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            method = request.method.lower()
+            if method not in self.http_method_names:
+                handler = self.http_method_not_allowed
+            elif hasattr(self, 'a' + method):
+                handler = getattr(self, 'a' + method)
+            elif hasattr(self, method):
+                handler = sync_to_async(getattr(self, method))
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, '__await__'):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """
+            Asynchronous version of `APIView.initial`.
+        """
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        await self.acheck_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """
+            Authenticates the request with the first of its authenticators accepting it, as `Request` would
+            when its user is first read.
+        """
+        for authenticator in request.authenticators:
+            try:
+                user_auth_tuple = await call_check(authenticator, 'authenticate', request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        for permission in self.get_permissions():
+            if not await call_check(permission, 'has_permission', request, self):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
+
+    async def acheck_object_permissions(self, request, obj):
+        for permission in self.get_permissions():
+            if not await call_check(permission, 'has_object_permission', request, self, obj):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+from django.core.cache import cache
+
+# Seconds between two looks at the cache while another process builds a value.
+LOCK_POLL_INTERVAL = 0.05
+
+
+class Call:
+    """
+        A call made by the first of the threads asking for a key, whose result the others wait for.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+        Coalesces concurrent calls computing the same key into a single one.
+
+        The first caller asking for a key runs the function, and callers asking for the same key until it
+        returns wait for it and share its result, or its exception. Threads and coroutines are coalesced
+        separately, as a thread waiting for a coroutine, or the other way around, would block the event loop
+        or the thread the coroutine needs; coroutines share a task per event loop, which keeps running when
+        the caller that started it is cancelled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+    def do(self, key, function, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, function, *args):
+        """
+            Asynchronous version of `do`, for coroutine functions.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get((loop, key))
+        if task is None:
+            task = self._tasks[(loop, key)] = loop.create_task(function(*args))
+            task.add_done_callback(lambda task: self._finish(loop, key, task))
+        return await asyncio.shield(task)
+
+    def _finish(self, loop, key, task):
+        if self._tasks.get((loop, key)) is task:
+            del self._tasks[(loop, key)]
+        # Retrieves the exception, which the callers may all have been cancelled before seeing.
+        if not task.cancelled():
+            task.exception()
+
+
+def get_or_build(key, build, timeout, lock_timeout):
+    """
+        Returns the value cached under `key`, building it if the cache has none, with a single process at a
+        time building it.
+
+        The process building the value holds a lock in the cache, which therefore has to be shared between
+        processes, while the others poll the cache for the value. Should the value not show up within
+        `lock_timeout` seconds, as the process holding the lock died or is stuck, they build it themselves.
+
+        Args:
+            key (str): The cache key of the value.
+            build (callable): Builds the value.
+            timeout (int): The number of seconds the value is cached.
+            lock_timeout (int): The number of seconds the lock is held at most.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = key + ':lock'
+    locked = cache.add(lock_key, True, lock_timeout)
+    deadline = time.monotonic() + lock_timeout
+    while not locked and time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        locked = cache.add(lock_key, True, lock_timeout)
+
+    try:
+        value = build()
+        cache.set(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+async def aget_or_build(key, build, timeout, lock_timeout):
+    """
+        Asynchronous version of `get_or_build`, for an asynchronous `build`.
+    """
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock_key = key + ':lock'
+    locked = await cache.aadd(lock_key, True, lock_timeout)
+    deadline = time.monotonic() + lock_timeout
+    while not locked and time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+        locked = await cache.aadd(lock_key, True, lock_timeout)
+
+    try:
+        value = await build()
+        await cache.aset(key, value, timeout)
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+    return value
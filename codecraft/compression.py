@@ -0,0 +1,226 @@
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from .metrics import record_cache_lookup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing; other types, such as images and videos, are compressed already.
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+class Codec:
+    """
+        A content coding responses can be compressed with.
+
+        Attributes:
+            compress (callable): Compresses bytes at a compression level.
+            level (int): The level used when compressing a response as it is sent.
+            static_level (int): The level used for content compressed once and cached, which can afford to
+                be slower for a smaller result.
+    """
+
+    def __init__(self, compress, level, static_level):
+        self.compress = compress
+        self.level = level
+        self.static_level = static_level
+
+
+CODECS = {
+    # A zero mtime keeps the output identical for identical content, as cached variants are.
+    'gzip': Codec(lambda data, level: gzip.compress(data, compresslevel=level, mtime=0), 6, 9),
+}
+
+if brotli is not None:
+    CODECS['br'] = Codec(lambda data, level: brotli.compress(data, quality=level), 5, 11)
+
+if zstandard is not None:
+    CODECS['zstd'] = Codec(lambda data, level: zstandard.ZstdCompressor(level=level).compress(data), 3, 19)
+
+
+def compress(data, encoding, static=False):
+    """
+        Compresses data with a content coding of `CODECS`.
+
+        Args:
+            data (bytes): The data to compress.
+            encoding (str): The content coding.
+            static (bool): Whether the result is cached, in which case the slower, stronger level is used.
+    """
+    codec = CODECS[encoding]
+    return codec.compress(data, codec.static_level if static else codec.level)
+
+
+def parse_accept_encoding(header):
+    """
+        Returns the quality of every coding listed in an `Accept-Encoding` header, by lowercase name.
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def negotiate_encoding(header):
+    """
+        Chooses the content coding of a response from the `Accept-Encoding` header of its request.
+
+        Codings are considered in the order of `COMPRESSION_ENCODINGS`, skipping those whose package is not
+        installed, and the first one the client accepts is chosen; client preferences among accepted codings
+        are not taken into account, as they rarely reflect more than the order the client supports them in.
+
+        Returns:
+            str | None: The coding, or None to send the response uncompressed.
+    """
+    if not header:
+        return None
+
+    qualities = parse_accept_encoding(header)
+    for encoding in getattr(settings, 'COMPRESSION_ENCODINGS', ['zstd', 'br', 'gzip']):
+        if encoding in CODECS and qualities.get(encoding, qualities.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class CachedVariants:
+    """
+        The compressed variants of a cached response body, stored in the cache next to it.
+
+        Each variant is compressed at the static level the first time a client accepting its coding asks for
+        it, and then read from the cache, so compression is paid once per version of the content rather than
+        once per response. Keys should identify the version of the content, so variants of stale content
+        are never served.
+
+        Attributes:
+            content (bytes): The uncompressed content.
+            key (str): The cache key the variants are stored under, suffixed with their coding.
+            timeout (int): The number of seconds the variants are kept.
+    """
+
+    def __init__(self, content, key, timeout):
+        self.content = content
+        self.key = key
+        self.timeout = timeout
+
+    def variant_key(self, encoding):
+        return '{}:{}'.format(self.key, encoding)
+
+    def get(self, encoding):
+        data = cache.get(self.variant_key(encoding))
+        record_cache_lookup('compressed_variants', data is not None)
+        if data is None:
+            data = compress(self.content, encoding, static=True)
+            cache.set(self.variant_key(encoding), data, self.timeout)
+        return data
+
+    async def aget(self, encoding):
+        data = await cache.aget(self.variant_key(encoding))
+        record_cache_lookup('compressed_variants', data is not None)
+        if data is None:
+            # Strong compression of a large document takes long enough to hold up every other request.
+            data = await sync_to_async(compress, thread_sensitive=False)(self.content, encoding, static=True)
+            await cache.aset(self.variant_key(encoding), data, self.timeout)
+        return data
+
+
+class CompressionMiddleware:
+    """
+        Compresses responses with the best coding accepted by the client, among gzip, brotli and zstd.
+
+        Responses shorter than `COMPRESSION_MIN_SIZE` bytes, whose compression would save less than it costs,
+        streaming responses and responses whose content type is compressed already are sent as they are.
+        Views serving cached content set its `CachedVariants` as the `compressed_variants` attribute of their
+        response, whose variants are served instead of compressing the content again.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        encoding = self.response_encoding(request, response)
+        if encoding is None:
+            return response
+
+        variants = getattr(response, 'compressed_variants', None)
+        if variants is not None:
+            content = variants.get(encoding)
+        else:
+            content = compress(response.content, encoding)
+        return self.encode(response, encoding, content)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        encoding = self.response_encoding(request, response)
+        if encoding is None:
+            return response
+
+        variants = getattr(response, 'compressed_variants', None)
+        if variants is not None:
+            content = await variants.aget(encoding)
+        else:
+            content = compress(response.content, encoding)
+        return self.encode(response, encoding, content)
+
+    def response_encoding(self, request, response):
+        """
+            Returns the coding to compress a response with, or None if it should be sent as it is.
+        """
+        if response.streaming or response.has_header('Content-Encoding'):
+            return None
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not (content_type.startswith('text/') or content_type.endswith('+json')
+                or content_type in COMPRESSIBLE_TYPES):
+            return None
+
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return None
+
+        # The content now depends on the request headers, whether or not this client gets it compressed.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    def encode(self, response, encoding, content):
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # The compressed bytes differ from those a strong ETag identified.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,86 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Routing state of the request being handled, set by `PrimaryPinningMiddleware`.
+request_routing = ContextVar('request_routing', default=None)
+
+
+class RequestRouting:
+    """
+        Tracks how the queries of a request are routed.
+
+        Attributes:
+            pinned (bool): Whether reads of the request must go to the primary database.
+            wrote (bool): Whether the request wrote to the primary database.
+    """
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+        Applies the `SQLITE_PRAGMAS` setting to every new SQLite connection.
+
+        Connected to `connection_created`, so pragmas apply to the connections of every thread, including
+        the chat database executor. Write-ahead logging lets readers proceed while a write is in progress,
+        and with `synchronous=normal` commits no longer wait for a full fsync of the database file.
+
+        The pragmas run on the underlying SQLite connection, bypassing the execute wrappers of the connection so
+        they are not recorded as queries of the request that opened it.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        connection.connection.execute('PRAGMA {}={}'.format(name, value))
+
+
+class ReadWriteRouter:
+    """
+        Routes reads to the replica aliases listed in `DATABASE_REPLICAS` and writes to the default one.
+
+        With a single SQLite file, the replica is a second connection to it: with write-ahead logging, its
+        queries run against the last committed state without waiting for the write lock held by the default
+        connection. Server databases list their actual replicas instead.
+
+        Reads stay on the default database when replicas could return stale data: inside a transaction on
+        it, so the transaction sees its own writes, and for requests pinned to it by
+        `PrimaryPinningMiddleware` because their client wrote recently. Reads made on behalf of an object,
+        such as its prefetched relations, go to the database the object was read from.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db
+
+        replicas = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+        if not replicas or connections['default'].in_atomic_block:
+            return 'default'
+
+        routing = request_routing.get()
+        if routing is not None and routing.pinned:
+            return 'default'
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = request_routing.get()
+        if routing is not None:
+            # Later reads of the request, and of the client's next requests, must see this write.
+            routing.wrote = True
+            routing.pinned = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
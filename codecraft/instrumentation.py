@@ -0,0 +1,258 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import DB_QUERY_DURATION
+
+logger = logging.getLogger('codecraft.sql')
+
+# Query statistics of the request or WebSocket connection being handled, set by the instrumentation middlewares.
+query_stats = ContextVar('query_stats', default=None)
+
+# Literals and lists of placeholders are replaced so that queries differing only by their values share a fingerprint.
+FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s|\?'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+class NPlusOneQueries(Exception):
+    """
+        Raised when a request runs the same query more times than `SQL_N_PLUS_ONE_THRESHOLD`.
+    """
+
+
+def fingerprint(sql):
+    """
+        Returns the SQL of a query with its literal values and placeholders replaced, identifying queries
+        run from the same place of the code with different parameters.
+    """
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryStats:
+    """
+        Accumulates the SQL queries run while handling a request or a WebSocket frame.
+
+        Queries may be recorded from several threads at once, as the chat consumers run their database work
+        on an executor, hence the lock.
+
+        Attributes:
+            count (int): The number of queries.
+            duration (float): The time spent running the queries, in seconds.
+            statements (Counter): The number of queries run for every SQL statement.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, sql, duration):
+        with self.lock:
+            self.count += 1
+            self.duration += duration
+            self.statements[sql] += 1
+
+    def fingerprints(self):
+        """
+            Returns the number of queries run for every fingerprint.
+
+            Statements are counted as they are run and only fingerprinted here, once per distinct statement.
+        """
+        with self.lock:
+            statements = list(self.statements.items())
+        counts = Counter()
+        for sql, count in statements:
+            counts[fingerprint(sql)] += count
+        return counts
+
+    def repeated(self, threshold):
+        """
+            Returns the (fingerprint, count) of the queries run at least `threshold` times, most repeated first.
+        """
+        return [(key, count) for key, count in self.fingerprints().most_common() if count >= threshold]
+
+    def server_timing(self):
+        """
+            Returns the value of a `Server-Timing` header describing the queries.
+        """
+        metrics = ['db;dur={:.3f};desc="{} queries"'.format(self.duration * 1000, self.count)]
+        fingerprints = self.fingerprints()
+        if fingerprints:
+            metrics.append('db-repeats;desc="{} max"'.format(fingerprints.most_common(1)[0][1]))
+        return ', '.join(metrics)
+
+    def check(self, label):
+        """
+            Reports the queries repeated `SQL_N_PLUS_ONE_THRESHOLD` times or more, a sign of a query run for
+            every row of a list. They are logged as warnings, and raised when `SQL_N_PLUS_ONE_RAISE` is set.
+
+            Args:
+                label (str): What ran the queries, such as the path of the request.
+
+            Raises:
+                NPlusOneQueries: If a query is repeated too often and `SQL_N_PLUS_ONE_RAISE` is set.
+        """
+        threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 10)
+        if not threshold:
+            return
+
+        repeated = self.repeated(threshold)
+        if not repeated:
+            return
+
+        message = '{}: {}'.format(label, '; '.join(
+            '{} x {}'.format(count, key) for key, count in repeated))
+        logger.warning('Repeated queries in %s', message)
+        if getattr(settings, 'SQL_N_PLUS_ONE_RAISE', False):
+            raise NPlusOneQueries(message)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+        Database execute wrapper recording every query in the statistics of the current request or connection,
+        and in the process-wide query time metric.
+    """
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        DB_QUERY_DURATION.labels(context['connection'].alias).observe(duration)
+        stats = query_stats.get()
+        if stats is not None:
+            stats.record(sql, duration)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+        Installs `record_query` on every database connection as it is opened.
+
+        Connected to `connection_created` rather than wrapped around each request, so queries are recorded on
+        the connections of every thread, including the chat database executor.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryInstrumentationMiddleware:
+    """
+        Records the SQL queries of every request and reports them in a `Server-Timing` header, along with the
+        total time of the request.
+
+        Requests repeating a query `SQL_N_PLUS_ONE_THRESHOLD` times or more are logged, and fail when
+        `SQL_N_PLUS_ONE_RAISE` is set, which it is when running the tests so per-row queries surface before
+        they reach production.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        start = time.perf_counter()
+
+        token = query_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_stats.reset(token)
+
+        return self.report(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+
+        token = query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_stats.reset(token)
+
+        return self.report(request, response, stats, start)
+
+    def report(self, request, response, stats, start):
+        stats.check('{} {}'.format(request.method, request.path))
+        response['Server-Timing'] = '{}, total;dur={:.3f}'.format(
+            stats.server_timing(), (time.perf_counter() - start) * 1000)
+        return response
+
+
+class WebsocketQueryInstrumentationMiddleware:
+    """
+        ASGI middleware recording the SQL queries of WebSocket connections.
+
+        The queries run while connecting are reported in a `Server-Timing` header of the handshake response.
+        Afterwards, the queries run between two frames received from the client are checked like those of
+        an HTTP request, so a consumer running a query per room or per message is reported for the frame
+        that caused it, and the totals of the connection are logged at debug level when it closes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await self.app(scope, receive, send)
+
+        path = scope.get('path', '')
+        stats = QueryStats()
+        totals = {'count': 0, 'duration': 0.0, 'frames': 0}
+
+        def checkpoint():
+            with stats.lock:
+                totals['count'] += stats.count
+                totals['duration'] += stats.duration
+            try:
+                stats.check('WEBSOCKET {}'.format(path))
+            finally:
+                with stats.lock:
+                    stats.reset()
+
+        async def instrumented_receive():
+            message = await receive()
+            # Consumers handle frames one at a time, so whatever ran since the last frame was caused by it.
+            if message['type'] in ('websocket.receive', 'websocket.disconnect'):
+                if message['type'] == 'websocket.receive':
+                    totals['frames'] += 1
+                checkpoint()
+            return message
+
+        async def instrumented_send(message):
+            if message['type'] == 'websocket.accept':
+                message = dict(message, headers=list(message.get('headers', [])) + [
+                    (b'server-timing', stats.server_timing().encode())])
+            await send(message)
+
+        token = query_stats.set(stats)
+        try:
+            return await self.app(scope, instrumented_receive, instrumented_send)
+        finally:
+            query_stats.reset(token)
+            logger.debug('WEBSOCKET %s: %d queries in %.3fms over %d frames', path,
+                         totals['count'] + stats.count, (totals['duration'] + stats.duration) * 1000,
+                         totals['frames'])
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from codecraft.startup import measure_startup
+
+
+class Command(BaseCommand):
+    """
+        Imports the ASGI application in a fresh interpreter, as a worker does when it starts, and reports
+        the modules and application `ready` methods taking the longest along with the total against
+        `STARTUP_BUDGET_SECONDS`.
+    """
+    help = "Reports the import and app-ready costs of a cold start of the ASGI application."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='codecraft.asgi', help="Module to import.")
+        parser.add_argument('--top', type=int, default=15, help="Number of modules to report.")
+        parser.add_argument('--check', action='store_true', help="Fail when the cold start exceeds the budget.")
+
+    def handle(self, *args, **options):
+        try:
+            profile = measure_startup(options['module'])
+        except RuntimeError as error:
+            raise CommandError(error)
+
+        top = options['top']
+        self.stdout.write("Slowest modules, by self time:")
+        for timing in profile.slowest(top):
+            self.stdout.write("  {:8.1f}ms  {}".format(timing.self * 1000, timing.name))
+
+        self.stdout.write("Slowest modules, including their imports:")
+        for timing in profile.slowest(top, cumulative=True):
+            self.stdout.write("  {:8.1f}ms  {}{}".format(timing.cumulative * 1000, '  ' * timing.depth, timing.name))
+
+        self.stdout.write("Packages, by self time:")
+        for package, duration in profile.packages()[:top]:
+            self.stdout.write("  {:8.1f}ms  {}".format(duration * 1000, package))
+
+        self.stdout.write("Application ready():")
+        for label, duration in sorted(profile.ready.items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write("  {:8.1f}ms  {}".format(duration * 1000, label))
+
+        eager = profile.eager_modules()
+        if eager:
+            self.stdout.write(self.style.WARNING("Loaded eagerly: {}".format(', '.join(eager))))
+
+        budget = getattr(settings, 'STARTUP_BUDGET_SECONDS', 1.5)
+        summary = "Imported {} in {:.0f}ms ({} modules), budget {:.0f}ms.".format(
+            profile.module, profile.total * 1000, len(profile.modules), budget * 1000)
+        if profile.total <= budget:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['check']:
+            raise CommandError(summary)
+        else:
+            self.stdout.write(self.style.ERROR(summary))
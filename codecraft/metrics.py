@@ -0,0 +1,336 @@
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Metrics rendered by `render`, in order of registration. Every process keeps its own metrics, so
+# deployments running several workers scrape each of them.
+REGISTRY = []
+
+# Upper bounds, in seconds, of the buckets of request latency histograms.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds, in seconds, of the buckets of histograms of fast operations such as queries.
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+
+class ShardedValues:
+    """
+        A fixed number of numeric slots, updated without taking any lock.
+
+        Values are recorded on the hot paths of requests, queries and chat consumers, so every thread
+        increments its own list of slots, which no other thread writes to, and the lists of all the threads
+        that ever recorded a value are only summed when the metrics are scraped. The lock is only taken the
+        first time a thread records a value.
+
+        Attributes:
+            size (int): The number of slots.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def shard(self):
+        """
+            Returns the slots of the current thread, creating them on its first use.
+        """
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0] * self.size
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def totals(self):
+        totals = [0] * self.size
+        for values in list(self._shards):
+            for index, value in enumerate(values):
+                totals[index] += value
+        return totals
+
+
+class CounterChild:
+    """
+        The value of a counter or gauge for one combination of labels.
+    """
+
+    def __init__(self):
+        self.values = ShardedValues(1)
+
+    def inc(self, amount=1):
+        self.values.shard()[0] += amount
+
+    def dec(self, amount=1):
+        self.values.shard()[0] -= amount
+
+    def value(self):
+        return self.values.totals()[0]
+
+
+class HistogramChild:
+    """
+        The observations of a histogram for one combination of labels.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket, one for values above the last bucket, and the sum of the values.
+        self.values = ShardedValues(len(buckets) + 2)
+
+    def observe(self, value):
+        shard = self.values.shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def time(self):
+        """
+            Returns a context manager observing the time spent in its block.
+        """
+        return Timer(self)
+
+
+class Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(
+        name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')) for name, value in pairs) + '}'
+
+
+class Metric:
+    """
+        Base class of the metrics, holding one child per combination of label values.
+
+        Children are looked up without locking; the lock is only taken to create the child of a new
+        combination.
+
+        Attributes:
+            name (str): The name of the metric.
+            documentation (str): The help text of the metric.
+            label_names (tuple): The names of the labels of the metric.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, label_names=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    def labels(self, *values):
+        """
+            Returns the child of the metric recording the values of a combination of labels.
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.make_child())
+        return child
+
+    def make_child(self):
+        raise NotImplementedError
+
+    def samples(self, child):
+        """
+            Returns the (suffix, extra labels, value) of the samples rendered for a child.
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        for values, child in sorted(self._children.items()):
+            labels = list(zip(self.label_names, values))
+            for suffix, extra, value in self.samples(child):
+                lines.append('{}{}{} {}'.format(self.name, suffix, format_labels(labels + extra), format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+        A value only going up, such as a number of events.
+    """
+    kind = 'counter'
+
+    def make_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self, child):
+        return [('', [], child.value())]
+
+
+class Gauge(Counter):
+    """
+        A value going up and down, such as a number of open connections.
+    """
+    kind = 'gauge'
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    """
+        A distribution of observed values, counted in cumulative buckets along with their sum.
+
+        Attributes:
+            buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, label_names, registry)
+
+    def make_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self, child):
+        totals = child.values.totals()
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals[:-1]):
+            cumulative += count
+            samples.append(('_bucket', [('le', format_value(bound))], cumulative))
+        samples.append(('_sum', [], totals[-1]))
+        samples.append(('_count', [], cumulative))
+        return samples
+
+
+def render(registry=REGISTRY):
+    """
+        Returns the current values of the metrics of a registry in the Prometheus text format.
+    """
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests, by view, method and status code.',
+    ['view', 'method', 'status'])
+
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Time spent running SQL queries, by database alias.',
+    ['alias'], buckets=FAST_BUCKETS)
+
+WEBSOCKET_CONNECTIONS = Gauge('websocket_connections', 'Open WebSocket connections.')
+
+WEBSOCKET_FRAMES = Counter(
+    'websocket_frames_total', 'WebSocket frames received from and sent to clients, by direction.', ['direction'])
+
+CHAT_MESSAGES = Counter('chat_messages_total', 'Chat messages posted.')
+
+GROUP_SEND_DURATION = Histogram(
+    'channel_layer_group_send_seconds', 'Time spent broadcasting events through the channel layer.',
+    buckets=FAST_BUCKETS)
+
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups, by cache and result; the hit ratio is hits over all lookups.',
+    ['cache', 'result'])
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class MetricsMiddleware:
+    """
+        Records the latency of every HTTP request, labelled with the name of the view that handled it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        return self.record(request, self.get_response(request), start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        return self.record(request, await self.get_response(request), start)
+
+    def record(self, request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        HTTP_REQUEST_DURATION.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - start)
+        return response
+
+
+class WebsocketMetricsMiddleware:
+    """
+        ASGI middleware counting open WebSocket connections and the frames they exchange.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await self.app(scope, receive, send)
+
+        received = WEBSOCKET_FRAMES.labels('in')
+        sent = WEBSOCKET_FRAMES.labels('out')
+        accepted = False
+
+        async def counting_receive():
+            message = await receive()
+            if message['type'] == 'websocket.receive':
+                received.inc()
+            return message
+
+        async def counting_send(message):
+            nonlocal accepted
+            if message['type'] == 'websocket.accept' and not accepted:
+                accepted = True
+                WEBSOCKET_CONNECTIONS.inc()
+            elif message['type'] == 'websocket.send':
+                sent.inc()
+            await send(message)
+
+        try:
+            return await self.app(scope, counting_receive, counting_send)
+        finally:
+            if accepted:
+                WEBSOCKET_CONNECTIONS.dec()
@@ -0,0 +1,72 @@
+from hashlib import sha256
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from .db import RequestRouting, request_routing
+
+
+class PrimaryPinningMiddleware:
+    """
+        Pins the reads of a client to the primary database for a short while after it writes.
+
+        Replicas may lag behind the primary, so a teacher reading a course right after editing it could see
+        the old version. When a request writes, its client is remembered for `REPLICA_PIN_SECONDS` and the
+        reads of its following requests are routed to the primary. Clients are identified by their
+        `Authorization` header, or their session cookie, and remembered in the default cache, which has to be
+        shared between processes for pins to hold across them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        key = self.pin_key(request)
+        pinned = key is not None and cache.get(key) is not None
+        routing = RequestRouting(pinned=pinned)
+
+        token = request_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_routing.reset(token)
+
+        if routing.wrote and key is not None:
+            cache.set(key, True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+        return response
+
+    async def __acall__(self, request):
+        key = self.pin_key(request)
+        pinned = key is not None and await cache.aget(key) is not None
+        routing = RequestRouting(pinned=pinned)
+
+        token = request_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_routing.reset(token)
+
+        if routing.wrote and key is not None:
+            await cache.aset(key, True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+        return response
+
+    def pin_key(self, request):
+        """
+            Returns the cache key remembering the recent writes of the client of a request, or None for
+            anonymous clients.
+        """
+        credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credentials:
+            return None
+        return 'replica-pin:' + sha256(credentials.encode()).hexdigest()
@@ -22,6 +22,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'codecraft',
     'users',
     'courses',
     'corsheaders',
@@ -44,11 +45,15 @@ AUTHENTICATION_BACKENDS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'codecraft.authentication.TokenAuthentication',
     ],
 }
 
 MIDDLEWARE = [
+    'codecraft.metrics.MetricsMiddleware',
+    'codecraft.instrumentation.QueryInstrumentationMiddleware',
+    'codecraft.middleware.PrimaryPinningMiddleware',
+    'codecraft.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,13 +88,95 @@ WSGI_APPLICATION = 'codecraft.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Transactions take the write lock as they begin, so concurrent writers, such as the threads of the chat
+# database executor, queue on it for up to `timeout` seconds instead of failing with "database is locked"
+# when a read transaction tries to upgrade to a write.
+SQLITE_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    },
+    # Replica serving reads. By default a second connection to the same file, so reads never queue behind
+    # the write lock; DATABASE_REPLICA_PATH points it to a copy standing in for a lagging replica.
+    'read': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': dict(SQLITE_OPTIONS),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['codecraft.db.ReadWriteRouter']
+
+# Aliases of the databases reads are spread over.
+DATABASE_REPLICAS = ['read']
+
+# Seconds during which the reads of a client go to the primary database after it wrote.
+REPLICA_PIN_SECONDS = 5
+
+# Pragmas applied to every SQLite connection when it is opened. The busy timeout is set by the `timeout` of
+# SQLITE_OPTIONS.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Negative sizes are in KiB: 20 MiB of page cache per connection.
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
 
+# Number of times a request, or a WebSocket frame, may run the same query before it is reported as an N+1 pattern.
+SQL_N_PLUS_ONE_THRESHOLD = 10
+
+# Whether requests running N+1 queries fail instead of only logging a warning. Enabled by the test runner.
+SQL_N_PLUS_ONE_RAISE = False
+
+TEST_RUNNER = 'codecraft.test_runner.TestRunner'
+
+# Whether views deriving from AsyncAPIView run their handlers on the event loop. Disable when serving the
+# project through WSGI, where every asynchronous view would start an event loop of its own.
+ASYNC_VIEWS = True
+
+# Bearer token required to read the metrics endpoint. Left unset, the endpoint is public and should only be
+# reachable from the internal network.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Responses shorter than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = 1024
+
+# Content codings responses are compressed with, most preferred first. Codings whose package is not installed,
+# brotli for 'br' and zstandard for 'zstd', are skipped.
+COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']
+
+# Seconds during which a version of the serialized details of a course, and its compressed variants, are cached.
+COURSE_DOCUMENT_TTL = 3600
+
+# Seconds during which the versions of course documents and of the course list are cached. Processes that do not
+# share the cache serve a course for up to this long after it changed, and a catalog snapshot older than this is
+# no longer served, so it should be rebuilt more often.
+COURSE_VERSION_TTL = 600
+
+# Seconds a process building a course document may hold the lock making other processes wait for it. Past it,
+# they build the document themselves.
+COURSE_DOCUMENT_LOCK_TIMEOUT = 10
+
+# Catalog snapshot written by `build_catalog_snapshot` and mapped by every worker to serve the course list and
+# course details. Left unset, courses are always read from the cache or the database.
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH')
+
+# Seconds between two checks of whether the catalog snapshot was rebuilt.
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 1
+
+# Seconds a fresh worker may spend importing the ASGI application, Django setup included, as measured by
+# `profile_startup`.
+STARTUP_BUDGET_SECONDS = 1.5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -151,6 +238,85 @@ if DJANGO_ENVIRONMENT == 'prod':
         },
     }
 
+# Single-host deployments running several ASGI workers can fan out between them over Unix domain sockets
+# instead of Redis by setting CHANNEL_LAYER=unix.
+if os.getenv('CHANNEL_LAYER') == 'unix':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'communications.layers.UnixSocketChannelLayer',
+            'CONFIG': {
+                'path': os.getenv('CHANNEL_LAYER_PATH', '/tmp/codecraft-channels'),
+            },
+        },
+    }
+
+# Cache holding course documents, their versions and the locks coordinating their builds. The in-memory cache is
+# per process, so changes to a course only reach the other workers once their versions expire; deployments running
+# several workers share a Redis cache instead, set with CACHE_REDIS_URL outside production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if DJANGO_ENVIRONMENT == 'prod' or os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        },
+    }
+
+# Maximum number of user pairs whose chat room is kept in the per-process room cache.
+CHAT_ROOM_CACHE_SIZE = 10000
+
+# Number of threads, each holding its own database connection, running the chat consumers' database work.
+# 0 falls back to the single thread-sensitive thread shared by the whole process.
+CHAT_DB_EXECUTOR_WORKERS = int(os.getenv('CHAT_DB_EXECUTOR_WORKERS', 8))
+
+# Seconds during which read positions sent by a chat client are coalesced into a single read receipt.
+CHAT_READ_RECEIPT_DELAY = 0.5
+
+# Seconds without any frame from a chat connection after which its user is reported as away.
+CHAT_PRESENCE_TTL = 60
+
+# Seconds without a keystroke after which a user is reported as no longer typing.
+CHAT_TYPING_TIMEOUT = 3
+
+# Maximum number of events waiting to be sent to a single chat client.
+CHAT_SEND_QUEUE_SIZE = 256
+
+# Maximum number of events sent in one frame to chat clients that opted into batching with `batch=1`.
+CHAT_SEND_BATCH_SIZE = 20
+
+# What to do when a chat client's send queue is full: 'drop_oldest' or 'disconnect'.
+CHAT_SLOW_CONSUMER_POLICY = 'drop_oldest'
+
+# Seconds during which the members of a course are cached for course chat room membership checks.
+CHAT_COURSE_MEMBERS_TTL = 300
+
+# Number of missed messages replayed per frame to a chat client reconnecting with its last seen message.
+CHAT_SYNC_BATCH_SIZE = 100
+
+# Maximum number of missed messages replayed on reconnect; clients further behind read the history endpoint.
+CHAT_SYNC_MAX_MESSAGES = 1000
+
+# Maximum number of chat rooms a single multiplexed connection may subscribe to.
+CHAT_MULTIPLEX_MAX_ROOMS = 100
+
+# Age in days after which chat messages are moved to compressed archive blocks by `archive_messages`.
+CHAT_ARCHIVE_AFTER_DAYS = 90
+
+# Maximum number of messages stored in a single archive block.
+CHAT_ARCHIVE_BLOCK_SIZE = 500
+
+# Compression of new archive blocks: 'zlib', or 'zstd' when the zstandard package is installed.
+CHAT_ARCHIVE_CODEC = 'zlib'
+
+# Maximum number of readers a status update is copied to when posted. Updates with a larger audience
+# are merged into feeds when they are read.
+STATUS_FEED_FANOUT_LIMIT = 1000
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
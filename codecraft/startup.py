@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from importlib import import_module
+from pathlib import Path
+
+# Modules only needed once a worker serves its first WebSocket connection or request, which a cold start
+# must not import.
+LAZY_MODULES = [
+    'communications.consumers',
+    'communications.serializers',
+    'courses.serializers',
+    'rest_framework.serializers',
+    'msgpack',
+]
+
+
+class ImportTiming:
+    """
+        The time spent importing a module, as reported by `python -X importtime`.
+
+        Attributes:
+            name (str): The name of the module.
+            self (float): The time spent running the module itself, in seconds.
+            cumulative (float): The time spent running the module and the modules it imported first.
+            depth (int): How deeply nested the import was, 0 for the modules imported by the profiled module.
+    """
+
+    def __init__(self, name, self_time, cumulative, depth):
+        self.name = name
+        self.self = self_time
+        self.cumulative = cumulative
+        self.depth = depth
+
+    @property
+    def package(self):
+        return self.name.split('.')[0]
+
+
+class StartupProfile:
+    """
+        The cost of importing an ASGI or WSGI module in a fresh interpreter, as a worker does when it starts.
+
+        Attributes:
+            module (str): The profiled module.
+            total (float): The time spent importing the module, Django setup included, in seconds.
+            imports (list[ImportTiming]): The time spent importing every module.
+            ready (dict): The time spent in the `ready` method of every application, by label.
+            modules (list[str]): The modules loaded once the import completed.
+    """
+
+    def __init__(self, module, total, imports, ready, modules):
+        self.module = module
+        self.total = total
+        self.imports = imports
+        self.ready = ready
+        self.modules = modules
+
+    def slowest(self, top=20, cumulative=False):
+        """
+            Returns the `top` modules taking the longest to import, by self or cumulative time.
+        """
+        key = (lambda timing: timing.cumulative) if cumulative else (lambda timing: timing.self)
+        return sorted(self.imports, key=key, reverse=True)[:top]
+
+    def packages(self):
+        """
+            Returns the self time of the modules of every top-level package, slowest first.
+        """
+        totals = defaultdict(float)
+        for timing in self.imports:
+            totals[timing.package] += timing.self
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def eager_modules(self, modules=LAZY_MODULES):
+        """
+            Returns the modules of `modules` the import loaded although they should be loaded lazily.
+        """
+        loaded = set(self.modules)
+        return [module for module in modules if module in loaded]
+
+
+def parse_importtime(output):
+    """
+        Parses the lines written to stderr by `python -X importtime`, skipping any other line.
+
+        Returns:
+            list[ImportTiming]: The time spent importing every module, in import order.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        indent = len(name) - len(name.lstrip())
+        imports.append(ImportTiming(
+            name.strip(), int(fields[0]) / 1e6, int(fields[1]) / 1e6, max(indent - 1, 0) // 2))
+    return imports
+
+
+def measure_startup(module='codecraft.asgi'):
+    """
+        Imports a module in a fresh interpreter and measures what its cold start costs.
+
+        Raises:
+            RuntimeError: If the module fails to import.
+    """
+    base_dir = Path(__file__).resolve().parent.parent
+    environment = dict(os.environ)
+    environment.setdefault('DJANGO_SETTINGS_MODULE', 'codecraft.settings')
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', __name__, module],
+        cwd=base_dir, env=environment, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError("Importing {} failed:\n{}".format(
+            module, '\n'.join(line for line in result.stderr.splitlines() if not line.startswith('import time:'))))
+
+    report = json.loads(result.stdout.splitlines()[-1])
+    # The profiler is imported first, before the profiled module.
+    imports = [timing for timing in parse_importtime(result.stderr) if timing.name != __name__]
+    return StartupProfile(module, report['total'], imports, report['ready'], report['modules'])
+
+
+def time_ready(timings):
+    """
+        Makes every application configuration created from now on record the time spent in its `ready`
+        method in `timings`.
+    """
+    from django.apps import AppConfig
+
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        app_config = create(cls, entry)
+        ready = app_config.ready
+
+        def timed_ready():
+            start = time.perf_counter()
+            try:
+                return ready()
+            finally:
+                timings[app_config.label] = time.perf_counter() - start
+
+        app_config.ready = timed_ready
+        return app_config
+
+    AppConfig.create = classmethod(timed_create)
+
+
+def main(module):
+    """
+        Imports the module and writes how long it took as JSON, run by `measure_startup` in the profiled
+        interpreter.
+    """
+    ready = {}
+    start = time.perf_counter()
+    time_ready(ready)
+    import_module(module)
+    total = time.perf_counter() - start
+    print(json.dumps({'total': total, 'ready': ready, 'modules': sorted(sys.modules)}))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,21 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+        Test runner failing the requests and WebSocket frames that run N+1 queries.
+
+        `SQL_N_PLUS_ONE_RAISE` only logs them by default, so a repeated query does not break the development
+        server or close the WebSocket connection of a consumer; the tests raise them instead, so per-row queries
+        surface before they reach production.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.raise_n_plus_one = override_settings(SQL_N_PLUS_ONE_RAISE=True)
+        self.raise_n_plus_one.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.raise_n_plus_one.disable()
+        super().teardown_test_environment(**kwargs)
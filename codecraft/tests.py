@@ -0,0 +1,468 @@
+import asyncio
+import gzip
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from courses.models import Course
+from users.models import User
+
+from .coalescing import SingleFlight, get_or_build
+from .compression import CompressionMiddleware, negotiate_encoding
+from .db import configure_sqlite
+from .instrumentation import (NPlusOneQueries, QueryInstrumentationMiddleware, QueryStats,
+                              WebsocketQueryInstrumentationMiddleware, fingerprint, query_stats)
+from .metrics import WEBSOCKET_CONNECTIONS, Counter, Histogram, WebsocketMetricsMiddleware, render
+from .startup import measure_startup, parse_importtime
+
+
+class DatabaseConfigurationTests(TransactionTestCase):
+    """
+        Tests for the SQLite pragmas applied on connection and the routing of reads to the read connection.
+    """
+    databases = {'default', 'read'}
+
+    def test_pragmas_applied(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -20000)
+
+    def test_pragmas_not_recorded(self):
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        try:
+            # As when a request opens a new connection, which the test database does not do as it is kept in memory.
+            configure_sqlite(None, connections['default'])
+            User.objects.using('default').exists()
+        finally:
+            query_stats.reset(token)
+
+        self.assertEqual(stats.count, 1)
+
+    def test_reads_routed_to_read_connection(self):
+        self.assertEqual(router.db_for_read(User), 'read')
+        self.assertEqual(router.db_for_write(User), 'default')
+
+        user = User.objects.create_user('user1', 'user1@example.com', 'password123')
+        self.assertEqual(User.objects.get(pk=user.pk)._state.db, 'read')
+
+    def test_reads_in_transaction_stay_on_default(self):
+        with transaction.atomic():
+            user = User.objects.create_user('user1', 'user1@example.com', 'password123')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+    def test_reads_for_instance_follow_it(self):
+        user = User.objects.create_user('user1', 'user1@example.com', 'password123')
+
+        self.assertEqual(router.db_for_read(Course, instance=User.objects.using('default').get(pk=user.pk)), 'default')
+        self.assertEqual(router.db_for_read(Course, instance=User.objects.get(pk=user.pk)), 'read')
+
+    def test_migrations_only_on_default(self):
+        self.assertTrue(router.allow_migrate('default', 'users'))
+        self.assertFalse(router.allow_migrate('read', 'users'))
+
+
+class PrimaryPinningTests(TransactionTestCase):
+    """
+        Tests that clients read from the replica, except for a short while after they wrote.
+    """
+    databases = {'default', 'read'}
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'password123', user_type=User.UserType.TEACHER)
+        self.course = Course.objects.create(teacher=self.teacher, name="Course")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.teacher).key)
+
+    def get_teachers(self):
+        """
+            Reads the teacher list, returning the number of queries run on the primary and on the replica.
+            Course details are not used, as their documents are always built from the primary.
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['read']) as replica:
+            response = self.client.get(reverse('list_teachers'))
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def update_course(self):
+        response = self.client.patch(reverse('course_edit'), {'course_id': self.course.pk, 'name': "New"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_reads_go_to_replica(self):
+        primary, replica = self.get_teachers()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reads_pinned_to_primary_after_write(self):
+        self.update_course()
+
+        primary, replica = self.get_teachers()
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.update_course()
+
+        primary, replica = self.get_teachers()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+
+class QueryInstrumentationTests(TestCase):
+    """
+        Tests for the recording of the queries of requests and WebSocket connections and the detection of N+1 queries.
+    """
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.teacher = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'password123', user_type=User.UserType.TEACHER)
+        for i in range(3):
+            Course.objects.create(teacher=self.teacher, name="Course {}".format(i))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM course WHERE id = 12 AND name = 'It''s'"),
+            fingerprint("SELECT *  FROM course WHERE id = 7 AND name = 'Other'"))
+        self.assertEqual(
+            fingerprint('SELECT * FROM course WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM course WHERE id IN (%s)'))
+        self.assertNotEqual(fingerprint('SELECT * FROM course'), fingerprint('SELECT * FROM section'))
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('course_list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('"{} queries"'.format(len(queries)), response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def list_teachers(self, request):
+        """
+            A view reading the teacher of every course with a query of its own.
+        """
+        return HttpResponse(', '.join(str(course.teacher) for course in Course.objects.all()))
+
+    def test_n_plus_one_raised_in_tests(self):
+        # Only the test runner raises them; the development server and WebSocket consumers log them.
+        self.assertTrue(settings.SQL_N_PLUS_ONE_RAISE)
+
+    @override_settings(SQL_N_PLUS_ONE_THRESHOLD=3, SQL_N_PLUS_ONE_RAISE=True)
+    def test_n_plus_one_raises(self):
+        middleware = QueryInstrumentationMiddleware(self.list_teachers)
+        with self.assertLogs('codecraft.sql', 'WARNING'), self.assertRaises(NPlusOneQueries):
+            middleware(RequestFactory().get('/teachers/'))
+
+    @override_settings(SQL_N_PLUS_ONE_THRESHOLD=3, SQL_N_PLUS_ONE_RAISE=False)
+    def test_n_plus_one_logged(self):
+        middleware = QueryInstrumentationMiddleware(self.list_teachers)
+        with self.assertLogs('codecraft.sql', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/teachers/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /teachers/: 3 x SELECT', logs.output[0])
+        self.assertIn('db-repeats;desc="3 max"', response['Server-Timing'])
+
+    @override_settings(SQL_N_PLUS_ONE_THRESHOLD=3, SQL_N_PLUS_ONE_RAISE=True)
+    def test_websocket_queries(self):
+        @database_sync_to_async
+        def load_courses(count):
+            for course in Course.objects.all()[:count]:
+                str(course.teacher)
+
+        async def app(scope, receive, send):
+            await receive()
+            await load_courses(1)
+            await send({'type': 'websocket.accept'})
+            while (await receive())['type'] == 'websocket.receive':
+                await load_courses(3)
+
+        frames = [{'type': 'websocket.connect'}, {'type': 'websocket.receive', 'text': 'a'},
+                  {'type': 'websocket.receive', 'text': 'b'}]
+        sent = []
+
+        async def receive():
+            return frames.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = WebsocketQueryInstrumentationMiddleware(app)
+        with self.assertLogs('codecraft.sql', 'WARNING'), self.assertRaises(NPlusOneQueries):
+            async_to_sync(middleware)({'type': 'websocket', 'path': '/ws/chat/'}, receive, send)
+
+        headers = dict(sent[0]['headers'])
+        self.assertIn(b'"2 queries"', headers[b'server-timing'])
+        # The queries of the first frame are reported when the second one arrives.
+        self.assertEqual(frames, [])
+
+
+class MetricsTests(TestCase):
+    """
+        Tests for the metrics recorded by the middlewares and their exposition in the Prometheus format.
+    """
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def test_render(self):
+        registry = []
+        counter = Counter('events_total', 'Events.', ['kind'], registry=registry)
+        histogram = Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1), registry=registry)
+        counter.labels('a"b').inc()
+        counter.labels('a"b').inc(2)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        lines = render(registry).splitlines()
+        self.assertIn('# TYPE events_total counter', lines)
+        self.assertIn('events_total{kind="a\\"b"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum 5.55', lines)
+        self.assertIn('latency_seconds_count 3', lines)
+
+    def test_counts_from_threads(self):
+        counter = Counter('events_total', 'Events.', registry=None)
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.labels().value(), 4000)
+
+    def test_endpoint(self):
+        self.client.get(reverse('course_list'))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="course_list",method="GET",status="200"}', content)
+        self.assertIn('db_query_duration_seconds_count{alias="default"}', content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_websocket_connections(self):
+        counts = []
+
+        async def app(scope, receive, send):
+            await receive()
+            await send({'type': 'websocket.accept'})
+            counts.append(WEBSOCKET_CONNECTIONS.labels().value())
+
+        async def receive():
+            return {'type': 'websocket.connect'}
+
+        async def send(message):
+            pass
+
+        before = WEBSOCKET_CONNECTIONS.labels().value()
+        async_to_sync(WebsocketMetricsMiddleware(app))({'type': 'websocket'}, receive, send)
+        self.assertEqual(counts, [before + 1])
+        self.assertEqual(WEBSOCKET_CONNECTIONS.labels().value(), before)
+
+
+class StartupTests(SimpleTestCase):
+    """
+        Tests that the ASGI application starts within its budget and defers loading the WebSocket stack.
+    """
+
+    def test_cold_start_within_budget(self):
+        profile = measure_startup('codecraft.asgi')
+
+        self.assertLess(profile.total, settings.STARTUP_BUDGET_SECONDS)
+        self.assertEqual(profile.eager_modules(), [])
+        self.assertIn('communications', profile.ready)
+        self.assertTrue(any(timing.name == 'django.core.asgi' for timing in profile.imports))
+
+    def test_parse_importtime(self):
+        imports = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+            "Traceback (most recent call last):\n")
+
+        self.assertEqual([(timing.name, timing.depth) for timing in imports], [('json.decoder', 1), ('json', 0)])
+        self.assertAlmostEqual(imports[1].cumulative, 0.00042)
+        self.assertEqual(imports[0].package, 'json')
+
+    def test_websocket_application_built_on_first_use(self):
+        from .asgi import LazyApplication
+
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope['type'])
+
+        def factory():
+            calls.append('built')
+            return app
+
+        application = LazyApplication(factory)
+        self.assertEqual(calls, [])
+        async_to_sync(application)({'type': 'websocket'}, None, None)
+        async_to_sync(application)({'type': 'websocket'}, None, None)
+        self.assertEqual(calls, ['built', 'websocket', 'websocket'])
+
+
+class CompressionTests(SimpleTestCase):
+    """
+        Tests for the negotiation of content codings and the compression of responses.
+    """
+
+    def respond(self, content, accept_encoding='gzip', content_type='application/json'):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(content, content_type=content_type))
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0, deflate'), None)
+        self.assertEqual(negotiate_encoding('*'), negotiate_encoding('zstd, br, gzip'))
+        self.assertEqual(negotiate_encoding('identity'), None)
+        self.assertEqual(negotiate_encoding(''), None)
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_compresses_large_responses(self):
+        content = b'{"name": "Course"}' * 100
+        response = self.respond(content)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_skips_small_and_incompressible_responses(self):
+        self.assertFalse(self.respond(b'{}').has_header('Content-Encoding'))
+        self.assertFalse(self.respond(b'\x89PNG' * 100, content_type='image/png').has_header('Content-Encoding'))
+
+        response = self.respond(b'{"name": "Course"}' * 100, accept_encoding='')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+
+class CoalescingTests(SimpleTestCase):
+    """
+        Tests that concurrent builds of the same value are coalesced within and across processes.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_threads_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def build():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('key', build)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flights.do('key', build))) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        # Followers arriving after the leader returned may start a call of their own.
+        self.assertLessEqual(len(calls), 2)
+
+    def test_coroutines_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def build(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            if value == 'error':
+                raise ValueError(value)
+            return value
+
+        async def run():
+            results = await asyncio.gather(*[flights.ado('key', build, 'value') for _ in range(5)])
+            errors = await asyncio.gather(*[flights.ado('other', build, 'error') for _ in range(3)],
+                                          return_exceptions=True)
+            return results, errors
+
+        results, errors = async_to_sync(run)()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(calls, ['value', 'error'])
+
+    def test_waits_for_other_process(self):
+        # Another process holds the lock, and caches the value shortly after.
+        cache.add('key:lock', True, 10)
+        timer = threading.Timer(0.1, lambda: cache.set('key', 'theirs'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(get_or_build('key', lambda: 'ours', 60, 10), 'theirs')
+
+    def test_builds_when_lock_expires(self):
+        cache.add('key:lock', True, 10)
+
+        self.assertEqual(get_or_build('key', lambda: 'ours', 60, 0.1), 'ours')
+        self.assertEqual(cache.get('key'), 'ours')
+
+
+class BenchmarkTests(TransactionTestCase):
+    """
+        Tests for the measurements of the HTTP endpoint benchmark.
+    """
+    databases = {'default', 'read'}
+
+    def test_queries_counted_on_every_alias(self):
+        from benchmarks.http_endpoints import measure
+
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        endpoint = ('course_list', 'get', reverse('course_list'), student, None, None)
+
+        # The course list only reads, from the replica.
+        self.assertEqual(router.db_for_read(Course), 'read')
+        result = measure(APIClient(), endpoint, iterations=1, warmup=0)
+        self.assertGreater(result['queries'], 0)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import metrics
+
 urlpatterns = [
     # User management URLs
     path('', include('users.urls')),
@@ -12,5 +14,8 @@ urlpatterns = [
     path('courses/', include('courses.urls')),
 
     # Communications URLs
-    path('comms/', include('communications.urls'))
+    path('comms/', include('communications.urls')),
+
+    # Prometheus metrics of the process
+    path('metrics/', metrics, name='metrics')
 ]
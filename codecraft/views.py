@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .metrics import render
+
+
+def metrics(request):
+    """
+        Exposes the metrics of the process in the Prometheus text format.
+
+        When `METRICS_TOKEN` is set, scrapers have to send it as a bearer token.
+
+        Returns:
+            HttpResponse: The metrics, or a 403 response if the token is missing or wrong.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
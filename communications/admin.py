@@ -1,8 +1,8 @@
 from django.contrib import admin
 
-from .models import ChatRoom, Message
+from .models import ArchivedMessageBlock, ChatRoom, ChatMembership, Message, StatusUpdate
 
 
-@admin.register(ChatRoom, Message)
+@admin.register(ChatRoom, ChatMembership, Message, ArchivedMessageBlock, StatusUpdate)
 class ChatAdmin(admin.ModelAdmin):
     pass
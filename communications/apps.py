@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CommunicationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'communications'
+
+    def ready(self):
+        # Registers the signal handlers of the app.
+        from . import signals  # noqa: F401
@@ -0,0 +1,248 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedMessageBlock, ChatRoom, Message
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress(data, codec):
+    """
+        Compresses the serialized messages of a block.
+
+        Raises:
+            ValueError: If the codec is unknown or its package is not installed.
+    """
+    if codec == 'zlib':
+        return zlib.compress(data, 6)
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError("Unavailable archive codec: {}".format(codec))
+
+
+def decompress(data, codec):
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError("Unavailable archive codec: {}".format(codec))
+
+
+def pack_messages(messages):
+    lines = [json.dumps({
+        'id': message.pk,
+        'sender': message.sender_id,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    }, separators=(',', ':')) for message in messages]
+    return '\n'.join(lines).encode()
+
+
+def unpack_block(block):
+    """
+        Returns the messages of an archive block as unsaved Message instances, oldest first.
+    """
+    data = decompress(bytes(block.data), block.codec)
+    messages = []
+    for line in data.decode().split('\n'):
+        row = json.loads(line)
+        messages.append(Message(
+            id=row['id'],
+            room_id=block.room_id,
+            sender_id=row['sender'],
+            content=row['content'],
+            timestamp=datetime.fromisoformat(row['timestamp']),
+        ))
+    return messages
+
+
+def archive_room(room, cutoff, block_size, codec):
+    """
+        Moves the messages of a room sent before the cutoff into archive blocks.
+
+        The latest message of the room stays in the message table, as the inbox keeps a reference to it.
+        Each block is written and its messages deleted in the same transaction, so an interrupted run leaves
+        every message in exactly one tier.
+
+        Returns:
+            int: The number of messages archived.
+    """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            messages = list(Message.objects.filter(room=room, timestamp__lt=cutoff).exclude(
+                pk=F('room__last_message')).order_by('id')[:block_size])
+            if not messages:
+                return archived
+
+            ArchivedMessageBlock.objects.create(
+                room=room,
+                first_message_id=messages[0].pk,
+                last_message_id=messages[-1].pk,
+                message_count=len(messages),
+                codec=codec,
+                data=compress(pack_messages(messages), codec),
+            )
+            Message.objects.filter(pk__in=[message.pk for message in messages]).delete()
+            archived += len(messages)
+
+
+def archive_messages(days=None, block_size=None, codec=None):
+    """
+        Moves chat messages older than the configured age into compressed per-room archive blocks.
+
+        Archived messages keep their IDs and are still returned by the room history, but no longer weigh on the
+        message table and its indexes, and are no longer returned by the full-text search.
+
+        Args:
+            days (int): The age in days after which messages are archived, `CHAT_ARCHIVE_AFTER_DAYS` by default.
+            block_size (int): The maximum number of messages per block, `CHAT_ARCHIVE_BLOCK_SIZE` by default.
+            codec (str): The compression of the blocks, `CHAT_ARCHIVE_CODEC` by default.
+
+        Returns:
+            int: The number of messages archived.
+    """
+    days = getattr(settings, 'CHAT_ARCHIVE_AFTER_DAYS', 90) if days is None else days
+    block_size = block_size or getattr(settings, 'CHAT_ARCHIVE_BLOCK_SIZE', 500)
+    codec = codec or getattr(settings, 'CHAT_ARCHIVE_CODEC', 'zlib')
+    # Fail before touching any room if the codec cannot be used.
+    compress(b'', codec)
+
+    cutoff = timezone.now() - timedelta(days=days)
+    rooms = ChatRoom.objects.filter(messages__timestamp__lt=cutoff).distinct()
+
+    return sum(archive_room(room, cutoff, block_size, codec) for room in rooms)
+
+
+def archived_before(room_id, before, limit):
+    """
+        Returns up to `limit` archived messages of a room with an ID below `before`, newest first.
+        Blocks are decompressed from the newest one down until enough messages are found.
+    """
+    blocks = ArchivedMessageBlock.objects.filter(room_id=room_id)
+    if before is not None:
+        blocks = blocks.filter(first_message_id__lt=before)
+
+    messages = []
+    for block in blocks.order_by('-first_message_id').iterator():
+        messages.extend(message for message in reversed(unpack_block(block))
+                        if before is None or message.pk < before)
+        if limit is not None and len(messages) >= limit:
+            return messages[:limit]
+    return messages
+
+
+def archived_after(room_id, after, limit):
+    """
+        Returns up to `limit` archived messages of a room with an ID above `after`, oldest first.
+    """
+    blocks = ArchivedMessageBlock.objects.filter(room_id=room_id)
+    if after is not None:
+        blocks = blocks.filter(last_message_id__gt=after)
+
+    messages = []
+    for block in blocks.order_by('first_message_id').iterator():
+        messages.extend(message for message in unpack_block(block)
+                        if after is None or message.pk > after)
+        if limit is not None and len(messages) >= limit:
+            return messages[:limit]
+    return messages
+
+
+def history_before(room_id, before=None, limit=None):
+    """
+        Returns the messages of a room preceding a message, oldest first, across the hot and archived tiers.
+
+        Archived messages are always older than the messages left in the table, so the archive is only read
+        when the table alone cannot fill the page.
+
+        Args:
+            room_id (UUID): The ID of the chat room.
+            before (int): Only messages with a lower ID are returned. All messages if None.
+            limit (int): The maximum number of messages, counted from the newest. Unlimited if None.
+
+        Returns:
+            list: The messages, oldest first.
+    """
+    hot = Message.objects.filter(room_id=room_id)
+    if before is not None:
+        hot = hot.filter(id__lt=before)
+    hot = list(hot.order_by('-id')[:limit] if limit is not None else hot.order_by('-id'))
+
+    if limit is None or len(hot) < limit:
+        oldest = hot[-1].pk if hot else before
+        remaining = None if limit is None else limit - len(hot)
+        hot.extend(archived_before(room_id, oldest, remaining))
+
+    hot.reverse()
+    return hot
+
+
+async def ahistory_before(room_id, before=None, limit=None):
+    """
+        Asynchronous version of `history_before`, only leaving the event loop when the archive is read.
+    """
+    hot = Message.objects.filter(room_id=room_id)
+    if before is not None:
+        hot = hot.filter(id__lt=before)
+    hot = [message async for message in (hot.order_by('-id')[:limit] if limit is not None else hot.order_by('-id'))]
+
+    if limit is None or len(hot) < limit:
+        oldest = hot[-1].pk if hot else before
+        remaining = None if limit is None else limit - len(hot)
+        hot.extend(await sync_to_async(archived_before)(room_id, oldest, remaining))
+
+    hot.reverse()
+    return hot
+
+
+def history_after(room_id, after, limit=None):
+    """
+        Returns the messages of a room following a message, oldest first, across the archived and hot tiers.
+
+        Args:
+            room_id (UUID): The ID of the chat room.
+            after (int): Only messages with a greater ID are returned.
+            limit (int): The maximum number of messages, counted from the oldest. Unlimited if None.
+
+        Returns:
+            list: The messages, oldest first.
+    """
+    messages = archived_after(room_id, after, limit)
+    if messages:
+        after = messages[-1].pk
+
+    if limit is None or len(messages) < limit:
+        hot = Message.objects.filter(room_id=room_id, id__gt=after).order_by('id')
+        messages.extend(hot if limit is None else hot[:limit - len(messages)])
+
+    return messages
+
+
+async def ahistory_after(room_id, after, limit=None):
+    """
+        Asynchronous version of `history_after`. Blocks are only decompressed, off the event loop, when the
+        archive holds messages following `after`.
+    """
+    messages = []
+    blocks = ArchivedMessageBlock.objects.filter(room_id=room_id, last_message_id__gt=after)
+    if await blocks.aexists():
+        messages = await sync_to_async(archived_after)(room_id, after, limit)
+    if messages:
+        after = messages[-1].pk
+
+    if limit is None or len(messages) < limit:
+        hot = Message.objects.filter(room_id=room_id, id__gt=after).order_by('id')
+        messages.extend([message async for message in (hot if limit is None else hot[:limit - len(messages)])])
+
+    return messages
@@ -0,0 +1,154 @@
+import json
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Encoded:
+    """
+        An event whose frames were already encoded in every wire format.
+
+        Group broadcasts carry these frames, so a message sent to a room is encoded once by the sender instead of
+        once per recipient, and every connection reuses the frame matching its codec.
+
+        Attributes:
+            payload (dict): The event itself.
+            frames (dict): The encoded event, keyed by codec name.
+    """
+    __slots__ = ('payload', 'frames')
+
+    def __init__(self, payload, frames):
+        self.payload = payload
+        self.frames = frames
+
+
+class RoomFrame:
+    """
+        An event of a chat room sent over a multiplexed connection, framed as `{"room": <key>, "event": <event>}`.
+
+        The event may be an `Encoded` broadcast, whose frames are embedded as they are rather than decoded
+        and encoded again for every subscriber.
+
+        Attributes:
+            room (str): The key the client subscribed to the room with.
+            event (dict | Encoded): The event itself.
+    """
+    __slots__ = ('room', 'event')
+
+    def __init__(self, room, event):
+        self.room = room
+        self.event = event
+
+
+class JsonCodec:
+    """
+        Default chat wire format: every frame is a JSON text frame.
+    """
+    name = 'json'
+    subprotocol = None
+
+    def encode_event(self, event):
+        if isinstance(event, RoomFrame):
+            return '{{"room":{},"event":{}}}'.format(json.dumps(event.room), self.encode_event(event.event))
+        if isinstance(event, Encoded):
+            return event.frames.get(self.name) or json.dumps(event.payload)
+        return json.dumps(event)
+
+    def encode(self, events):
+        """
+            Encodes events into the keyword arguments of `AsyncWebsocketConsumer.send`.
+            A single event is sent as an object, several as an array.
+        """
+        parts = [self.encode_event(event) for event in events]
+        text = parts[0] if len(parts) == 1 else '[' + ','.join(parts) + ']'
+        return {'text_data': text}
+
+    def decode(self, text_data=None, bytes_data=None):
+        return json.loads(text_data if text_data is not None else bytes_data)
+
+
+class MessagePackCodec:
+    """
+        Compact chat wire format negotiated with the `codecraft.msgpack.v1` subprotocol.
+
+        Every frame is a binary MessagePack frame, and message timestamps are sent as integer milliseconds since
+        the epoch instead of ISO 8601 strings, which makes frames smaller and cheaper to encode and parse.
+    """
+    name = 'msgpack'
+    subprotocol = 'codecraft.msgpack.v1'
+
+    def encode_event(self, event):
+        if isinstance(event, RoomFrame):
+            packer = msgpack.Packer(use_bin_type=True)
+            return (packer.pack_map_header(2) + packer.pack('room') + packer.pack(event.room)
+                    + packer.pack('event') + self.encode_event(event.event))
+        if isinstance(event, Encoded):
+            return event.frames.get(self.name) or self.encode_event(event.payload)
+        return msgpack.packb(compact_timestamp(event), use_bin_type=True)
+
+    def encode(self, events):
+        """
+            Encodes events into the keyword arguments of `AsyncWebsocketConsumer.send`.
+            A single event is sent as a map, several as an array built around the already encoded events.
+        """
+        parts = [self.encode_event(event) for event in events]
+        if len(parts) == 1:
+            return {'bytes_data': parts[0]}
+        return {'bytes_data': msgpack.Packer().pack_array_header(len(parts)) + b''.join(parts)}
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            return json.loads(text_data)
+        return msgpack.unpackb(bytes_data, raw=False)
+
+
+def compact_timestamp(payload):
+    """
+        Returns a copy of a payload whose ISO 8601 `timestamp` is replaced by integer milliseconds since the epoch,
+        as are those of the messages it carries in a `messages` list, such as sync frames.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    timestamp = payload.get('timestamp')
+    messages = payload.get('messages')
+    if not isinstance(timestamp, str) and not isinstance(messages, list):
+        return payload
+
+    compact = dict(payload)
+    if isinstance(timestamp, str):
+        # DRF renders UTC as a trailing 'Z', which `fromisoformat` only accepts from Python 3.11.
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        compact['timestamp'] = int(parsed.timestamp() * 1000)
+    if isinstance(messages, list):
+        compact['messages'] = [compact_timestamp(message) for message in messages]
+    return compact
+
+
+def encode_frames(event):
+    """
+        Encodes an event once in every available wire format, to be attached to a group broadcast.
+
+        Returns:
+            dict: The encoded event keyed by codec name.
+    """
+    codecs = [JsonCodec()] + ([MessagePackCodec()] if msgpack is not None else [])
+    return {codec.name: codec.encode_event(event) for codec in codecs}
+
+
+def negotiate_codec(subprotocols):
+    """
+        Picks the wire format of a connection from the subprotocols offered by the client.
+
+        Args:
+            subprotocols (list): The subprotocols listed by the client in order of preference.
+
+        Returns:
+            JsonCodec | MessagePackCodec: The codec to use for the connection. Its `subprotocol`
+            must be echoed when accepting the connection.
+    """
+    if msgpack is not None and MessagePackCodec.subprotocol in subprotocols:
+        return MessagePackCodec()
+    return JsonCodec()
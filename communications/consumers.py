@@ -1,14 +1,31 @@
-import json
+import asyncio
+from urllib.parse import parse_qs
 
-from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-from users.models import User
+from codecraft.metrics import CHAT_MESSAGES, GROUP_SEND_DURATION
 
-from .models import ChatRoom
+from .archive import history_after
+from .codecs import Encoded, RoomFrame, encode_frames, negotiate_codec
+from .db import database_executor
+from .models import ChatMembership
+from .outbound import OutboundQueue
+from .membership import acourse_member_ids
+from .presence import presence
+from .rooms import resolve_course_room, resolve_room
 from .serializers import MessageSerializer
 
 
+async def group_send(channel_layer, group, message):
+    """
+        Sends an event to a channel layer group, recording the time the channel layer takes to accept it.
+    """
+    with GROUP_SEND_DURATION.time():
+        await channel_layer.group_send(group, message)
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
     """
         Asynchronous WebSocket consumer that handles chat messages and rooms.
@@ -16,16 +33,66 @@ class ChatConsumer(AsyncWebsocketConsumer):
         This consumer manages WebSocket connections for real-time chat functionality, 
         including connecting and disconnecting users, receiving messages from users,
         and broadcasting messages to all users in a chat room.
+
+        Besides chat messages, clients may send `{"type": "read", "message_id": <id>}` frames as they read.
+        Read positions are coalesced per connection and flushed at most once every
+        `CHAT_READ_RECEIPT_DELAY` seconds, advancing the read cursor once and broadcasting a single
+        `{"type": "read", "user": <id>, "message_id": <id>}` receipt to the room.
+
+        Presence: members of the room receive `{"type": "presence", "user": <id>, "online": <bool>}` when the
+        other user comes online or goes away. Every frame counts as a heartbeat (clients may send
+        `{"type": "heartbeat"}` when idle); a connection silent for `CHAT_PRESENCE_TTL` seconds goes offline.
+        Presence is tracked per room and per process by the presence registry, so leaving a room is announced
+        there even while the user stays in other rooms, and reconciled across processes over the channel layer:
+        new connections query the room, and a connection seeing its own user reported offline while it is still
+        alive announces it again.
+
+        Typing: clients send `{"type": "typing"}` on keystrokes. Only the start of a burst is broadcast as
+        `{"type": "typing", "user": <id>, "typing": true}`; the end is broadcast once no keystroke arrived for
+        `CHAT_TYPING_TIMEOUT` seconds or the user sends the message.
+
+        Outbound events go through a bounded per-connection queue of `CHAT_SEND_QUEUE_SIZE` events drained by
+        its own task. Clients connecting with `batch=1` in the query string accept JSON arrays of up to
+        `CHAT_SEND_BATCH_SIZE` events in one frame whenever they fall behind. When the queue is full,
+        `CHAT_SLOW_CONSUMER_POLICY` either drops the oldest event or closes the connection with code 4008.
+
+        Clients offering the `codecraft.msgpack.v1` subprotocol exchange binary MessagePack frames with integer
+        millisecond timestamps instead of JSON text; the frame shapes are otherwise the same. Compression with
+        permessage-deflate is negotiated by the ASGI server (e.g. uvicorn's `--ws-per-message-deflate`).
+
+        Delta sync: a reconnecting client passes the ID of the last message it saw as `last_seen` in the query
+        string, or sends `{"type": "sync", "last_seen": <id>}` as its first frame. The messages it missed are
+        replayed oldest first in `{"type": "sync", "messages": [...], "more": <bool>, "truncated": <bool>}`
+        frames of up to `CHAT_SYNC_BATCH_SIZE` messages. Live messages broadcast while the replay runs are handled
+        once it ended, and those it already included are dropped, so every message arrives once. After
+        `CHAT_SYNC_MAX_MESSAGES` messages the replay stops with `truncated` set, and the client fetches the rest
+        from the history endpoint.
     """
+    SLOW_CONSUMER_CLOSE_CODE = 4008
+
     async def connect(self):
         """
             Handles the initial WebSocket connection.
-            Sets up the room based on the user and receiver IDs, and joins the channel group.
+            Sets up the room based on the URL, and joins the channel group.
         """
         self.user = self.scope['user']
-        self.receiver_id = self.scope['url_route']['kwargs']['receiver_id']
-        self.room = await self.get_room(self.user.id, self.receiver_id)
-        self.room_name = await self.parse_uuid(self.room.pk)
+        self.room_name = None
+        self.pending_read_id = 0
+        self.flushed_read_id = 0
+        self.read_flush_task = None
+        self.online = False
+        self.presence_task = None
+        self.typing_until = None
+        self.typing_task = None
+        self.outbound = None
+        self.replayed_id = 0
+        self.codec = negotiate_codec(self.scope.get('subprotocols', []))
+
+        try:
+            self.room_id, self.room_name = await self.find_room()
+        except (ObjectDoesNotExist, PermissionDenied):
+            await self.close()
+            return
 
         # Adds this connection to the chat room's group for message broadcasting.
         await self.channel_layer.group_add(
@@ -33,27 +100,96 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept(subprotocol=self.codec.subprotocol)
+
+        query_string = parse_qs(self.scope['query_string'].decode())
+        batching = query_string.get('batch') == ['1']
+        self.outbound = OutboundQueue(
+            self.send_frames,
+            self.close_slow_consumer,
+            max_size=getattr(settings, 'CHAT_SEND_QUEUE_SIZE', 256),
+            batch_size=getattr(settings, 'CHAT_SEND_BATCH_SIZE', 20) if batching else 1,
+            policy=getattr(settings, 'CHAT_SLOW_CONSUMER_POLICY', 'drop_oldest')
+        )
+        self.outbound.start()
+
+        presence.connect(self.user.pk, self.room_name, self.channel_name)
+        await self.announce_presence(True)
+        await group_send(
+            self.channel_layer,
+            self.room_name,
+            {
+                'type': 'chat_presence_query',
+                'room': str(self.room_id),
+                'user': self.user.pk,
+                'reply_to': self.channel_name
+            }
+        )
+        self.presence_task = asyncio.create_task(self.watch_presence())
+
+        if 'last_seen' in query_string:
+            await self.sync(query_string['last_seen'][0])
 
     async def disconnect(self, _):
         """
             Handles WebSocket disconnection.
             Removes the connection from the chat room's group.
         """
+        if self.room_name is None:
+            return
+
+        # Flushes the pending read position right away instead of waiting for the delay.
+        if self.read_flush_task is not None:
+            self.read_flush_task.cancel()
+            self.read_flush_task = None
+        await self.flush_read()
+
+        for task in (self.presence_task, self.typing_task):
+            if task is not None:
+                task.cancel()
+        self.outbound.stop()
+        if self.typing_until is not None:
+            await self.broadcast_typing(False)
+        if presence.disconnect(self.user.pk, self.room_name, self.channel_name):
+            await self.announce_presence(False)
+
         await self.channel_layer.group_discard(
             self.room_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
-            Receives a message from the WebSocket, deserializes it, saves it to the database,
-            and broadcasts it to the chat room group.
+            Receives a frame from the WebSocket and dispatches it by type.
+            Chat messages are deserialized, saved to the database and broadcast to the chat room group.
         """
-        data = json.loads(text_data)
+        data = self.codec.decode(text_data, bytes_data)
+        await self.touch()
+
+        frame_type = data.get('type')
+        if frame_type == 'heartbeat':
+            return
+        if frame_type == 'typing':
+            await self.receive_typing()
+            return
+        if frame_type == 'read':
+            self.receive_read(data.get('message_id'))
+            return
+        if frame_type == 'sync':
+            await self.sync(data.get('last_seen'))
+            return
+
+        if self.typing_until is not None:
+            self.typing_until = None
+            await self.broadcast_typing(False)
+
+        if not await self.is_member():
+            await self.close()
+            return
+
         message_data = {
             'sender': self.user.pk,
-            'room': self.room.pk,
+            'room': self.room_id,
             'content': data['msg']
         }
 
@@ -63,49 +199,280 @@ class ChatConsumer(AsyncWebsocketConsumer):
             print("Serialization error")
             return
 
-        message_obj = await sync_to_async(serializer.save)()
+        message_obj = await self.save_message(serializer)
         message_data = await self.serialize_message(message_obj)
 
-        # Broadcasts the message to everyone in the chat room.
-        await self.channel_layer.group_send(
+        # Broadcasts the message to everyone in the chat room, encoded once for all recipients.
+        await group_send(
+            self.channel_layer,
             self.room_name,
             {
                 'type': 'chat_message',
-                'message': message_data
+                'room': str(self.room_id),
+                'message': message_data,
+                'frames': encode_frames(message_data)
             }
         )
 
     async def chat_message(self, event):
         """
             Handles messages sent to the chat room group.
-            Sends the message data to the WebSocket.
+            Queues the message data for the WebSocket, reusing the frames encoded by the sender.
+            Messages already sent by a replay are dropped.
         """
-        message = event['message']
+        if event['message']['id'] <= self.replayed_id:
+            return
+        await self.outbound.put(Encoded(event['message'], event.get('frames', {})))
 
-        await self.send(text_data=json.dumps(message))
+    async def chat_read(self, event):
+        """
+            Handles read receipts sent to the chat room group.
+            Sends the reader and the last message they read to the WebSocket.
+        """
+        await self.outbound.put({
+            'type': 'read',
+            'user': event['user'],
+            'message_id': event['message_id']
+        })
 
-    @sync_to_async
-    def parse_uuid(self, uuid):
+    async def chat_presence(self, event):
         """
-            Parses a UUID to a string format suitable for channel layer groups.
+            Handles presence changes sent to the chat room group.
+            Forwards the presence of other users to the WebSocket. When the user of this connection is
+            reported offline by another connection while this one is still present, announces it again.
         """
-        return "chat_{}".format(str(uuid).replace('-', '_'))
+        if event['user'] == self.user.pk:
+            if not event['online'] and self.online:
+                await self.announce_presence(True)
+            return
 
-    @sync_to_async
-    def get_room(self, user_id, receiver_id):
+        await self.outbound.put({
+            'type': 'presence',
+            'user': event['user'],
+            'online': event['online']
+        })
+
+    async def chat_presence_query(self, event):
+        """
+            Handles presence queries from new connections to the room, replying directly if present.
+        """
+        if event['user'] == self.user.pk or not self.online:
+            return
+
+        await self.channel_layer.send(event['reply_to'], {
+            'type': 'chat_presence',
+            'room': str(self.room_id),
+            'user': self.user.pk,
+            'online': True
+        })
+
+    async def chat_typing(self, event):
+        """
+            Handles typing indicators sent to the chat room group, forwarding those of other users.
+        """
+        if event['user'] == self.user.pk:
+            return
+
+        await self.outbound.put({
+            'type': 'typing',
+            'user': event['user'],
+            'typing': event['typing']
+        })
+
+    async def send_frames(self, events):
+        """
+            Writes queued events to the WebSocket, as a single object or, when batched, as an array,
+            in the wire format negotiated for the connection.
+        """
+        await self.send(**self.codec.encode(events))
+
+    async def close_slow_consumer(self):
+        """
+            Closes the connection of a client that fell too far behind.
+        """
+        await self.close(code=self.SLOW_CONSUMER_CLOSE_CODE)
+
+    async def touch(self):
+        """
+            Records a heartbeat for this connection, announcing the user again if they had gone away.
+        """
+        presence.heartbeat(self.user.pk, self.room_name, self.channel_name)
+        if not self.online:
+            await self.announce_presence(True)
+
+    async def announce_presence(self, online):
+        """
+            Broadcasts the presence of the user of this connection to the room.
+        """
+        self.online = online
+        await group_send(
+            self.channel_layer,
+            self.room_name,
+            {
+                'type': 'chat_presence',
+                'room': str(self.room_id),
+                'user': self.user.pk,
+                'online': online
+            }
+        )
+
+    async def watch_presence(self):
+        """
+            Periodically checks the heartbeat of this connection, announcing the user as away once it expires.
+        """
+        ttl = presence.ttl
+        while True:
+            await asyncio.sleep(ttl / 2)
+            if self.online and not presence.is_fresh(self.user.pk, self.room_name, self.channel_name):
+                await self.announce_presence(False)
+
+    async def receive_typing(self):
+        """
+            Records a keystroke. Broadcasts the start of a typing burst and pushes back its end otherwise,
+            so a user typing produces two broadcasts per burst rather than one per keystroke.
+        """
+        loop = asyncio.get_running_loop()
+        starting = self.typing_until is None
+        self.typing_until = loop.time() + getattr(settings, 'CHAT_TYPING_TIMEOUT', 3)
+
+        if starting:
+            await self.broadcast_typing(True)
+        if self.typing_task is None:
+            self.typing_task = asyncio.create_task(self.stop_typing_later())
+
+    async def stop_typing_later(self):
+        """
+            Waits until no keystroke arrived for the typing timeout, then broadcasts the end of the burst.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self.typing_until is not None and loop.time() < self.typing_until:
+                await asyncio.sleep(self.typing_until - loop.time())
+            if self.typing_until is not None:
+                self.typing_until = None
+                await self.broadcast_typing(False)
+        finally:
+            self.typing_task = None
+
+    async def broadcast_typing(self, typing):
+        await group_send(
+            self.channel_layer,
+            self.room_name,
+            {
+                'type': 'chat_typing',
+                'room': str(self.room_id),
+                'user': self.user.pk,
+                'typing': typing
+            }
+        )
+
+    def receive_read(self, message_id):
         """
-            Retrieves or creates a chat room based on the provided user IDs.
-            Ensures that the same room is used regardless of which user is considered user1 or user2.
+            Records the latest message read by the user, scheduling a flush if none is pending.
+            Positions at or behind the pending one are ignored, so a fast scroll only keeps the furthest.
         """
-        user = User.objects.get(pk=user_id)
-        other_user = User.objects.get(pk=receiver_id)
-        room, _ = ChatRoom.objects.get_or_create(
-            user1=min(user, other_user, key=lambda u: u.id),
-            user2=max(user, other_user, key=lambda u: u.id),
+        if not isinstance(message_id, int) or isinstance(message_id, bool):
+            return
+        if message_id <= self.pending_read_id:
+            return
+
+        self.pending_read_id = message_id
+        if self.read_flush_task is None:
+            self.read_flush_task = asyncio.create_task(self.flush_read_later())
+
+    async def flush_read_later(self):
+        """
+            Waits for the read receipt delay, then flushes the coalesced read position.
+        """
+        await asyncio.sleep(getattr(settings, 'CHAT_READ_RECEIPT_DELAY', 0.5))
+        self.read_flush_task = None
+        await self.flush_read()
+
+    async def flush_read(self):
+        """
+            Advances the read cursor to the pending position and broadcasts a read receipt to the room.
+        """
+        message_id = self.pending_read_id
+        if message_id <= self.flushed_read_id:
+            return
+
+        self.flushed_read_id = message_id
+        advanced = await self.mark_read(message_id)
+        if not advanced:
+            return
+
+        await group_send(
+            self.channel_layer,
+            self.room_name,
+            {
+                'type': 'chat_read',
+                'room': str(self.room_id),
+                'user': self.user.pk,
+                'message_id': message_id
+            }
         )
-        return room
 
-    @sync_to_async
+    async def sync(self, last_seen):
+        """
+            Replays the messages of the room sent after `last_seen`, in bounded batches.
+
+            Channels handles the events of a consumer one at a time, so messages broadcast while the replay
+            runs are only handled after it, by `chat_message`, which drops those up to the last message
+            replayed.
+        """
+        try:
+            cursor = int(last_seen)
+        except (TypeError, ValueError):
+            return
+        if cursor < 0:
+            return
+
+        batch_size = getattr(settings, 'CHAT_SYNC_BATCH_SIZE', 100)
+        remaining = getattr(settings, 'CHAT_SYNC_MAX_MESSAGES', 1000)
+        while True:
+            requested = min(batch_size, remaining)
+            messages = await self.load_missed_messages(cursor, requested)
+            if messages:
+                cursor = messages[-1]['id']
+                self.replayed_id = max(self.replayed_id, cursor)
+            remaining -= len(messages)
+            full = len(messages) == requested
+            truncated = full and remaining == 0
+
+            await self.outbound.put({
+                'type': 'sync',
+                'messages': messages,
+                'more': full and not truncated,
+                'truncated': truncated
+            })
+            if not full or truncated:
+                break
+
+    async def find_room(self):
+        """
+            Resolves the room of the connection from the URL: the direct chat with the receiver.
+            Returns the room ID and its channel layer group name.
+        """
+        self.receiver_id = self.scope['url_route']['kwargs']['receiver_id']
+        return await self.get_room(self.user.id, self.receiver_id)
+
+    async def is_member(self):
+        """
+            Returns whether the user may still post in the room. Membership of direct chats never changes.
+        """
+        return True
+
+    @database_executor
+    def get_room(self, user_id, receiver_id):
+        """
+            Retrieves or creates the chat room shared by the provided user IDs.
+            Resolutions are served from the process-wide room cache, so only the first connection
+            between two users queries the database.
+            Returns the room ID and its channel layer group name.
+        """
+        return resolve_room(user_id, receiver_id)
+
+    @database_executor
     def deserialize_message(self, message_data):
         """
             Deserializes the incoming message data to a Message model instance.
@@ -115,10 +482,478 @@ class ChatConsumer(AsyncWebsocketConsumer):
         serializer.is_valid(raise_exception=True)
         return serializer
 
-    @sync_to_async
+    @database_executor
+    def save_message(self, serializer):
+        """
+            Saves a validated message serializer, returning the created Message instance.
+        """
+        message = serializer.save()
+        CHAT_MESSAGES.inc()
+        return message
+
+    @database_executor
+    def mark_read(self, message_id):
+        """
+            Advances the user's read cursor in the room, returning whether it moved.
+        """
+        return ChatMembership.mark_read(self.room_id, self.user.pk, message_id)
+
+    @database_executor
+    def load_missed_messages(self, after, limit):
+        """
+            Serializes up to `limit` messages of the room following the given message ID, oldest first,
+            including messages already moved to the archive.
+        """
+        return MessageSerializer(history_after(self.room_id, after, limit), many=True).data
+
+    @database_executor
     def serialize_message(self, message_obj):
         """
             Serializes a Message model instance to JSON format for broadcasting.
         """
         serializer = MessageSerializer(message_obj)
         return serializer.data
+
+
+class CourseChatConsumer(ChatConsumer):
+    """
+        Asynchronous WebSocket consumer for the chat room shared by the teacher and students of a course.
+
+        Behaves like `ChatConsumer`, but only members of the course may join, and membership is checked again
+        before every message so students removed from the course can no longer post. Both checks are served
+        from the cached members of the course rather than querying the database.
+    """
+
+    async def find_room(self):
+        """
+            Resolves the room of the course in the URL.
+            Returns the room ID and its channel layer group name.
+        """
+        self.course_id = self.scope['url_route']['kwargs']['course_id']
+        return await self.get_course_room(self.user.id, self.course_id)
+
+    async def is_member(self):
+        return self.user.pk in await acourse_member_ids(self.course_id)
+
+    @database_executor
+    def get_course_room(self, user_id, course_id):
+        """
+            Retrieves or creates the chat room of a course, provided the user is a member of the course.
+        """
+        return resolve_course_room(user_id, course_id)
+
+
+class MultiplexChatConsumer(AsyncWebsocketConsumer):
+    """
+        Asynchronous WebSocket consumer carrying any number of chat rooms over a single connection.
+
+        The user is authenticated once when connecting, then subscribes to rooms by key: `user:<id>` for the
+        direct chat with another user, `course:<id>` for the room of a course.
+
+        Client frames:
+            `{"type": "subscribe", "room": <key>, "last_seen": <id>}` joins a room, replaying the messages
+            after `last_seen` when given, and is answered with `{"type": "subscribed", "room": <key>}`, or
+            `{"type": "error", "room": <key>, "error": <reason>}` if the room cannot be joined.
+            `{"type": "unsubscribe", "room": <key>}` leaves a room.
+            `{"type": "message", "room": <key>, "msg": <text>}`, `{"type": "read", "room": <key>,
+            "message_id": <id>}` and `{"type": "typing", "room": <key>}` post to a subscribed room.
+
+        Every event of a room is sent as `{"room": <key>, "event": <event>}`, where the event has the shape sent by
+        `ChatConsumer`. Broadcast messages embed the frame encoded once by the sender. Presence and typing of the
+        other members are forwarded. The user is present in a room while subscribed to it, with the heartbeats
+        and the `CHAT_PRESENCE_TTL` expiry of `ChatConsumer`: every frame, `{"type": "heartbeat"}` included,
+        keeps the user present in all the subscribed rooms.
+        A connection subscribes to at most `CHAT_MULTIPLEX_MAX_ROOMS` rooms.
+    """
+
+    async def connect(self):
+        """
+            Accepts authenticated connections, without joining any room yet.
+        """
+        self.user = self.scope['user']
+        self.rooms = {}
+        self.keys = {}
+        self.replayed_ids = {}
+        self.online_rooms = set()
+        self.presence_task = None
+        self.pending_read_ids = {}
+        self.flushed_read_ids = {}
+        self.read_flush_tasks = {}
+        self.typing_until = {}
+        self.typing_tasks = {}
+        self.codec = negotiate_codec(self.scope.get('subprotocols', []))
+        self.outbound = None
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        await self.accept(subprotocol=self.codec.subprotocol)
+
+        self.outbound = OutboundQueue(
+            self.send_frames,
+            self.close_slow_consumer,
+            max_size=getattr(settings, 'CHAT_SEND_QUEUE_SIZE', 256),
+            batch_size=1,
+            policy=getattr(settings, 'CHAT_SLOW_CONSUMER_POLICY', 'drop_oldest')
+        )
+        self.outbound.start()
+        self.presence_task = asyncio.create_task(self.watch_presence())
+
+    async def disconnect(self, _):
+        """
+            Leaves every subscribed room.
+        """
+        if self.outbound is None:
+            return
+
+        self.presence_task.cancel()
+        for task in self.typing_tasks.values():
+            task.cancel()
+        self.outbound.stop()
+        for key in list(self.rooms):
+            await self.unsubscribe(key)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+            Receives a frame from the WebSocket and dispatches it by type to the room it names.
+        """
+        data = self.codec.decode(text_data, bytes_data)
+        frame_type = data.get('type')
+        key = data.get('room')
+
+        await self.touch()
+        if frame_type == 'heartbeat':
+            return
+        if frame_type == 'subscribe':
+            await self.subscribe(key, data.get('last_seen'))
+            return
+        if frame_type == 'unsubscribe':
+            await self.unsubscribe(key)
+            return
+
+        if key not in self.rooms:
+            await self.outbound.put({'type': 'error', 'room': key, 'error': 'not_subscribed'})
+            return
+
+        if frame_type == 'message':
+            await self.post_message(key, data.get('msg'))
+        elif frame_type == 'read':
+            await self.post_read(key, data.get('message_id'))
+        elif frame_type == 'typing':
+            await self.post_typing(key)
+
+    async def subscribe(self, key, last_seen=None):
+        """
+            Joins the room identified by a key, then replays the messages missed since `last_seen`, if given.
+        """
+        if key in self.rooms:
+            return
+        if len(self.rooms) >= getattr(settings, 'CHAT_MULTIPLEX_MAX_ROOMS', 100):
+            await self.outbound.put({'type': 'error', 'room': key, 'error': 'too_many_rooms'})
+            return
+
+        try:
+            kind, target = str(key).split(':')
+            room_id, group_name = await self.resolve(kind, int(target))
+        except (ValueError, ObjectDoesNotExist, PermissionDenied):
+            await self.outbound.put({'type': 'error', 'room': key, 'error': 'forbidden'})
+            return
+
+        self.rooms[key] = (room_id, group_name)
+        self.keys[str(room_id)] = key
+        await self.channel_layer.group_add(group_name, self.channel_name)
+        await self.outbound.put({'type': 'subscribed', 'room': key})
+        presence.connect(self.user.pk, group_name, self.channel_name)
+        await self.announce_presence(key, True)
+        await self.broadcast(key, 'chat_presence_query', reply_to=self.channel_name)
+
+        if last_seen is not None:
+            await self.replay(key, last_seen)
+
+    async def unsubscribe(self, key):
+        """
+            Leaves the room identified by a key, announcing the user offline there.
+        """
+        if key not in self.rooms:
+            return
+
+        if self.typing_until.pop(key, None) is not None:
+            await self.broadcast(key, 'chat_typing', typing=False)
+        # Flushes the pending read position right away instead of waiting for the delay.
+        task = self.read_flush_tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+        await self.flush_read(key)
+        self.pending_read_ids.pop(key, None)
+        self.flushed_read_ids.pop(key, None)
+
+        room_id, group_name = self.rooms[key]
+        self.online_rooms.discard(key)
+        if presence.disconnect(self.user.pk, group_name, self.channel_name):
+            await self.broadcast(key, 'chat_presence', online=False)
+
+        del self.rooms[key]
+        del self.keys[str(room_id)]
+        self.replayed_ids.pop(key, None)
+        await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def replay(self, key, last_seen):
+        """
+            Sends the messages of a room following `last_seen`, up to `CHAT_SYNC_MAX_MESSAGES`, in batches.
+            As for `ChatConsumer.sync`, messages of the room broadcast meanwhile are handled afterwards, and
+            those the replay included are dropped.
+        """
+        try:
+            cursor = int(last_seen)
+        except (TypeError, ValueError):
+            return
+
+        batch_size = getattr(settings, 'CHAT_SYNC_BATCH_SIZE', 100)
+        remaining = getattr(settings, 'CHAT_SYNC_MAX_MESSAGES', 1000)
+        room_id = self.rooms[key][0]
+        while True:
+            requested = min(batch_size, remaining)
+            messages = await self.load_missed_messages(room_id, cursor, requested)
+            if messages:
+                cursor = messages[-1]['id']
+                self.replayed_ids[key] = max(self.replayed_ids.get(key, 0), cursor)
+            remaining -= len(messages)
+            full = len(messages) == requested
+            truncated = full and remaining == 0
+
+            await self.outbound.put(RoomFrame(key, {
+                'type': 'sync',
+                'messages': messages,
+                'more': full and not truncated,
+                'truncated': truncated
+            }))
+            if not full or truncated:
+                return
+
+    async def post_message(self, key, content):
+        """
+            Saves a message to a room and broadcasts it, encoded once for all the connections of the room.
+        """
+        if self.typing_until.pop(key, None) is not None:
+            await self.broadcast(key, 'chat_typing', typing=False)
+
+        room_id, group_name = self.rooms[key]
+        if key.startswith('course:') and self.user.pk not in await acourse_member_ids(int(key[7:])):
+            await self.unsubscribe(key)
+            await self.outbound.put({'type': 'error', 'room': key, 'error': 'forbidden'})
+            return
+
+        message_data = await self.save_message(room_id, content)
+        if message_data is None:
+            return
+
+        await group_send(self.channel_layer, group_name, {
+            'type': 'chat_message',
+            'room': str(room_id),
+            'message': message_data,
+            'frames': encode_frames(message_data)
+        })
+
+    async def post_read(self, key, message_id):
+        """
+            Records the latest message of a room read by the user, scheduling a flush if none is pending.
+            As in `ChatConsumer.receive_read`, positions are coalesced per room for `CHAT_READ_RECEIPT_DELAY`
+            seconds, so a fast scroll advances the read cursor and broadcasts a receipt once.
+        """
+        if not isinstance(message_id, int) or isinstance(message_id, bool):
+            return
+        if message_id <= self.pending_read_ids.get(key, 0):
+            return
+
+        self.pending_read_ids[key] = message_id
+        if key not in self.read_flush_tasks:
+            self.read_flush_tasks[key] = asyncio.create_task(self.flush_read_later(key))
+
+    async def flush_read_later(self, key):
+        await asyncio.sleep(getattr(settings, 'CHAT_READ_RECEIPT_DELAY', 0.5))
+        self.read_flush_tasks.pop(key, None)
+        await self.flush_read(key)
+
+    async def flush_read(self, key):
+        """
+            Advances the read cursor of the user in a room to the pending position and broadcasts a receipt if it
+            moved.
+        """
+        message_id = self.pending_read_ids.get(key, 0)
+        if message_id <= self.flushed_read_ids.get(key, 0):
+            return
+
+        self.flushed_read_ids[key] = message_id
+        # The room may be left while the cursor is advanced.
+        room_id, group_name = self.rooms[key]
+        if await self.mark_read(room_id, message_id):
+            await group_send(self.channel_layer, group_name, {
+                'type': 'chat_read',
+                'room': str(room_id),
+                'user': self.user.pk,
+                'message_id': message_id
+            })
+
+    async def post_typing(self, key):
+        """
+            Records a keystroke in a room, broadcasting the start and the end of each burst only.
+        """
+        loop = asyncio.get_running_loop()
+        starting = key not in self.typing_until
+        self.typing_until[key] = loop.time() + getattr(settings, 'CHAT_TYPING_TIMEOUT', 3)
+
+        if starting:
+            await self.broadcast(key, 'chat_typing', typing=True)
+        if key not in self.typing_tasks:
+            self.typing_tasks[key] = asyncio.create_task(self.stop_typing_later(key))
+
+    async def stop_typing_later(self, key):
+        loop = asyncio.get_running_loop()
+        try:
+            while key in self.typing_until and loop.time() < self.typing_until[key]:
+                await asyncio.sleep(self.typing_until[key] - loop.time())
+            if self.typing_until.pop(key, None) is not None:
+                await self.broadcast(key, 'chat_typing', typing=False)
+        finally:
+            self.typing_tasks.pop(key, None)
+
+    async def touch(self):
+        """
+            Records a heartbeat in every subscribed room, announcing the user again where they had gone away.
+        """
+        for key, (_, group_name) in list(self.rooms.items()):
+            presence.heartbeat(self.user.pk, group_name, self.channel_name)
+            if key not in self.online_rooms:
+                await self.announce_presence(key, True)
+
+    async def announce_presence(self, key, online):
+        """
+            Broadcasts the presence of the user of this connection to a subscribed room.
+        """
+        if online:
+            self.online_rooms.add(key)
+        else:
+            self.online_rooms.discard(key)
+        await self.broadcast(key, 'chat_presence', online=online)
+
+    async def watch_presence(self):
+        """
+            Periodically checks the heartbeat of this connection in every subscribed room, announcing the user
+            as away where it expired.
+        """
+        ttl = presence.ttl
+        while True:
+            await asyncio.sleep(ttl / 2)
+            for key, (_, group_name) in list(self.rooms.items()):
+                if key in self.online_rooms and not presence.is_fresh(self.user.pk, group_name, self.channel_name):
+                    await self.announce_presence(key, False)
+
+    async def broadcast(self, key, event_type, **fields):
+        """
+            Sends an event from the user of this connection to the group of a room.
+        """
+        room_id, group_name = self.rooms[key]
+        await group_send(self.channel_layer, group_name, {
+            'type': event_type,
+            'room': str(room_id),
+            'user': self.user.pk,
+            **fields
+        })
+
+    async def forward(self, event, payload):
+        """
+            Queues an event of a subscribed room for the WebSocket, framed with the key of the room.
+        """
+        key = self.keys.get(event.get('room'))
+        if key is not None:
+            await self.outbound.put(RoomFrame(key, payload))
+
+    async def chat_message(self, event):
+        key = self.keys.get(event.get('room'))
+        if event['message']['id'] <= self.replayed_ids.get(key, 0):
+            return
+        await self.forward(event, Encoded(event['message'], event.get('frames', {})))
+
+    async def chat_read(self, event):
+        await self.forward(event, {
+            'type': 'read',
+            'user': event['user'],
+            'message_id': event['message_id']
+        })
+
+    async def chat_presence(self, event):
+        """
+            Forwards the presence of other users. When the user of this connection is reported offline in a room
+            by another connection while still present there, announces it again, as `ChatConsumer` does.
+        """
+        if event['user'] == self.user.pk:
+            key = self.keys.get(event.get('room'))
+            if not event['online'] and key in self.online_rooms:
+                await self.announce_presence(key, True)
+            return
+        await self.forward(event, {
+            'type': 'presence',
+            'user': event['user'],
+            'online': event['online']
+        })
+
+    async def chat_presence_query(self, event):
+        """
+            Answers presence queries from new single-room connections to a subscribed room.
+        """
+        if event['user'] == self.user.pk or event.get('room') not in self.keys:
+            return
+
+        await self.channel_layer.send(event['reply_to'], {
+            'type': 'chat_presence',
+            'room': event['room'],
+            'user': self.user.pk,
+            'online': True
+        })
+
+    async def chat_typing(self, event):
+        if event['user'] == self.user.pk:
+            return
+        await self.forward(event, {
+            'type': 'typing',
+            'user': event['user'],
+            'typing': event['typing']
+        })
+
+    async def send_frames(self, events):
+        await self.send(**self.codec.encode(events))
+
+    async def close_slow_consumer(self):
+        await self.close(code=ChatConsumer.SLOW_CONSUMER_CLOSE_CODE)
+
+    @database_executor
+    def resolve(self, kind, target):
+        """
+            Resolves a room key to the room ID and group name, checking the user may join it.
+        """
+        if kind == 'user':
+            return resolve_room(self.user.pk, target)
+        if kind == 'course':
+            return resolve_course_room(self.user.pk, target)
+        raise ValueError(kind)
+
+    @database_executor
+    def save_message(self, room_id, content):
+        """
+            Validates and saves a message, returning its serialized data, or None if it is invalid.
+        """
+        serializer = MessageSerializer(data={'sender': self.user.pk, 'room': room_id, 'content': content})
+        if not serializer.is_valid():
+            return None
+        message = serializer.save()
+        CHAT_MESSAGES.inc()
+        return MessageSerializer(message).data
+
+    @database_executor
+    def mark_read(self, room_id, message_id):
+        return ChatMembership.mark_read(room_id, self.user.pk, message_id)
+
+    @database_executor
+    def load_missed_messages(self, room_id, after, limit):
+        return MessageSerializer(history_after(room_id, after, limit), many=True).data
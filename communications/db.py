@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from threading import Barrier, Lock
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """
+        Returns the bounded thread pool running database work for the communications consumers.
+
+        The pool is created lazily with `CHAT_DB_EXECUTOR_WORKERS` threads, each of which holds its own
+        database connection. A size of 0 disables the pool, in which case database work falls back to the
+        single thread-sensitive thread shared by the whole process.
+
+        Returns:
+            ThreadPoolExecutor | None: The shared executor, or None if the pool is disabled.
+    """
+    global _executor
+
+    workers = getattr(settings, 'CHAT_DB_EXECUTOR_WORKERS', 8)
+    if workers <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='chat-db')
+        return _executor
+
+
+def shutdown_executor(wait=True):
+    """
+        Shuts down the database executor, closing the connection held by each of its threads.
+        A new pool is created on the next call to `get_executor`.
+    """
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is None:
+        return
+
+    # Connections are thread-local, so every worker has to close its own. The barrier keeps each
+    # close call blocked until all workers hold one, guaranteeing they land on distinct threads.
+    workers = executor._max_workers
+    barrier = Barrier(workers)
+
+    def close_thread_connections():
+        connections.close_all()
+        barrier.wait(timeout=5)
+
+    for _ in range(workers):
+        executor.submit(close_thread_connections)
+    executor.shutdown(wait=wait)
+
+
+def _run_with_connection_cleanup(func, *args, **kwargs):
+    """
+        Runs a database-bound callable, discarding unusable or expired connections before and after it,
+        mirroring what `channels.db.database_sync_to_async` does for the thread-sensitive thread.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def database_executor(func):
+    """
+        Decorator turning a synchronous, database-bound function into a coroutine executed on the
+        communications database executor.
+
+        Unlike the default `sync_to_async`, calls from different connections run concurrently on the
+        bounded pool instead of queueing behind one another on a single thread.
+
+        Args:
+            func (callable): The synchronous function or method to wrap.
+
+        Returns:
+            coroutine function: An awaitable version of the function.
+    """
+    fallback = database_sync_to_async(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        executor = get_executor()
+        if executor is None:
+            return await fallback(*args, **kwargs)
+
+        return await sync_to_async(
+            _run_with_connection_cleanup,
+            thread_sensitive=False,
+            executor=executor
+        )(func, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,109 @@
+from heapq import merge
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from courses.models import CourseStudent
+
+from .models import StatusUpdate, TimelineEntry
+
+
+def audience_ids(user_id):
+    """
+        Returns the IDs of the users who see the status updates of a user: the students of the courses they teach
+        and their classmates in the courses they are enrolled in, along with the user themselves.
+    """
+    enrolled = CourseStudent.objects.filter(student_id=user_id).values('course_id')
+    readers = CourseStudent.objects.filter(
+        Q(course__teacher_id=user_id) | Q(course_id__in=enrolled)
+    ).values_list('student_id', flat=True)
+
+    return set(readers) | {user_id}
+
+
+def sources_filter(user_id):
+    """
+        Returns a filter on the authors of status updates appearing in the feed of a user: the teachers
+        of the courses they are enrolled in and their classmates, along with the user themselves.
+    """
+    enrolled = CourseStudent.objects.filter(student_id=user_id).values('course_id')
+    classmates = CourseStudent.objects.filter(course_id__in=enrolled).values('student_id')
+    teachers = CourseStudent.objects.filter(student_id=user_id).values('course__teacher_id')
+
+    return Q(user_id__in=classmates) | Q(user_id__in=teachers) | Q(user_id=user_id)
+
+
+def post_status(user, content):
+    """
+        Posts a status update and, when its audience is small enough, copies it into the timeline of every reader.
+
+        Fanning out on write makes reads a single range scan of the reader's timeline. Updates whose audience
+        exceeds `STATUS_FEED_FANOUT_LIMIT` readers would cost as many writes, so they are stored once and merged
+        into feeds as they are read instead.
+
+        Args:
+            user (User): The author of the status update.
+            content (str): The content of the status update.
+
+        Returns:
+            StatusUpdate: The new status update.
+    """
+    readers = audience_ids(user.pk)
+    fan_out = len(readers) <= getattr(settings, 'STATUS_FEED_FANOUT_LIMIT', 1000)
+
+    with transaction.atomic():
+        status = StatusUpdate.objects.create(user=user, content=content, fanned_out=fan_out)
+        if fan_out:
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=reader_id, status=status) for reader_id in readers])
+
+    return status
+
+
+def feed_querysets(user, before=None, limit=20):
+    """
+        Returns the querysets of a page of the feed of a user: the status updates fanned out to their timeline,
+        and the updates of authors with a large audience, each newest first and limited to `limit` updates.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    broadcasts = StatusUpdate.objects.filter(sources_filter(user.pk), fanned_out=False)
+    if before is not None:
+        entries = entries.filter(status_id__lt=before)
+        broadcasts = broadcasts.filter(id__lt=before)
+
+    return (entries.select_related('status__user').order_by('-status_id')[:limit],
+            broadcasts.select_related('user').order_by('-id')[:limit])
+
+
+def merge_feed(timeline, broadcasts, limit):
+    return list(merge(timeline, broadcasts, key=lambda status: status.pk, reverse=True))[:limit]
+
+
+def read_feed(user, before=None, limit=20):
+    """
+        Returns the status updates in the feed of a user, newest first.
+
+        Updates fanned out on write are read from the user's timeline; updates of authors with a large audience
+        are looked up among the sources of the feed and merged in.
+
+        Args:
+            user (User): The reader of the feed.
+            before (int): Only status updates with a lower ID are returned, to read the next page of a feed.
+            limit (int): The maximum number of status updates.
+
+        Returns:
+            list: The StatusUpdate instances, newest first.
+    """
+    entries, broadcasts = feed_querysets(user, before, limit)
+
+    return merge_feed([entry.status for entry in entries], list(broadcasts), limit)
+
+
+async def aread_feed(user, before=None, limit=20):
+    """
+        Asynchronous version of `read_feed`.
+    """
+    entries, broadcasts = feed_querysets(user, before, limit)
+
+    return merge_feed([entry.status async for entry in entries], [status async for status in broadcasts], limit)
@@ -0,0 +1,311 @@
+import asyncio
+import glob
+import os
+import random
+import socket
+import string
+import struct
+import time
+from copy import deepcopy
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+# Every frame exchanged between processes is prefixed with its length as a 4-byte unsigned integer.
+FRAME_HEADER = struct.Struct('!I')
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    """
+        Channel layer fanning messages out between the worker processes of a single host over Unix domain sockets.
+
+        Every process listens on a stream socket named after its node ID inside a shared directory. Channels and
+        group memberships are kept in memory by the process owning the channel, exactly like
+        `InMemoryChannelLayer`; only traffic crossing processes goes through the sockets:
+
+            - `send` to a channel owned by another process is forwarded to that process.
+            - `group_send` delivers to local members and forwards one frame to every other process,
+              which delivers it to its own members of the group.
+            - `group_add` and `group_discard` for channels owned by another process are forwarded to it.
+
+        Frames are length-prefixed MessagePack, so messages may contain bytes. Each peer connection buffers at
+        most `max_buffer_size` bytes of unsent frames; past that the peer is treated like a full channel, the
+        message is dropped for group sends and `ChannelFull` is raised for direct sends.
+
+        Attributes:
+            path (str): The directory holding the sockets of all the processes sharing the layer.
+            peer_refresh (float): Seconds during which the list of peer sockets is reused before rescanning the directory.
+            max_message_size (int): The largest encoded message, in bytes, that can cross processes.
+            max_buffer_size (int): The largest amount of unsent data, in bytes, buffered for a single peer.
+            node (str): The identifier of this process, embedded in the names of its specific channels.
+            dropped (int): The number of messages dropped because a channel or a peer was full.
+    """
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path='/tmp/codecraft-channels', peer_refresh=1.0, max_message_size=1024 * 1024,
+                 max_buffer_size=4 * 1024 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.path = str(path)
+        self.peer_refresh = peer_refresh
+        self.max_message_size = max_message_size
+        self.max_buffer_size = max_buffer_size
+        self.node = 'ux{}_{}'.format(os.getpid(), ''.join(
+            random.choice(string.ascii_lowercase) for _ in range(6)))
+        self.socket_path = os.path.join(self.path, self.node + '.sock')
+        self.dropped = 0
+
+        self._loop = None
+        self._listener = None
+        self._server = None
+        self._writers = {}
+        self._peers = []
+        self._peers_scanned_at = 0.0
+
+    # Socket management
+
+    async def _ensure_server(self):
+        """
+            Makes sure this process is listening for its peers on the running event loop.
+            The layer may outlive an event loop (e.g. across `async_to_sync` calls), so the listener and
+            the peer connections are recreated for whichever loop is currently using the layer.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+
+        self._release()
+        self._loop = loop
+
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(128)
+        self._listener = listener
+        self._server = await asyncio.start_unix_server(self._serve_peer, sock=listener)
+
+    def _release(self):
+        """
+            Closes the listener and the peer connections bound to the previous event loop.
+        """
+        loop_alive = self._loop is not None and not self._loop.is_closed()
+        if loop_alive:
+            if self._server is not None:
+                self._server.close()
+            for writer in self._writers.values():
+                writer.close()
+        if self._listener is not None:
+            self._listener.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+        self._loop = None
+        self._listener = None
+        self._server = None
+        self._writers = {}
+
+    async def _serve_peer(self, reader, writer):
+        """
+            Reads the frames sent by another process over one connection and dispatches them.
+        """
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (size,) = FRAME_HEADER.unpack(header)
+                self._dispatch(msgpack.unpackb(await reader.readexactly(size), raw=False))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # The event loop is shutting down with the peer still connected.
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, payload):
+        operation = payload['op']
+        if operation == 'send':
+            self._deliver(payload['channel'], payload['message'])
+        elif operation == 'group_send':
+            self._deliver_group(payload['group'], payload['message'])
+        elif operation == 'group_add':
+            self.groups.setdefault(payload['group'], {})[payload['channel']] = time.time()
+        elif operation == 'group_discard':
+            self._discard_local(payload['group'], payload['channel'])
+
+    def _get_peers(self):
+        """
+            Returns the socket paths of the other processes sharing the layer.
+        """
+        now = time.monotonic()
+        if now - self._peers_scanned_at > self.peer_refresh:
+            self._peers = [peer for peer in glob.glob(os.path.join(self.path, '*.sock'))
+                           if peer != self.socket_path]
+            self._peers_scanned_at = now
+        return self._peers
+
+    def _encode(self, payload):
+        """
+            Encodes a payload into a length-prefixed frame.
+        """
+        data = msgpack.packb(payload, use_bin_type=True)
+        if len(data) > self.max_message_size:
+            raise ValueError("Message of {} bytes exceeds the layer's max_message_size".format(len(data)))
+        return FRAME_HEADER.pack(len(data)) + data
+
+    async def _send_frame(self, peer, frame):
+        """
+            Queues a frame on the connection to a peer, connecting to it first if needed.
+
+            Returns:
+                bool: True if the frame was queued, False if the peer is gone or too far behind.
+        """
+        writer = self._writers.get(peer)
+        if writer is None or writer.is_closing():
+            try:
+                _, writer = await asyncio.open_unix_connection(peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The owning process died without cleaning up; forget its socket.
+                try:
+                    os.unlink(peer)
+                except FileNotFoundError:
+                    pass
+                self._writers.pop(peer, None)
+                self._peers_scanned_at = 0.0
+                return False
+            self._writers[peer] = writer
+
+        if writer.transport.get_write_buffer_size() > self.max_buffer_size:
+            return False
+
+        writer.write(frame)
+        return True
+
+    def _peer_path(self, channel):
+        return os.path.join(self.path, self._owner(channel) + '.sock')
+
+    # Local delivery
+
+    def _owner(self, channel):
+        """
+            Returns the node owning a specific channel, or None for process-agnostic channels.
+        """
+        if '!' not in channel:
+            return None
+        return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+
+    def _is_local(self, channel):
+        owner = self._owner(channel)
+        return owner is None or owner == self.node
+
+    def _deliver(self, channel, message):
+        """
+            Puts a message on the queue of a channel owned by this process.
+
+            Returns:
+                bool: True if the message was queued, False if the channel is full.
+        """
+        queue = self.channels.setdefault(
+            channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        try:
+            queue.put_nowait((time.time() + self.expiry, message))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def _deliver_group(self, group, message):
+        for channel in list(self.groups.get(group, {})):
+            self._deliver(channel, dict(message))
+
+    def _discard_local(self, group, channel):
+        group_channels = self.groups.get(group)
+        if group_channels:
+            group_channels.pop(channel, None)
+            if not group_channels:
+                self.groups.pop(group, None)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        """
+            Sends a message onto a channel, forwarding it to the owning process if needed.
+        """
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        await self._ensure_server()
+
+        if self._is_local(channel):
+            if not self._deliver(channel, deepcopy(message)):
+                raise ChannelFull(channel)
+            return
+
+        frame = self._encode({'op': 'send', 'channel': channel, 'message': message})
+        if not await self._send_frame(self._peer_path(channel), frame):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        await self._ensure_server()
+        return await super().receive(channel)
+
+    async def new_channel(self, prefix="specific."):
+        """
+            Returns a new specific channel name owned by this process.
+            Starts listening right away, so other processes can reach the channel as soon as it exists.
+        """
+        await self._ensure_server()
+        return "%s.%s!%s" % (
+            prefix,
+            self.node,
+            "".join(random.choice(string.ascii_letters) for _ in range(12)),
+        )
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._ensure_server()
+
+        if self._is_local(channel):
+            self.groups.setdefault(group, {})[channel] = time.time()
+            return
+
+        frame = self._encode({'op': 'group_add', 'group': group, 'channel': channel})
+        await self._send_frame(self._peer_path(channel), frame)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        await self._ensure_server()
+
+        if self._is_local(channel):
+            self._discard_local(group, channel)
+            return
+
+        frame = self._encode({'op': 'group_discard', 'group': group, 'channel': channel})
+        await self._send_frame(self._peer_path(channel), frame)
+
+    async def group_send(self, group, message):
+        """
+            Sends a message to every member of a group, in this process and all the others.
+            The message is encoded once and the same frame is sent to every peer.
+        """
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._ensure_server()
+        self._clean_expired()
+
+        frame = self._encode({'op': 'group_send', 'group': group, 'message': message})
+        for peer in self._get_peers():
+            if not await self._send_frame(peer, frame):
+                self.dropped += 1
+
+        if group in self.groups:
+            self._deliver_group(group, deepcopy(message))
+
+    async def close(self):
+        """
+            Stops listening, closes the peer connections and removes the socket from the shared directory.
+        """
+        self._release()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from communications.archive import archive_messages
+
+
+class Command(BaseCommand):
+    """
+        Moves chat messages older than `CHAT_ARCHIVE_AFTER_DAYS` into compressed per-room archive blocks.
+        Meant to run periodically, e.g. from a nightly cron job.
+    """
+    help = "Moves old chat messages into compressed per-room archive blocks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive messages older than this many days.")
+        parser.add_argument('--block-size', type=int, help="Maximum number of messages per archive block.")
+        parser.add_argument('--codec', choices=['zlib', 'zstd'], help="Compression of the archive blocks.")
+
+    def handle(self, *args, **options):
+        try:
+            count = archive_messages(
+                days=options['days'], block_size=options['block_size'], codec=options['codec'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write("Archived {} messages.".format(count))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from codecraft.metrics import record_cache_lookup
+from courses.models import Course, CourseStudent
+
+from .db import database_executor
+
+
+def course_members_key(course_id):
+    return 'chat:course_members:{}'.format(course_id)
+
+
+def load_course_members(course_id):
+    """
+        Loads the IDs of the members of a course, its teacher and enrolled students, from the database.
+
+        Raises:
+            Course.DoesNotExist: If the course does not exist.
+    """
+    teacher_id = Course.objects.values_list('teacher_id', flat=True).get(pk=course_id)
+    student_ids = CourseStudent.objects.filter(course_id=course_id).values_list('student_id', flat=True)
+    return frozenset([teacher_id, *student_ids])
+
+
+def course_member_ids(course_id):
+    """
+        Returns the IDs of the members of a course, served from the cache when possible.
+
+        Entries live for `CHAT_COURSE_MEMBERS_TTL` seconds and are invalidated as soon as an enrollment
+        or the course itself changes.
+
+        Raises:
+            Course.DoesNotExist: If the course does not exist.
+    """
+    key = course_members_key(course_id)
+    members = cache.get(key)
+    record_cache_lookup('course_members', members is not None)
+    if members is None:
+        members = load_course_members(course_id)
+        cache.set(key, members, getattr(settings, 'CHAT_COURSE_MEMBERS_TTL', 300))
+    return members
+
+
+async def acourse_member_ids(course_id):
+    """
+        Asynchronous version of `course_member_ids`, only leaving the event loop on a cache miss.
+    """
+    members = await cache.aget(course_members_key(course_id))
+    if members is None:
+        # Counted by `course_member_ids`, which looks the members up again before loading them.
+        members = await database_executor(course_member_ids)(course_id)
+    else:
+        record_cache_lookup('course_members', True)
+    return members
+
+
+def invalidate_course_members(course_id):
+    cache.delete(course_members_key(course_id))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_rooms(apps, schema_editor):
+    """
+        Merges chat rooms sharing the same pair of users into the oldest one, moving their messages.
+    """
+    ChatRoom = apps.get_model('communications', 'ChatRoom')
+    Message = apps.get_model('communications', 'Message')
+
+    kept = {}
+    for room in ChatRoom.objects.order_by('created_at'):
+        key = (room.user1_id, room.user2_id)
+        if key not in kept:
+            kept[key] = room
+            continue
+        Message.objects.filter(room=room).update(room=kept[key])
+        room.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0004_alter_message_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rooms, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chatroom',
+            constraint=models.UniqueConstraint(fields=('user1', 'user2'), name='unique_chat_room_users'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_inbox(apps, schema_editor):
+    """
+        Records the latest message of existing rooms and creates the memberships of their users.
+        Existing history is considered read, so upgrading does not flood inboxes with unread messages.
+    """
+    ChatRoom = apps.get_model('communications', 'ChatRoom')
+    ChatMembership = apps.get_model('communications', 'ChatMembership')
+    Message = apps.get_model('communications', 'Message')
+
+    for room in ChatRoom.objects.all():
+        last_message = Message.objects.filter(room=room).order_by('-id').first()
+        if last_message is not None:
+            room.last_message = last_message
+            room.last_activity = last_message.timestamp
+            room.save(update_fields=['last_message', 'last_activity'])
+
+        last_read = last_message.id if last_message is not None else 0
+        ChatMembership.objects.bulk_create([
+            ChatMembership(room=room, user_id=room.user1_id, last_read_message_id=last_read),
+            ChatMembership(room=room, user_id=room.user2_id, last_read_message_id=last_read),
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0005_chatroom_unique_users'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='communications.message'),
+        ),
+        migrations.CreateModel(
+            name='ChatMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='communications.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'room'), name='unique_chat_membership')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
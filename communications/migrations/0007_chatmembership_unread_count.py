@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+def backfill_unread_counts(apps, schema_editor):
+    """
+        Computes the unread counter of existing memberships from their read cursors.
+    """
+    ChatMembership = apps.get_model('communications', 'ChatMembership')
+    Message = apps.get_model('communications', 'Message')
+
+    for membership in ChatMembership.objects.all():
+        membership.unread_count = Message.objects.filter(
+            room_id=membership.room_id, id__gt=membership.last_read_message_id
+        ).exclude(sender_id=membership.user_id).count()
+        membership.save(update_fields=['unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0006_chatroom_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
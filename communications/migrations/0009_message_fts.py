@@ -0,0 +1,62 @@
+from django.db import migrations
+
+FTS_TABLE = 'communications_message_fts'
+
+CREATE_SQL = [
+    # External-content index: the text lives in communications_message, the index only stores tokens.
+    """
+    CREATE VIRTUAL TABLE {fts} USING fts5(
+        content, content='communications_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Triggers keep the index in sync with every write path, including bulk inserts and raw SQL.
+    """
+    CREATE TRIGGER {fts}_ai AFTER INSERT ON communications_message BEGIN
+        INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER {fts}_ad AFTER DELETE ON communications_message BEGIN
+        INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER {fts}_au AFTER UPDATE OF content ON communications_message BEGIN
+        INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS {fts}_au",
+    "DROP TRIGGER IF EXISTS {fts}_ad",
+    "DROP TRIGGER IF EXISTS {fts}_ai",
+    "DROP TABLE IF EXISTS {fts}",
+]
+
+
+def run_sqlite(statements):
+    """
+        Returns a migration function running the given statements on SQLite only.
+        Other databases fall back to a plain substring search and need no index here.
+    """
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement.format(fts=FTS_TABLE))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0008_chatroom_course'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0009_message_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessageBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.BigIntegerField()),
+                ('last_message_id', models.BigIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_blocks', to='communications.chatroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'first_message_id'], name='archive_room_first_message')],
+            },
+        ),
+    ]
@@ -1,9 +1,14 @@
 from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, Subquery
+from django.db.models.functions import Coalesce
 
+from courses.models import Course, CourseStudent
 from users.models import User
 
+from .membership import acourse_member_ids, course_member_ids
+
 
 class StatusUpdate(models.Model):
     """
@@ -13,29 +18,85 @@ class StatusUpdate(models.Model):
             user (ForeignKey): A reference to the User who posted the status update.
             content (TextField): The content of the status update.
             posted_at (DateTimeField): The date and time when the status update was posted.
+            fanned_out (BooleanField): Whether the update was copied to the timeline of every reader when posted.
+                                       Updates with too large an audience are not, and are merged into feeds
+                                       when they are read instead.
     """
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='status_updates')
     content = models.TextField()
     posted_at = models.DateTimeField(auto_now_add=True)
+    fanned_out = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            # Only updates merged on read are looked up by author, so only they are indexed.
+            models.Index(fields=['user', '-id'], name='status_fanout_on_read',
+                         condition=models.Q(fanned_out=False)),
+        ]
+
+    def __str__(self):
+        """
+            Returns a human-readable string representation of the StatusUpdate instance.
+            Used mainly for debugging
+        """
+        return "{} at {}".format(self.user, self.posted_at)
+
+
+class TimelineEntry(models.Model):
+    """
+        A model representing a status update in the precomputed feed of a user.
+
+        Attributes:
+            user (ForeignKey): A reference to the User whose feed includes the status update.
+            status (ForeignKey): A reference to the StatusUpdate.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline_entries')
+    status = models.ForeignKey(
+        StatusUpdate, on_delete=models.CASCADE, related_name='timeline_entries')
+
+    class Meta:
+        # Feeds are read newest first from a cursor, as a range scan of this constraint's index.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'status'], name='unique_timeline_entry'),
+        ]
 
 
 class ChatRoom(models.Model):
     """
-        A model representing a chat room for two users.
+        A model representing a chat room, either between two users or shared by the members of a course.
 
         Attributes:
             id (UUIDField): The unique identifier for the chat room. Automatically generated.
-            user1 (ForeignKey): A reference to the first User in the chat.
-            user2 (ForeignKey): A reference to the second User in the chat.
+            user1 (ForeignKey): A reference to the first User in a direct chat. Empty for course rooms.
+            user2 (ForeignKey): A reference to the second User in a direct chat. Empty for course rooms.
+            course (OneToOneField): A reference to the Course whose teacher and students share the room.
+                                    Empty for direct chats.
             created_at (DateTimeField): The date and time when the chat room was created.
+            last_message (ForeignKey): A denormalized reference to the most recent Message in the room, if any.
+            last_activity (DateTimeField): The date and time of the most recent message, used to order inboxes.
     """
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user1 = models.ForeignKey(
-        User, related_name='chats_started', on_delete=models.CASCADE)
+        User, related_name='chats_started', null=True, blank=True, on_delete=models.CASCADE)
     user2 = models.ForeignKey(
-        User, related_name='chats_invited', on_delete=models.CASCADE)
+        User, related_name='chats_invited', null=True, blank=True, on_delete=models.CASCADE)
+    course = models.OneToOneField(
+        Course, related_name='chat_room', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_message = models.ForeignKey(
+        'Message', related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    last_activity = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # A pair of users shares exactly one room, which lets concurrent first connections
+        # resolve to the same room instead of creating duplicates.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user1', 'user2'], name='unique_chat_room_users'),
+        ]
 
     def __str__(self):
         """
@@ -43,8 +104,30 @@ class ChatRoom(models.Model):
             Shows the 2 users involved in the chat room.
             Used mainly for debugging
         """
+        if self.course_id is not None:
+            return "Chat of course {}".format(self.course_id)
         return "Chat between {} and {}".format(self.user1, self.user2)
 
+    def save(self, *args, **kwargs):
+        """
+            Saves the chat room, creating the membership of its users when the room is first created:
+            both users of a direct chat, or the teacher and enrolled students of a course.
+        """
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding:
+                return
+
+            if self.course_id is not None:
+                user_ids = [self.course.teacher_id, *CourseStudent.objects.filter(
+                    course_id=self.course_id).values_list('student_id', flat=True)]
+            else:
+                user_ids = [self.user1_id, self.user2_id]
+            ChatMembership.objects.bulk_create([
+                ChatMembership(room=self, user_id=user_id) for user_id in user_ids
+            ], ignore_conflicts=True)
+
     def is_member(self, user: User):
         """
             Determines if the specified user is a member of the chat room.
@@ -53,10 +136,18 @@ class ChatRoom(models.Model):
                 user (User): The user to check for membership.
 
             Returns:
-                bool: True if the user is either user1 or user2 in the chat room; False otherwise.
+                bool: True if the user is either user1 or user2 in a direct chat, or the teacher or an enrolled
+                      student of the course of a course room; False otherwise.
         """
+        if self.course_id is not None:
+            return user.pk in course_member_ids(self.course_id)
         return user == self.user1 or user == self.user2
 
+    async def ais_member(self, user: User):
+        if self.course_id is not None:
+            return user.pk in await acourse_member_ids(self.course_id)
+        return user.pk in (self.user1_id, self.user2_id)
+
 
 class Message(models.Model):
     """
@@ -81,3 +172,126 @@ class Message(models.Model):
             Used mainly for debugging
         """
         return "{} at {}".format(self.sender, self.timestamp)
+
+    def save(self, *args, **kwargs):
+        """
+            Saves the message and, when it is new, records it as the latest activity of its room
+            and increments the unread counter of every other member.
+        """
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                ChatRoom.objects.filter(pk=self.room_id).update(
+                    last_message=self, last_activity=self.timestamp)
+                ChatMembership.objects.filter(room_id=self.room_id).exclude(
+                    user_id=self.sender_id).update(unread_count=F('unread_count') + 1)
+
+
+class ChatMembership(models.Model):
+    """
+        A model representing a user's membership in a chat room, along with their read cursor.
+
+        Attributes:
+            room (ForeignKey): A reference to the ChatRoom the user belongs to.
+            user (ForeignKey): A reference to the member User.
+            last_read_message_id (BigIntegerField): The ID of the last message the user has read in the room.
+                                                    Messages with a greater ID sent by others are unread.
+            unread_count (PositiveIntegerField): The number of unread messages, maintained incrementally as
+                                                messages are sent and read.
+    """
+    room = models.ForeignKey(
+        ChatRoom, related_name='memberships', on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        User, related_name='chat_memberships', on_delete=models.CASCADE)
+    last_read_message_id = models.BigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'room'], name='unique_chat_membership'),
+        ]
+
+    @classmethod
+    def mark_read(cls, room_id, user_id, message_id):
+        """
+            Advances a member's read cursor to the given message and recomputes their unread counter.
+
+            The cursor only moves forward and only to a message of the room, which may have been moved to one
+            of its archive blocks: IDs within the range of a block of the room are accepted. Everything happens
+            in a single UPDATE, and the recount only scans messages after the cursor, which is usually none.
+
+            Args:
+                room_id (UUID): The ID of the chat room.
+                user_id (int): The ID of the member.
+                message_id (int): The ID of the last message read by the member.
+
+            Returns:
+                bool: True if the cursor moved, False otherwise.
+        """
+        remaining = Message.objects.filter(
+            room_id=room_id, id__gt=message_id
+        ).exclude(sender_id=user_id).order_by().values('room').annotate(
+            count=Count('id')).values('count')
+
+        archived = ArchivedMessageBlock.objects.filter(
+            room_id=room_id, first_message_id__lte=message_id, last_message_id__gte=message_id)
+
+        updated = cls.objects.filter(
+            Exists(Message.objects.filter(room_id=room_id, id=message_id)) | Exists(archived),
+            room_id=room_id,
+            user_id=user_id,
+            last_read_message_id__lt=message_id,
+        ).update(
+            last_read_message_id=message_id,
+            unread_count=Coalesce(Subquery(remaining), 0),
+        )
+
+        return updated > 0
+
+    def __str__(self):
+        """
+            Returns a human-readable string representation of the ChatMembership instance.
+            Used mainly for debugging
+        """
+        return "{} in {}".format(self.user, self.room)
+
+
+class ArchivedMessageBlock(models.Model):
+    """
+        A model representing a block of old messages of a chat room, moved out of the message table.
+
+        The messages are stored as compressed newline-delimited JSON, one object per message, and cover
+        a contiguous range of message IDs of the room.
+
+        Attributes:
+            room (ForeignKey): A reference to the ChatRoom the messages belong to.
+            first_message_id (BigIntegerField): The ID of the oldest message in the block.
+            last_message_id (BigIntegerField): The ID of the newest message in the block.
+            message_count (PositiveIntegerField): The number of messages in the block.
+            codec (CharField): The compression of the block, 'zlib' or 'zstd'.
+            data (BinaryField): The compressed messages.
+            archived_at (DateTimeField): The date and time when the block was created.
+    """
+    room = models.ForeignKey(
+        ChatRoom, related_name='archived_blocks', on_delete=models.CASCADE)
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'first_message_id'],
+                         name='archive_room_first_message'),
+        ]
+
+    def __str__(self):
+        """
+            Returns a human-readable string representation of the ArchivedMessageBlock instance.
+            Used mainly for debugging
+        """
+        return "Messages {} to {} of {}".format(self.first_message_id, self.last_message_id, self.room_id)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters of the outbound traffic of chat connections.
+outbound_stats = Counter()
+
+DROP_OLDEST = 'drop_oldest'
+DISCONNECT = 'disconnect'
+
+
+class OutboundQueue:
+    """
+        Bounded queue of events waiting to be sent to a single WebSocket client.
+
+        Events are queued as they arrive from the channel layer and written by a dedicated task, so a slow client
+        never blocks the consumer. When the client falls behind and several events are waiting, up to `batch_size`
+        of them are handed to `send_frames` at once so they can be written as a single frame. When the queue is
+        full, the slow-consumer policy applies: `drop_oldest` discards the oldest queued event, `disconnect`
+        closes the connection. A frame that cannot be sent is logged, and the connection closed as well.
+
+        Process-wide totals are kept in `outbound_stats`: `events`, `frames`, `batched_frames`, `dropped`,
+        `disconnected` and `failed`.
+
+        Attributes:
+            send_frames (coroutine function): Called with a list of events to write as one frame.
+            close (coroutine function): Called to close the connection of a client that fell too far behind.
+            max_size (int): The maximum number of events waiting to be sent.
+            batch_size (int): The maximum number of events written in a single frame; 1 disables batching.
+            policy (str): The slow-consumer policy, either `drop_oldest` or `disconnect`.
+    """
+
+    def __init__(self, send_frames, close, max_size=256, batch_size=1, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError("Unknown slow consumer policy: {}".format(policy))
+
+        self.send_frames = send_frames
+        self.close = close
+        self.max_size = max_size
+        self.batch_size = max(batch_size, 1)
+        self.policy = policy
+        self.closed = False
+
+        self._events = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        """
+            Starts the task writing queued events to the client.
+        """
+        self._task = asyncio.create_task(self._drain())
+
+    def stop(self):
+        """
+            Stops writing and discards any event still queued.
+        """
+        self.closed = True
+        self._events.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def put(self, event):
+        """
+            Queues an event for the client, applying the slow-consumer policy if the queue is full.
+        """
+        if self.closed:
+            return
+
+        if len(self._events) >= self.max_size:
+            if self.policy == DISCONNECT:
+                outbound_stats['disconnected'] += 1
+                self.stop()
+                await self.close()
+                return
+            self._events.popleft()
+            outbound_stats['dropped'] += 1
+
+        self._events.append(event)
+        outbound_stats['events'] += 1
+        self._ready.set()
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+
+            while self._events:
+                count = min(self.batch_size, len(self._events))
+                events = [self._events.popleft() for _ in range(count)]
+                outbound_stats['frames'] += 1
+                if count > 1:
+                    outbound_stats['batched_frames'] += 1
+                try:
+                    await self.send_frames(events)
+                except Exception:
+                    logger.exception("Could not send %d events, closing the connection", count)
+                    outbound_stats['failed'] += 1
+                    # Not `stop`, which would cancel this very task before the connection is closed.
+                    self.closed = True
+                    self._events.clear()
+                    self._task = None
+                    await self.close()
+                    return
+
+    def __len__(self):
+        return len(self._events)
@@ -26,3 +26,6 @@ class IsMemberOfRoom(BasePermission):
                 bool: True if the user is a member of the room, False otherwise.
         """
         return obj.is_member(request.user)
+
+    async def ahas_object_permission(self, request, _, obj: ChatRoom):
+        return await obj.ais_member(request.user)
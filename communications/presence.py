@@ -0,0 +1,94 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+
+
+class PresenceRegistry:
+    """
+        In-memory registry of the chat connections held by the current process and their last heartbeat.
+
+        Connections are registered per room: a user is present in a room while at least one of their
+        connections to it has sent a heartbeat within `ttl` seconds, and online while they are present in any
+        room. The registry only knows about the connections of its own process; consumers reconcile presence
+        across processes through events sent over the channel layer.
+
+        Attributes:
+            ttl (float): Seconds after the last heartbeat during which a connection counts as present.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._connections = {}
+        self._lock = Lock()
+
+    def connect(self, user_id, room, channel_name):
+        """
+            Registers a new connection of a user to a room.
+
+            Returns:
+                bool: True if the user had no other connection to the room in this process.
+        """
+        with self._lock:
+            connections = self._connections.setdefault(user_id, {})
+            first = not any(other == room for other, _ in connections)
+            connections[(room, channel_name)] = time.monotonic()
+            return first
+
+    def heartbeat(self, user_id, room, channel_name):
+        """
+            Records activity on a connection, keeping its user present in the room.
+        """
+        with self._lock:
+            connections = self._connections.get(user_id)
+            if connections is not None and (room, channel_name) in connections:
+                connections[(room, channel_name)] = time.monotonic()
+
+    def disconnect(self, user_id, room, channel_name):
+        """
+            Unregisters a connection of a user to a room.
+
+            Returns:
+                bool: True if it was the last connection of the user to the room in this process.
+        """
+        with self._lock:
+            connections = self._connections.get(user_id)
+            if connections is None or connections.pop((room, channel_name), None) is None:
+                return False
+            if not connections:
+                del self._connections[user_id]
+            return not any(other == room for other, _ in connections)
+
+    def is_fresh(self, user_id, room, channel_name):
+        """
+            Returns whether a connection to a room sent a heartbeat within the TTL.
+        """
+        last_seen = self._connections.get(user_id, {}).get((room, channel_name))
+        return last_seen is not None and time.monotonic() - last_seen <= self.ttl
+
+    def is_online(self, user_id):
+        """
+            Returns whether any connection of the user in this process, to any room, is fresh.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return any(now - last_seen <= self.ttl
+                       for last_seen in self._connections.get(user_id, {}).values())
+
+    def online_users(self):
+        """
+            Returns the IDs of the users with a fresh connection in this process.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {user_id for user_id, connections in self._connections.items()
+                    if any(now - last_seen <= self.ttl for last_seen in connections.values())}
+
+    def __len__(self):
+        """
+            Returns the number of connections registered in this process.
+        """
+        return sum(len(connections) for connections in self._connections.values())
+
+
+presence = PresenceRegistry(getattr(settings, 'CHAT_PRESENCE_TTL', 60))
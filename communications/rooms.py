@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+
+from codecraft.metrics import record_cache_lookup
+from users.models import User
+
+from .membership import course_member_ids
+from .models import ChatRoom
+
+
+def room_group_name(room_id):
+    """
+        Formats a chat room ID into a name suitable for channel layer groups.
+
+        Args:
+            room_id (UUID | str): The primary key of the chat room.
+
+        Returns:
+            str: The group name used to broadcast messages to the members of the room.
+    """
+    return "chat_{}".format(str(room_id).replace('-', '_'))
+
+
+class RoomCache:
+    """
+        A bounded, least-recently-used cache of chat room resolutions.
+
+        Maps the ordered pair of user IDs taking part in a chat, or `('course', course_id)` for course rooms,
+        to the ID and channel layer group name of the room, so repeated connections skip the database entirely.
+        The cache is local to the process and safe to use from the threads running database work.
+
+        Attributes:
+            max_size (int): The maximum number of pairs kept before the least recently used one is evicted.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+            Returns the cached (room_id, group_name) tuple for a pair of users, or None on a miss.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+            Stores the (room_id, group_name) tuple for a pair of users, evicting the oldest entry if full.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict_room(self, room_id):
+        """
+            Removes every entry pointing to the given room, used when a room is deleted.
+        """
+        with self._lock:
+            stale = [key for key, value in self._entries.items()
+                     if value[0] == room_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+room_cache = RoomCache(getattr(settings, 'CHAT_ROOM_CACHE_SIZE', 10000))
+
+
+def resolve_room(user_id, receiver_id):
+    """
+        Resolves the chat room shared by two users, creating it the first time they chat.
+
+        The users are ordered by ID so the same room is used regardless of which of them connects.
+        Only cache misses touch the database; the unique constraint on the pair makes concurrent
+        first connections converge on a single room through `get_or_create`.
+
+        Args:
+            user_id (int): The ID of the connecting user.
+            receiver_id (int): The ID of the other user in the chat.
+
+        Returns:
+            tuple: The room ID and the channel layer group name of the room.
+
+        Raises:
+            User.DoesNotExist: If either user does not exist.
+    """
+    if user_id is None or receiver_id is None:
+        raise User.DoesNotExist("Chat rooms require two existing users")
+
+    key = (min(user_id, receiver_id), max(user_id, receiver_id))
+    cached = room_cache.get(key)
+    record_cache_lookup('chat_rooms', cached is not None)
+    if cached is not None:
+        return cached
+
+    if User.objects.filter(pk__in=key).count() != len(set(key)):
+        raise User.DoesNotExist("Chat rooms require two existing users")
+
+    room, _ = ChatRoom.objects.get_or_create(user1_id=key[0], user2_id=key[1])
+    value = (room.pk, room_group_name(room.pk))
+    room_cache.set(key, value)
+
+    return value
+
+
+def resolve_course_room(user_id, course_id):
+    """
+        Resolves the chat room shared by the teacher and students of a course, creating it on first use.
+
+        Membership is checked against the cached members of the course, and the room itself is served
+        from the room cache, so connections to a known room do not query the database.
+
+        Args:
+            user_id (int): The ID of the connecting user.
+            course_id (int): The ID of the course.
+
+        Returns:
+            tuple: The room ID and the channel layer group name of the room.
+
+        Raises:
+            Course.DoesNotExist: If the course does not exist.
+            PermissionDenied: If the user is neither the teacher nor an enrolled student of the course.
+    """
+    if user_id not in course_member_ids(course_id):
+        raise PermissionDenied("Only members of a course can join its chat room")
+
+    key = ('course', course_id)
+    cached = room_cache.get(key)
+    record_cache_lookup('chat_rooms', cached is not None)
+    if cached is not None:
+        return cached
+
+    room, _ = ChatRoom.objects.get_or_create(course_id=course_id)
+    value = (room.pk, room_group_name(room.pk))
+    room_cache.set(key, value)
+
+    return value
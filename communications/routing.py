@@ -1,10 +1,18 @@
 from django.urls import path
 
-from .consumers import ChatConsumer
+from .consumers import ChatConsumer, CourseChatConsumer, MultiplexChatConsumer
 
 websocket_urlpatterns = [
     # Defines a WebSocket URL pattern for chat communication.
     # The pattern includes a dynamic segment, <int:receiver_id>, that captures the receiver's user ID from the URL.
     # This ID is then passed to the ChatConsumer, allowing it to know which user is the intended recipient of the message.
-    path("ws/chat/<int:receiver_id>/", ChatConsumer.as_asgi())
+    path("ws/chat/<int:receiver_id>/", ChatConsumer.as_asgi()),
+
+    # Defines a WebSocket URL pattern for the group chat of a course.
+    # The <int:course_id> segment identifies the course whose teacher and enrolled students share the room.
+    path("ws/chat/course/<int:course_id>/", CourseChatConsumer.as_asgi()),
+
+    # Defines a WebSocket URL pattern carrying many chat rooms over a single connection.
+    # Clients subscribe to direct chats and course rooms by key, and every event is framed with its room.
+    path("ws/chat/", MultiplexChatConsumer.as_asgi()),
 ]
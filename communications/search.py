@@ -0,0 +1,89 @@
+import re
+
+from django.db import connection
+
+from .models import ChatMembership, Message
+
+FTS_TABLE = 'communications_message_fts'
+
+SEARCH_SQL = """
+    SELECT m.id, m.room_id, m.sender_id, m.content, m.timestamp,
+           bm25({fts}) AS rank,
+           snippet({fts}, 0, '[', ']', '...', 12) AS snippet
+    FROM {fts}
+    JOIN communications_message m ON m.id = {fts}.rowid
+    JOIN communications_chatmembership cm ON cm.room_id = m.room_id AND cm.user_id = %s
+    WHERE {fts} MATCH %s {room_filter}
+    ORDER BY rank
+    LIMIT %s
+"""
+
+
+def build_match_query(query):
+    """
+        Turns free text typed by a user into an FTS5 query matching every word, the last one as a prefix.
+        Words are quoted, so FTS5 operators and punctuation in the input are searched as plain text.
+
+        Returns:
+            str: The FTS5 query, or an empty string if the input has no words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+
+    terms = ['"{}"'.format(word) for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_messages(user, query, room_id=None, limit=20):
+    """
+        Searches the messages of the rooms the user belongs to, best matches first.
+
+        On SQLite the search runs against the FTS5 index maintained by triggers on the message table and hits are
+        ranked by BM25 with a highlighted snippet. Other databases fall back to a case-insensitive match of every
+        word, newest first.
+
+        Args:
+            user (User): The user searching; only rooms they are a member of are searched.
+            query (str): The text to search for.
+            room_id (UUID): Restricts the search to a single room, if given.
+            limit (int): The maximum number of hits.
+
+        Returns:
+            list: Message instances with `rank` and `snippet` attributes.
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    if connection.vendor != 'sqlite':
+        return fallback_search(user, query, room_id, limit)
+
+    params = [user.pk, match]
+    room_filter = ''
+    if room_id is not None:
+        room_filter = 'AND m.room_id = %s'
+        params.append(room_id.hex)
+    params.append(limit)
+
+    sql = SEARCH_SQL.format(fts=FTS_TABLE, room_filter=room_filter)
+    return list(Message.objects.raw(sql, params))
+
+
+def fallback_search(user, query, room_id, limit):
+    """
+        Substring search used on databases without an FTS5 index, with the same result shape as `search_messages`.
+    """
+    rooms = ChatMembership.objects.filter(user=user).values('room_id')
+    messages = Message.objects.filter(room_id__in=rooms)
+    if room_id is not None:
+        messages = messages.filter(room_id=room_id)
+    for word in re.findall(r'\w+', query):
+        messages = messages.filter(content__icontains=word)
+
+    hits = list(messages.order_by('-id')[:limit])
+    for hit in hits:
+        hit.rank = None
+        hit.snippet = hit.content
+    return hits
@@ -1,8 +1,9 @@
+from django.urls import reverse
 from rest_framework import serializers
 
 from users.models import User
 
-from .models import Message, ChatRoom
+from .models import Message, ChatRoom, ChatMembership, StatusUpdate
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -64,3 +65,105 @@ class ChatRoomSerialzer(serializers.ModelSerializer):
             return str(obj.user2)
         else:
             return str(obj.user1)
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """
+        Serializer for a user's chat room membership, as listed in their inbox.
+
+        Expects memberships fetched with their room, the room's users and last message selected,
+        so serializing an inbox performs no further queries.
+
+        Attributes:
+            id (UUIDField): The ID of the chat room.
+            other_user (SerializerMethodField): The ID and name of the other participant of a direct chat, or None.
+            course (SerializerMethodField): The ID and name of the course of a course room, or None.
+            last_message (SerializerMethodField): A preview of the most recent message in the room, or None.
+            last_activity (DateTimeField): The date and time of the most recent message in the room.
+            unread_count (IntegerField): The number of messages from others the user has not read yet.
+    """
+    PREVIEW_LENGTH = 100
+
+    id = serializers.UUIDField(source='room.id', read_only=True)
+    other_user = serializers.SerializerMethodField()
+    course = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    last_activity = serializers.DateTimeField(
+        source='room.last_activity', read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ChatMembership
+        fields = ['id', 'other_user', 'course', 'last_message',
+                  'last_activity', 'unread_count']
+
+    def get_other_user(self, obj):
+        room = obj.room
+        if room.course_id is not None:
+            return None
+        other = room.user2 if room.user1_id == obj.user_id else room.user1
+        return {'id': other.pk, 'name': str(other)}
+
+    def get_course(self, obj):
+        course = obj.room.course
+        if course is None:
+            return None
+        return {'id': course.pk, 'name': course.name}
+
+    def get_last_message(self, obj):
+        message = obj.room.last_message
+        if message is None:
+            return None
+
+        return {
+            'id': message.pk,
+            'sender': message.sender_id,
+            'content': message.content[:self.PREVIEW_LENGTH],
+            'timestamp': serializers.DateTimeField().to_representation(message.timestamp),
+        }
+
+
+class SearchHitSerializer(serializers.ModelSerializer):
+    """
+        Serializer for a message matching a chat search.
+
+        Attributes:
+            room (UUIDField): The ID of the chat room the message belongs to.
+            sender (IntegerField): The ID of the sender of the message.
+            snippet (CharField): The matching part of the message, search terms wrapped in square brackets.
+            rank (FloatField): The BM25 score of the hit, lower is better, or None without a full-text index.
+            history (SerializerMethodField): The URL of the room history centered on the message.
+    """
+    room = serializers.UUIDField(source='room_id', read_only=True)
+    sender = serializers.IntegerField(source='sender_id', read_only=True)
+    snippet = serializers.CharField(read_only=True)
+    rank = serializers.FloatField(read_only=True, allow_null=True)
+    history = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Message
+        fields = ['id', 'room', 'sender', 'content', 'snippet', 'timestamp', 'rank', 'history']
+
+    def get_history(self, obj):
+        url = reverse('chat_history', kwargs={'room_id': obj.room_id})
+        return '{}?around={}'.format(url, obj.pk)
+
+
+class StatusUpdateSerializer(serializers.ModelSerializer):
+    """
+        Serializer for the StatusUpdate model.
+
+        Expects status updates fetched with their author selected.
+
+        Attributes:
+            user (SerializerMethodField): The ID and name of the author of the status update.
+    """
+    user = serializers.SerializerMethodField()
+
+    class Meta:
+        model = StatusUpdate
+        fields = ['id', 'user', 'content', 'posted_at']
+        read_only_fields = ['id', 'posted_at']
+
+    def get_user(self, obj):
+        return {'id': obj.user_id, 'name': str(obj.user)}
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Course, CourseStudent
+
+from .membership import invalidate_course_members
+from .models import ChatMembership, ChatRoom
+from .rooms import room_cache
+
+
+@receiver(post_delete, sender=ChatRoom)
+def evict_deleted_room(sender, instance, **kwargs):
+    """
+        Drops a deleted chat room from the room cache so new connections recreate it.
+    """
+    room_cache.evict_room(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    """
+        Invalidates the cached members of a course whose teacher may have changed,
+        making sure the current teacher belongs to the course room, if any.
+    """
+    if created:
+        return
+
+    invalidate_course_members(instance.pk)
+    room_id = ChatRoom.objects.filter(course_id=instance.pk).values_list('pk', flat=True).first()
+    if room_id is not None:
+        ChatMembership.objects.get_or_create(room_id=room_id, user_id=instance.teacher_id)
+
+
+@receiver(post_save, sender=CourseStudent)
+def student_enrolled(sender, instance, created, **kwargs):
+    """
+        Adds a newly enrolled student to the course room, if any, and invalidates the cached members.
+    """
+    invalidate_course_members(instance.course_id)
+    if not created:
+        return
+
+    room_id = ChatRoom.objects.filter(course_id=instance.course_id).values_list('pk', flat=True).first()
+    if room_id is not None:
+        ChatMembership.objects.get_or_create(room_id=room_id, user_id=instance.student_id)
+
+
+@receiver(post_delete, sender=CourseStudent)
+def student_removed(sender, instance, **kwargs):
+    """
+        Removes a student leaving a course from its room and invalidates the cached members.
+    """
+    invalidate_course_members(instance.course_id)
+    ChatMembership.objects.filter(
+        room__course_id=instance.course_id, user_id=instance.student_id).delete()
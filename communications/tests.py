@@ -1,28 +1,60 @@
+import asyncio
 import json
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 from uuid import uuid4
 
+import msgpack
+
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import TestCase
-from rest_framework.test import APITestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
 from rest_framework.authtoken.models import Token
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.testing import WebsocketCommunicator
 from channels.routing import ProtocolTypeRouter, URLRouter
 
+from courses.models import Course, CourseStudent
 from users.models import User
 
-from .models import ChatRoom, Message
+from .archive import archive_messages, unpack_block
+from .codecs import Encoded, JsonCodec, MessagePackCodec, encode_frames, negotiate_codec
+from .consumers import ChatConsumer, MultiplexChatConsumer, group_send
+from .db import database_executor, shutdown_executor
+from .feed import post_status
+from .layers import UnixSocketChannelLayer
+from .outbound import OutboundQueue, outbound_stats
+from .presence import PresenceRegistry, presence
+from .models import ArchivedMessageBlock, ChatRoom, ChatMembership, Message, TimelineEntry
+from .membership import course_member_ids
+from .rooms import resolve_course_room, resolve_room, room_cache, room_group_name
 from .routing import websocket_urlpatterns
+from .serializers import MessageSerializer
 from .token_auth_middleware import TokenAuthMiddleware
+from .views import StatusFeed
 
 
-class ChatTests(TestCase):
+class ChatTests(TransactionTestCase):
     """
         Test suite for chat functionality in a Django Channels application.
 
         This class tests the WebSocket communication for sending and receiving messages
         in a chat application, ensuring that the token authentication middleware and message
         handling are working as expected.
+
+        Database work of the consumer runs on the executor threads, each with its own connection,
+        so test data has to be committed rather than kept in a per-test transaction. Outside of a
+        transaction their reads go to the read connection.
     """
+    databases = {'default', 'read'}
 
     def setUp(self):
         """
@@ -31,6 +63,7 @@ class ChatTests(TestCase):
             Creates two users and generates a token for one of them to simulate authenticated
             WebSocket connections. Also, prepares a sample message payload to be used in the tests.
         """
+        room_cache.clear()
         self.user1 = User.objects.create(
             username='student', password='pass', first_name='User1', last_name='student', user_type=User.UserType.STUDENT)
         self.token = Token.objects.create(user=self.user1)
@@ -75,6 +108,498 @@ class ChatTests(TestCase):
         self.assertEqual(data['content'], self.message['msg'])
         await communicator.disconnect()
 
+    def get_communicator(self, receiver_id, token=None):
+        """
+            Returns a communicator connected through the token authentication middleware,
+            as user1 unless another token is given.
+        """
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        return WebsocketCommunicator(
+            app, 'ws/chat/{}/?token={}'.format(receiver_id, token or self.token))
+
+    @override_settings(CHAT_READ_RECEIPT_DELAY=0.1)
+    async def test_read_receipts_are_coalesced(self):
+        """
+            Test that several read frames sent in quick succession produce a single read receipt
+            and a single advance of the reader's cursor.
+        """
+        room_id, _ = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        messages = [await database_sync_to_async(Message.objects.create)(
+            sender=self.user2, room_id=room_id, content=str(i)) for i in range(3)]
+
+        communicator = self.get_communicator(self.user2.pk)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        for message in messages:
+            await communicator.send_to(text_data=json.dumps(
+                {'type': 'read', 'message_id': message.pk}))
+
+        receipt = json.loads(await communicator.receive_from())
+        self.assertEqual(receipt, {
+            'type': 'read', 'user': self.user1.pk, 'message_id': messages[-1].pk})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+
+        membership = await database_sync_to_async(ChatMembership.objects.get)(
+            room_id=room_id, user=self.user1)
+        self.assertEqual(membership.last_read_message_id, messages[-1].pk)
+        self.assertEqual(membership.unread_count, 0)
+        await communicator.disconnect()
+
+    async def test_presence_announced_to_room(self):
+        """
+            Test that users learn about the presence of the other member, whether they connect
+            before or after them, and that leaving the room is announced.
+        """
+        token2 = await database_sync_to_async(Token.objects.create)(user=self.user2)
+
+        first = self.get_communicator(self.user2.pk)
+        await first.connect()
+        second = self.get_communicator(self.user1.pk, token2)
+        await second.connect()
+
+        # The connected user hears about the new one, and the new one gets a reply to its query.
+        self.assertEqual(json.loads(await first.receive_from()), {
+                         'type': 'presence', 'user': self.user2.pk, 'online': True})
+        self.assertEqual(json.loads(await second.receive_from()), {
+                         'type': 'presence', 'user': self.user1.pk, 'online': True})
+
+        await second.disconnect()
+        self.assertEqual(json.loads(await first.receive_from()), {
+                         'type': 'presence', 'user': self.user2.pk, 'online': False})
+        await first.disconnect()
+
+    async def test_leaving_one_room_announced_while_in_another(self):
+        """
+            Test that closing the connection to a room announces the user offline there, even though
+            another connection of theirs stays in a different room.
+        """
+        token2 = await database_sync_to_async(Token.objects.create)(user=self.user2)
+        course = await database_sync_to_async(Course.objects.create)(teacher=self.user2, name="Course")
+        await database_sync_to_async(CourseStudent.objects.create)(course=course, student=self.user1)
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        course_room = WebsocketCommunicator(app, 'ws/chat/course/{}/?token={}'.format(course.pk, self.token))
+        self.assertTrue((await course_room.connect())[0])
+        direct = self.get_communicator(self.user2.pk)
+        await direct.connect()
+        watcher = self.get_communicator(self.user1.pk, token2)
+        await watcher.connect()
+        self.assertEqual(json.loads(await watcher.receive_from()), {
+                         'type': 'presence', 'user': self.user1.pk, 'online': True})
+
+        await direct.disconnect()
+        self.assertEqual(json.loads(await watcher.receive_from()), {
+                         'type': 'presence', 'user': self.user1.pk, 'online': False})
+
+        await watcher.disconnect()
+        await course_room.disconnect()
+
+    async def test_msgpack_subprotocol(self):
+        """
+            Test that clients offering the MessagePack subprotocol exchange binary frames
+            with integer timestamps.
+        """
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(
+            app, 'ws/chat/{}/?token={}'.format(self.user2.pk, self.token),
+            subprotocols=[MessagePackCodec.subprotocol])
+        connected, subprotocol = await communicator.connect()
+
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, MessagePackCodec.subprotocol)
+
+        await communicator.send_to(bytes_data=msgpack.packb(self.message))
+        data = msgpack.unpackb(await communicator.receive_from(), raw=False)
+
+        self.assertEqual(data['content'], self.message['msg'])
+        self.assertIsInstance(data['timestamp'], int)
+        await communicator.disconnect()
+
+    async def test_course_room_fan_out(self):
+        """
+            Test that the members of a course share its room and that other users cannot join it.
+        """
+        await database_sync_to_async(cache.clear)()
+        course = await database_sync_to_async(Course.objects.create)(
+            name='Course', teacher=self.user2)
+        await database_sync_to_async(CourseStudent.objects.create)(
+            student=self.user1, course=course)
+        outsider = await database_sync_to_async(User.objects.create)(
+            username='outsider', password='pass', user_type=User.UserType.STUDENT)
+        outsider_token = await database_sync_to_async(Token.objects.create)(user=outsider)
+        teacher_token = await database_sync_to_async(Token.objects.create)(user=self.user2)
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        path = 'ws/chat/course/{}/?token={}'
+
+        rejected = WebsocketCommunicator(app, path.format(course.pk, outsider_token))
+        connected, _ = await rejected.connect()
+        self.assertFalse(connected)
+
+        student = WebsocketCommunicator(app, path.format(course.pk, self.token))
+        teacher = WebsocketCommunicator(app, path.format(course.pk, teacher_token))
+        self.assertTrue((await student.connect())[0])
+        self.assertTrue((await teacher.connect())[0])
+        await student.receive_from()
+        await teacher.receive_from()
+
+        await student.send_to(text_data=json.dumps(self.message))
+        for communicator in (student, teacher):
+            data = json.loads(await communicator.receive_from())
+            self.assertEqual(data['content'], self.message['msg'])
+
+        await student.disconnect()
+        await teacher.disconnect()
+
+    @override_settings(CHAT_TYPING_TIMEOUT=0.2)
+    async def test_typing_indicator_is_debounced(self):
+        """
+            Test that a burst of keystrokes produces one typing start and one typing end broadcast.
+        """
+        token2 = await database_sync_to_async(Token.objects.create)(user=self.user2)
+
+        typist = self.get_communicator(self.user2.pk)
+        await typist.connect()
+        watcher = self.get_communicator(self.user1.pk, token2)
+        await watcher.connect()
+        await typist.receive_from()
+        await watcher.receive_from()
+
+        for _ in range(5):
+            await typist.send_to(text_data=json.dumps({'type': 'typing'}))
+
+        self.assertEqual(json.loads(await watcher.receive_from()), {
+                         'type': 'typing', 'user': self.user1.pk, 'typing': True})
+        self.assertEqual(json.loads(await watcher.receive_from()), {
+                         'type': 'typing', 'user': self.user1.pk, 'typing': False})
+        self.assertTrue(await watcher.receive_nothing(timeout=0.3))
+
+        await typist.disconnect()
+        await watcher.disconnect()
+
+    @override_settings(CHAT_SYNC_BATCH_SIZE=2)
+    async def test_missed_messages_replayed_on_reconnect(self):
+        """
+            Test that a client reconnecting with its last seen message receives only the messages
+            it missed, in batches, before live messages.
+        """
+        room_id, _ = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        messages = [await database_sync_to_async(Message.objects.create)(
+            sender=self.user2, room_id=room_id, content=str(i)) for i in range(5)]
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(app, 'ws/chat/{}/?token={}&last_seen={}'.format(
+            self.user2.pk, self.token, messages[1].pk))
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        first = json.loads(await communicator.receive_from())
+        self.assertEqual([message['content'] for message in first['messages']], ['2', '3'])
+        self.assertTrue(first['more'])
+        last = json.loads(await communicator.receive_from())
+        self.assertEqual([message['content'] for message in last['messages']], ['4'])
+        self.assertFalse(last['more'])
+        self.assertFalse(last['truncated'])
+
+        await communicator.send_to(text_data=json.dumps(self.message))
+        self.assertEqual(json.loads(await communicator.receive_from())['content'], self.message['msg'])
+        await communicator.disconnect()
+
+    @override_settings(CHAT_SYNC_BATCH_SIZE=2, CHAT_SYNC_MAX_MESSAGES=3)
+    async def test_replay_is_bounded(self):
+        """
+            Test that a replay requested in the first frame stops after the maximum number of messages
+            and tells the client its view is truncated.
+        """
+        room_id, _ = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        for i in range(5):
+            await database_sync_to_async(Message.objects.create)(
+                sender=self.user2, room_id=room_id, content=str(i))
+
+        communicator = self.get_communicator(self.user2.pk)
+        await communicator.connect()
+        await communicator.send_to(text_data=json.dumps({'type': 'sync', 'last_seen': 0}))
+
+        self.assertEqual(len(json.loads(await communicator.receive_from())['messages']), 2)
+        last = json.loads(await communicator.receive_from())
+        self.assertEqual([message['content'] for message in last['messages']], ['2'])
+        self.assertTrue(last['truncated'])
+        self.assertFalse(last['more'])
+        await communicator.disconnect()
+
+    def broadcast_during_replay(self, consumer_class, room_id, group_name):
+        """
+            Patches the replay query of a consumer class so that, the first time it runs, another user posts a
+            message to the room, broadcast before the query reads it.
+        """
+        original = consumer_class.load_missed_messages
+        posted = []
+
+        async def load_missed_messages(consumer, *args):
+            if not posted:
+                message = await database_sync_to_async(Message.objects.create)(
+                    sender=self.user2, room_id=room_id, content='live')
+                data = await database_sync_to_async(lambda: MessageSerializer(message).data)()
+                posted.append(data)
+                await group_send(consumer.channel_layer, group_name, {
+                    'type': 'chat_message', 'room': str(room_id), 'message': data, 'frames': encode_frames(data)})
+            return await original(consumer, *args)
+
+        return patch.object(consumer_class, 'load_missed_messages', load_missed_messages)
+
+    async def test_message_broadcast_during_replay_sent_once(self):
+        """
+            Test that a message broadcast between joining the room and the replay query arrives only once.
+        """
+        room_id, group_name = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        first = await database_sync_to_async(Message.objects.create)(
+            sender=self.user2, room_id=room_id, content='missed')
+
+        communicator = WebsocketCommunicator(
+            TokenAuthMiddleware(URLRouter(websocket_urlpatterns)),
+            'ws/chat/{}/?token={}&last_seen={}'.format(self.user2.pk, self.token, first.pk - 1))
+        with self.broadcast_during_replay(ChatConsumer, room_id, group_name):
+            await communicator.connect()
+            replay = json.loads(await communicator.receive_from())
+
+        self.assertEqual([message['content'] for message in replay['messages']], ['missed', 'live'])
+        self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+        await communicator.disconnect()
+
+    async def receive_event(self, communicator, event_type):
+        """
+            Receives frames from a multiplexed connection until an event of the given type, returning the frame.
+        """
+        while True:
+            frame = json.loads(await communicator.receive_from())
+            event = frame.get('event', frame)
+            if event.get('type', 'message') == event_type and ('content' in event or event_type != 'message'):
+                return frame
+
+    async def test_multiplexed_rooms(self):
+        """
+            Test that a single multiplexed connection joins a direct chat and a course room, receives
+            the events of both framed with their room, and posts to them.
+        """
+        token2 = await database_sync_to_async(Token.objects.create)(user=self.user2)
+        course = await database_sync_to_async(Course.objects.create)(teacher=self.user2, name="Course")
+        await database_sync_to_async(CourseStudent.objects.create)(course=course, student=self.user1)
+        direct, course_key = 'user:{}'.format(self.user2.pk), 'course:{}'.format(course.pk)
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        multiplexed = WebsocketCommunicator(app, 'ws/chat/?token={}'.format(self.token))
+        connected, _ = await multiplexed.connect()
+        self.assertTrue(connected)
+        for key in (direct, course_key, 'course:999'):
+            await multiplexed.send_to(text_data=json.dumps({'type': 'subscribe', 'room': key}))
+        self.assertEqual(json.loads(await multiplexed.receive_from()), {'type': 'subscribed', 'room': direct})
+        self.assertEqual(json.loads(await multiplexed.receive_from()), {'type': 'subscribed', 'room': course_key})
+        self.assertEqual(json.loads(await multiplexed.receive_from()),
+                         {'type': 'error', 'room': 'course:999', 'error': 'forbidden'})
+
+        # The single-room connection of the other user learns the multiplexed user is present.
+        single = self.get_communicator(self.user1.pk, token2)
+        await single.connect()
+        self.assertEqual(json.loads(await single.receive_from()), {
+                         'type': 'presence', 'user': self.user1.pk, 'online': True})
+
+        await single.send_to(text_data=json.dumps({'msg': 'direct'}))
+        self.assertEqual(json.loads(await single.receive_from())['content'], 'direct')
+        frame = await self.receive_event(multiplexed, 'message')
+        self.assertEqual((frame['room'], frame['event']['content']), (direct, 'direct'))
+
+        await multiplexed.send_to(text_data=json.dumps({'type': 'message', 'room': course_key, 'msg': 'course'}))
+        frame = await self.receive_event(multiplexed, 'message')
+        self.assertEqual((frame['room'], frame['event']['content']), (course_key, 'course'))
+
+        await multiplexed.send_to(text_data=json.dumps({'type': 'unsubscribe', 'room': direct}))
+        self.assertEqual(json.loads(await single.receive_from()), {
+                         'type': 'presence', 'user': self.user1.pk, 'online': False})
+        await multiplexed.send_to(text_data=json.dumps({'type': 'message', 'room': direct, 'msg': 'x'}))
+        self.assertEqual(json.loads(await multiplexed.receive_from()),
+                         {'type': 'error', 'room': direct, 'error': 'not_subscribed'})
+
+        await single.disconnect()
+        await multiplexed.disconnect()
+
+    async def test_multiplexed_presence_expires(self):
+        """
+            Test that a multiplexed connection going silent is announced away in its rooms after the
+            presence TTL, and present again on its next heartbeat.
+        """
+        token2 = await database_sync_to_async(Token.objects.create)(user=self.user2)
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+        with patch.object(presence, 'ttl', 0.2):
+            multiplexed = WebsocketCommunicator(app, 'ws/chat/?token={}'.format(self.token))
+            self.assertTrue((await multiplexed.connect())[0])
+            await multiplexed.send_to(text_data=json.dumps(
+                {'type': 'subscribe', 'room': 'user:{}'.format(self.user2.pk)}))
+            await multiplexed.receive_from()
+
+            single = self.get_communicator(self.user1.pk, token2)
+            await single.connect()
+            self.assertEqual(json.loads(await single.receive_from()), {
+                             'type': 'presence', 'user': self.user1.pk, 'online': True})
+
+            self.assertEqual(json.loads(await single.receive_from(timeout=1)), {
+                             'type': 'presence', 'user': self.user1.pk, 'online': False})
+
+            await multiplexed.send_to(text_data=json.dumps({'type': 'heartbeat'}))
+            self.assertEqual(json.loads(await single.receive_from()), {
+                             'type': 'presence', 'user': self.user1.pk, 'online': True})
+
+            await single.disconnect()
+            await multiplexed.disconnect()
+
+    @override_settings(CHAT_READ_RECEIPT_DELAY=0.1)
+    async def test_multiplexed_read_receipts_are_coalesced(self):
+        """
+            Test that read frames sent in quick succession to a multiplexed room produce a single read
+            receipt and a single advance of the reader's cursor.
+        """
+        room_id, _ = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        messages = [await database_sync_to_async(Message.objects.create)(
+            sender=self.user2, room_id=room_id, content=str(i)) for i in range(3)]
+        key = 'user:{}'.format(self.user2.pk)
+
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        multiplexed = WebsocketCommunicator(app, 'ws/chat/?token={}'.format(self.token))
+        self.assertTrue((await multiplexed.connect())[0])
+        await multiplexed.send_to(text_data=json.dumps({'type': 'subscribe', 'room': key}))
+        await multiplexed.receive_from()
+
+        with patch.object(ChatMembership, 'mark_read', wraps=ChatMembership.mark_read) as mark_read:
+            for message in messages:
+                await multiplexed.send_to(text_data=json.dumps(
+                    {'type': 'read', 'room': key, 'message_id': message.pk}))
+
+            frame = await self.receive_event(multiplexed, 'read')
+            self.assertEqual(frame, {'room': key, 'event': {
+                'type': 'read', 'user': self.user1.pk, 'message_id': messages[-1].pk}})
+            self.assertTrue(await multiplexed.receive_nothing(timeout=0.3))
+        self.assertEqual(mark_read.call_count, 1)
+
+        membership = await database_sync_to_async(ChatMembership.objects.get)(
+            room_id=room_id, user=self.user1)
+        self.assertEqual(membership.last_read_message_id, messages[-1].pk)
+        await multiplexed.disconnect()
+
+    async def test_multiplexed_replay_sent_once(self):
+        """
+            Test that a message broadcast between subscribing to a room and its replay query arrives only once.
+        """
+        room_id, group_name = await database_sync_to_async(resolve_room)(self.user1.pk, self.user2.pk)
+        first = await database_sync_to_async(Message.objects.create)(
+            sender=self.user2, room_id=room_id, content='missed')
+        key = 'user:{}'.format(self.user2.pk)
+
+        communicator = WebsocketCommunicator(
+            TokenAuthMiddleware(URLRouter(websocket_urlpatterns)), 'ws/chat/?token={}'.format(self.token))
+        await communicator.connect()
+        with self.broadcast_during_replay(MultiplexChatConsumer, room_id, group_name):
+            await communicator.send_to(text_data=json.dumps(
+                {'type': 'subscribe', 'room': key, 'last_seen': first.pk - 1}))
+            self.assertEqual(json.loads(await communicator.receive_from()), {'type': 'subscribed', 'room': key})
+            replay = json.loads(await communicator.receive_from())
+
+        self.assertEqual(replay['room'], key)
+        self.assertEqual([message['content'] for message in replay['event']['messages']], ['missed', 'live'])
+        self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+        await communicator.disconnect()
+
+    async def test_multiplexed_requires_authentication(self):
+        app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(app, 'ws/chat/?token=invalid')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+class RoomResolutionTests(TestCase):
+    """
+        Test suite for the resolution of chat rooms used by websocket connections.
+
+        Verifies that rooms are shared by both users regardless of connection order, that repeated
+        resolutions are served from the room cache, and that deleted rooms are evicted from it.
+    """
+
+    def setUp(self):
+        room_cache.clear()
+        self.user1 = User.objects.create_user(
+            'user1', 'user1@example.com', 'password123')
+        self.user2 = User.objects.create_user(
+            'user2', 'user2@example.com', 'password123')
+
+    def test_same_room_for_both_users(self):
+        room_id, group_name = resolve_room(self.user2.pk, self.user1.pk)
+        other_room_id, _ = resolve_room(self.user1.pk, self.user2.pk)
+
+        self.assertEqual(room_id, other_room_id)
+        self.assertEqual(group_name, room_group_name(room_id))
+        self.assertEqual(ChatRoom.objects.count(), 1)
+
+    def test_cached_resolution_skips_database(self):
+        resolve_room(self.user1.pk, self.user2.pk)
+
+        with self.assertNumQueries(0):
+            resolve_room(self.user2.pk, self.user1.pk)
+
+    def test_missing_receiver(self):
+        with self.assertRaises(User.DoesNotExist):
+            resolve_room(self.user1.pk, self.user2.pk + 100)
+
+    def test_deleted_room_is_evicted(self):
+        room_id, _ = resolve_room(self.user1.pk, self.user2.pk)
+        ChatRoom.objects.filter(pk=room_id).delete()
+
+        new_room_id, _ = resolve_room(self.user1.pk, self.user2.pk)
+        self.assertNotEqual(room_id, new_room_id)
+
+    def test_cache_is_bounded(self):
+        room_cache.max_size, max_size = 1, room_cache.max_size
+        try:
+            user3 = User.objects.create_user(
+                'user3', 'user3@example.com', 'password123')
+            resolve_room(self.user1.pk, self.user2.pk)
+            resolve_room(self.user1.pk, user3.pk)
+            self.assertEqual(len(room_cache), 1)
+        finally:
+            room_cache.max_size = max_size
+
+
+class DatabaseExecutorTests(TestCase):
+    """
+        Test suite for the database executor running the chat consumers' database work.
+    """
+
+    def tearDown(self):
+        shutdown_executor()
+
+    @override_settings(CHAT_DB_EXECUTOR_WORKERS=4)
+    async def test_calls_run_concurrently(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        @database_executor
+        def wait_for_others():
+            barrier.wait()
+            return threading.current_thread().name
+
+        names = await asyncio.gather(*(wait_for_others() for _ in range(4)))
+
+        # All four calls were in flight at once, each on its own pool thread.
+        self.assertEqual(len(set(names)), 4)
+        self.assertTrue(all(name.startswith('chat-db') for name in names))
+
+    @override_settings(CHAT_DB_EXECUTOR_WORKERS=0)
+    async def test_disabled_pool_uses_shared_thread(self):
+        @database_executor
+        def thread_name():
+            return threading.current_thread().name
+
+        name = await thread_name()
+        self.assertFalse(name.startswith('chat-db'))
+
 
 class ChatHistoryTests(APITestCase):
     """
@@ -126,3 +651,634 @@ class ChatHistoryTests(APITestCase):
         url = reverse('chat_history', kwargs={'room_id': non_existing_id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
+
+    async def test_async_history(self):
+        headers = {'Authorization': 'Token ' + (await Token.objects.acreate(user=self.user1)).key}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['content'] for message in response.json()], ["Hello, World!", "Hi there!"])
+
+        headers = {'Authorization': 'Token ' + (await Token.objects.acreate(user=self.user3)).key}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+
+class ChatInboxTests(APITestCase):
+    """
+        Test suite for the inbox listing a user's chat rooms.
+
+        Verifies the ordering of rooms by latest activity, the last message preview, the unread counts
+        derived from the members' read cursors, and that the inbox is served by a single query.
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            'user1', 'user1@example.com', 'password123', first_name='First', last_name='User')
+        self.user2 = User.objects.create_user(
+            'user2', 'user2@example.com', 'password123', first_name='Second', last_name='User')
+        self.user3 = User.objects.create_user(
+            'user3', 'user3@example.com', 'password123', first_name='Third', last_name='User')
+
+        self.room1 = ChatRoom.objects.create(user1=self.user1, user2=self.user2)
+        self.room2 = ChatRoom.objects.create(user1=self.user1, user2=self.user3)
+
+        Message.objects.create(
+            sender=self.user2, room=self.room1, content="Hello")
+        Message.objects.create(
+            sender=self.user3, room=self.room2, content="Hi")
+        self.last = Message.objects.create(
+            sender=self.user2, room=self.room1, content="Are you there?")
+
+        self.url = reverse('chat_inbox')
+
+    def test_memberships_created_with_room(self):
+        self.assertEqual(ChatMembership.objects.filter(room=self.room1).count(), 2)
+
+    def test_inbox_ordered_by_activity(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room['id'] for room in response.data],
+                         [str(self.room1.pk), str(self.room2.pk)])
+
+        first = response.data[0]
+        self.assertEqual(first['other_user'], {
+                         'id': self.user2.pk, 'name': 'Second User'})
+        self.assertEqual(first['last_message']['id'], self.last.pk)
+        self.assertEqual(first['last_message']['content'], "Are you there?")
+        self.assertEqual(first['unread_count'], 2)
+
+    def test_unread_count_follows_read_cursor(self):
+        first = Message.objects.filter(room=self.room1).order_by('id').first()
+        ChatMembership.mark_read(self.room1.pk, self.user1.pk, first.pk)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['unread_count'], 1)
+
+    def test_own_messages_are_not_unread(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['unread_count'], 0)
+
+    def test_inbox_single_query(self):
+        self.client.force_authenticate(user=self.user1)
+
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_authentication_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+
+class ChatSearchTests(APITestCase):
+    """
+        Tests for the full-text search over chat history: index maintenance on every write path,
+        membership scoping, ranking and the cursor into the surrounding history.
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user('user1', 'user1@example.com', 'password123')
+        self.user2 = User.objects.create_user('user2', 'user2@example.com', 'password123')
+        self.user3 = User.objects.create_user('user3', 'user3@example.com', 'password123')
+
+        self.room = ChatRoom.objects.create(user1=self.user1, user2=self.user2)
+        self.other_room = ChatRoom.objects.create(user1=self.user2, user2=self.user3)
+
+        self.url = reverse('chat_search')
+        self.client.force_authenticate(user=self.user1)
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_finds_saved_and_bulk_created_messages(self):
+        Message.objects.create(sender=self.user1, room=self.room, content="The homework is due on Friday")
+        Message.objects.bulk_create([
+            Message(sender=self.user2, room=self.room, content="Homework questions go here"),
+            Message(sender=self.user2, room=self.room, content="Unrelated"),
+        ])
+
+        hits = self.search('homework')
+        self.assertEqual(len(hits), 2)
+        self.assertIn('[', hits[0]['snippet'])
+
+    def test_updates_and_deletes_are_indexed(self):
+        message = Message.objects.create(sender=self.user1, room=self.room, content="draft")
+        Message.objects.filter(pk=message.pk).update(content="final answer")
+
+        self.assertEqual(self.search('draft'), [])
+        self.assertEqual(len(self.search('final')), 1)
+
+        message.delete()
+        self.assertEqual(self.search('final'), [])
+
+    def test_only_rooms_of_the_user_are_searched(self):
+        Message.objects.create(sender=self.user2, room=self.other_room, content="secret plan")
+        Message.objects.create(sender=self.user2, room=self.room, content="public plan")
+
+        hits = self.search('plan')
+        self.assertEqual([hit['room'] for hit in hits], [str(self.room.pk)])
+        self.assertEqual(self.search('plan', room=self.other_room.pk), [])
+
+    def test_prefix_and_operators_in_query(self):
+        Message.objects.create(sender=self.user1, room=self.room, content="Recursion explained")
+
+        self.assertEqual(len(self.search('recur')), 1)
+        self.assertEqual(len(self.search('recursion OR "')), 0)
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_hits_link_to_surrounding_history(self):
+        for i in range(10):
+            Message.objects.create(sender=self.user1, room=self.room, content="message {}".format(i))
+        target = Message.objects.create(sender=self.user2, room=self.room, content="needle")
+        for i in range(10):
+            Message.objects.create(sender=self.user1, room=self.room, content="later {}".format(i))
+
+        hit = self.search('needle')[0]
+        response = self.client.get(hit['history'] + '&limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['id'] for message in response.data],
+                         list(range(target.pk - 2, target.pk + 3)))
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'q': 'x', 'room': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+        url = reverse('chat_history', kwargs={'room_id': self.room.pk})
+        self.assertEqual(self.client.get(url, {'before': 'x'}).status_code, 400)
+
+
+class ArchiveTests(APITestCase):
+    """
+        Tests for the archival of old messages into compressed blocks and for reading history across tiers.
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user('user1', 'user1@example.com', 'password123')
+        self.user2 = User.objects.create_user('user2', 'user2@example.com', 'password123')
+        self.room = ChatRoom.objects.create(user1=self.user1, user2=self.user2)
+
+        self.old = [Message.objects.create(sender=self.user1, room=self.room, content="old {}".format(i))
+                    for i in range(10)]
+        Message.objects.filter(pk__in=[message.pk for message in self.old]).update(
+            timestamp=timezone.now() - timedelta(days=365))
+        self.recent = [Message.objects.create(sender=self.user2, room=self.room, content="new {}".format(i))
+                       for i in range(3)]
+        self.ids = [message.pk for message in self.old + self.recent]
+
+        self.url = reverse('chat_history', kwargs={'room_id': self.room.pk})
+        self.client.force_authenticate(user=self.user1)
+
+    def history(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [message['id'] for message in response.data]
+
+    def test_old_messages_are_moved_to_blocks(self):
+        self.assertEqual(archive_messages(days=30, block_size=3), 10)
+
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 3)
+        blocks = ArchivedMessageBlock.objects.filter(room=self.room).order_by('first_message_id')
+        self.assertEqual([block.message_count for block in blocks], [3, 3, 3, 1])
+        self.assertEqual(unpack_block(blocks[0])[0].content, "old 0")
+
+        # Running again has nothing left to archive.
+        self.assertEqual(archive_messages(days=30, block_size=3), 0)
+
+    def test_latest_message_of_room_is_kept(self):
+        Message.objects.filter(room=self.room).update(timestamp=timezone.now() - timedelta(days=365))
+        archive_messages(days=30)
+
+        self.room.refresh_from_db()
+        self.assertEqual(list(Message.objects.filter(room=self.room)), [self.recent[-1]])
+        self.assertEqual(self.room.last_message_id, self.recent[-1].pk)
+
+    def test_history_reads_across_tiers(self):
+        archive_messages(days=30, block_size=3)
+
+        self.assertEqual(self.history(), self.ids)
+        self.assertEqual(self.history(before=self.recent[1].pk, limit=4), self.ids[7:11])
+        self.assertEqual(self.history(after=self.old[5].pk, limit=6), self.ids[6:12])
+        self.assertEqual(self.history(around=self.old[4].pk, limit=4), self.ids[2:6])
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['content'], "old 0")
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_messages', days=30, stdout=out)
+        self.assertIn("Archived 10 messages", out.getvalue())
+
+
+class StatusFeedTests(APITestCase):
+    """
+        Tests for the status update feed, fanned out on write or merged on read depending on the audience.
+    """
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'password123', user_type=User.UserType.TEACHER)
+        self.student1 = User.objects.create_user('student1', 'student1@example.com', 'password123')
+        self.student2 = User.objects.create_user('student2', 'student2@example.com', 'password123')
+        self.outsider = User.objects.create_user('outsider', 'outsider@example.com', 'password123')
+
+        self.course = Course.objects.create(teacher=self.teacher, name="Course")
+        CourseStudent.objects.create(course=self.course, student=self.student1)
+        CourseStudent.objects.create(course=self.course, student=self.student2)
+
+        self.url = reverse('status_feed')
+
+    def feed(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [status['content'] for status in response.data]
+
+    def test_feed_shows_teachers_and_classmates(self):
+        post_status(self.teacher, "Exam on Monday")
+        post_status(self.student2, "Study group tonight")
+        post_status(self.outsider, "Unrelated")
+
+        self.assertEqual(self.feed(self.student1), ["Study group tonight", "Exam on Monday"])
+        self.assertEqual(self.feed(self.outsider), ["Unrelated"])
+        self.assertEqual(TimelineEntry.objects.filter(status__user=self.teacher).count(), 3)
+
+    def test_post_and_paginate(self):
+        self.client.force_authenticate(user=self.teacher)
+        for i in range(5):
+            response = self.client.post(self.url, {'content': "Update {}".format(i)})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(self.url, {}).status_code, 400)
+
+        self.client.force_authenticate(user=self.student1)
+        page = self.client.get(self.url, {'limit': 2}).data
+        self.assertEqual([status['content'] for status in page], ["Update 4", "Update 3"])
+        self.assertEqual(page[0]['user']['id'], self.teacher.pk)
+        self.assertEqual(self.feed(self.student1, before=page[-1]['id'], limit=2), ["Update 2", "Update 1"])
+
+    @override_settings(STATUS_FEED_FANOUT_LIMIT=2)
+    def test_large_audiences_are_merged_on_read(self):
+        post_status(self.student1, "Fanned out")
+        with override_settings(STATUS_FEED_FANOUT_LIMIT=100):
+            post_status(self.student1, "Small")
+        status = post_status(self.teacher, "Broadcast")
+
+        self.assertFalse(status.fanned_out)
+        self.assertFalse(TimelineEntry.objects.filter(status=status).exists())
+        self.assertEqual(self.feed(self.student2), ["Broadcast", "Small", "Fanned out"])
+        self.assertEqual(self.feed(self.student2, before=status.pk, limit=1), ["Small"])
+        self.assertEqual(self.feed(self.outsider), [])
+
+    def test_sync_handler_matches_async(self):
+        post_status(self.teacher, "Exam on Monday")
+        post_status(self.student2, "Study group tonight")
+
+        with override_settings(ASYNC_VIEWS=False):
+            view = StatusFeed.as_view()
+        request = APIRequestFactory().get(self.url)
+        force_authenticate(request, user=self.student1)
+        response = view(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([status['content'] for status in response.data], self.feed(self.student1))
+
+
+class ReadCursorTests(TestCase):
+    """
+        Test suite for the read cursors and incremental unread counters of chat room members.
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            'user1', 'user1@example.com', 'password123')
+        self.user2 = User.objects.create_user(
+            'user2', 'user2@example.com', 'password123')
+        self.room = ChatRoom.objects.create(user1=self.user1, user2=self.user2)
+        self.messages = [Message.objects.create(
+            sender=self.user2, room=self.room, content=str(i)) for i in range(3)]
+
+    def get_membership(self, user):
+        return ChatMembership.objects.get(room=self.room, user=user)
+
+    def test_unread_count_incremented_on_write(self):
+        self.assertEqual(self.get_membership(self.user1).unread_count, 3)
+        self.assertEqual(self.get_membership(self.user2).unread_count, 0)
+
+    def test_mark_read_recounts_remaining(self):
+        self.assertTrue(ChatMembership.mark_read(
+            self.room.pk, self.user1.pk, self.messages[0].pk))
+
+        membership = self.get_membership(self.user1)
+        self.assertEqual(membership.last_read_message_id, self.messages[0].pk)
+        self.assertEqual(membership.unread_count, 2)
+
+    def test_mark_read_single_query(self):
+        with self.assertNumQueries(1):
+            ChatMembership.mark_read(
+                self.room.pk, self.user1.pk, self.messages[-1].pk)
+
+    def test_cursor_only_moves_forward(self):
+        ChatMembership.mark_read(self.room.pk, self.user1.pk, self.messages[-1].pk)
+
+        self.assertFalse(ChatMembership.mark_read(
+            self.room.pk, self.user1.pk, self.messages[0].pk))
+        self.assertEqual(self.get_membership(self.user1).unread_count, 0)
+
+    def test_cursor_requires_message_of_room(self):
+        self.assertFalse(ChatMembership.mark_read(
+            self.room.pk, self.user1.pk, self.messages[-1].pk + 100))
+        self.assertEqual(self.get_membership(self.user1).last_read_message_id, 0)
+
+    def test_mark_read_archived_message(self):
+        Message.objects.filter(pk__in=[message.pk for message in self.messages[:2]]).update(
+            timestamp=timezone.now() - timedelta(days=365))
+        archive_messages(days=30)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(ChatMembership.mark_read(self.room.pk, self.user1.pk, self.messages[1].pk))
+        membership = self.get_membership(self.user1)
+        self.assertEqual(membership.last_read_message_id, self.messages[1].pk)
+        self.assertEqual(membership.unread_count, 1)
+
+
+class UnixSocketChannelLayerTests(TestCase):
+    """
+        Test suite for the channel layer fanning out between processes over Unix domain sockets.
+
+        Each layer instance binds its own socket, so two instances sharing a directory behave like
+        two worker processes of the same host.
+    """
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.layer1 = UnixSocketChannelLayer(path=path)
+        self.layer2 = UnixSocketChannelLayer(path=path)
+
+    def tearDown(self):
+        async_to_sync(self.layer1.close)()
+        async_to_sync(self.layer2.close)()
+
+    async def test_group_send_reaches_other_process(self):
+        local = await self.layer1.new_channel()
+        remote = await self.layer2.new_channel()
+        await self.layer1.group_add('chat_room', local)
+        await self.layer2.group_add('chat_room', remote)
+
+        await self.layer1.group_send('chat_room', {'type': 'chat_message', 'message': 'hi'})
+
+        for layer, channel in [(self.layer1, local), (self.layer2, remote)]:
+            message = await asyncio.wait_for(layer.receive(channel), 1)
+            self.assertEqual(message, {'type': 'chat_message', 'message': 'hi'})
+
+    async def test_send_to_channel_of_other_process(self):
+        channel = await self.layer2.new_channel()
+
+        await self.layer1.send(channel, {'type': 'chat_message', 'frame': b'\x01\x02'})
+
+        message = await asyncio.wait_for(self.layer2.receive(channel), 1)
+        self.assertEqual(message['frame'], b'\x01\x02')
+
+    async def test_group_discard_forwarded_to_owner(self):
+        channel = await self.layer2.new_channel()
+        await self.layer2.group_add('chat_room', channel)
+        await self.layer1.group_discard('chat_room', channel)
+        await asyncio.sleep(0.05)
+
+        self.assertNotIn('chat_room', self.layer2.groups)
+
+    async def test_oversized_message_rejected(self):
+        channel = await self.layer2.new_channel()
+
+        with self.assertRaises(ValueError):
+            await self.layer1.send(channel, {'type': 'chat_message', 'message': 'x' * 2 * 1024 * 1024})
+
+
+class PresenceRegistryTests(TestCase):
+    """
+        Test suite for the per-process registry of chat connections and their heartbeats.
+    """
+
+    def setUp(self):
+        self.registry = PresenceRegistry(ttl=60)
+
+    def test_first_and_last_connection(self):
+        self.assertTrue(self.registry.connect(1, 'room.a', 'channel.a'))
+        self.assertFalse(self.registry.connect(1, 'room.a', 'channel.b'))
+
+        self.assertFalse(self.registry.disconnect(1, 'room.a', 'channel.a'))
+        self.assertTrue(self.registry.disconnect(1, 'room.a', 'channel.b'))
+        self.assertFalse(self.registry.is_online(1))
+
+    def test_last_connection_per_room(self):
+        self.assertTrue(self.registry.connect(1, 'room.a', 'channel.a'))
+        self.assertTrue(self.registry.connect(1, 'room.b', 'channel.b'))
+
+        self.assertTrue(self.registry.disconnect(1, 'room.a', 'channel.a'))
+        self.assertTrue(self.registry.is_online(1))
+        self.assertFalse(self.registry.disconnect(1, 'room.a', 'channel.a'))
+
+    def test_heartbeat_ttl(self):
+        self.registry.connect(1, 'room.a', 'channel.a')
+        self.assertEqual(self.registry.online_users(), {1})
+
+        self.registry.ttl = 0
+        self.assertFalse(self.registry.is_fresh(1, 'room.a', 'channel.a'))
+        self.assertFalse(self.registry.is_online(1))
+        self.assertEqual(len(self.registry), 1)
+
+
+class OutboundQueueTests(TestCase):
+    """
+        Test suite for the bounded queue of events sent to a chat client.
+
+        The client is simulated by a sender that blocks until released, standing in for a slow connection.
+    """
+
+    def setUp(self):
+        self.frames = []
+        self.closed = False
+        self.release = None
+
+    async def send_frames(self, events):
+        await self.release.wait()
+        self.frames.append(events)
+
+    async def close(self):
+        self.closed = True
+
+    async def fill(self, queue, count):
+        self.release = asyncio.Event()
+        queue.start()
+        for index in range(count):
+            await queue.put({'index': index})
+            # Lets the drain task pick up the first event before the rest pile up.
+            await asyncio.sleep(0)
+
+    async def test_batches_events_when_client_falls_behind(self):
+        queue = OutboundQueue(self.send_frames, self.close, max_size=10, batch_size=3)
+        await self.fill(queue, 5)
+
+        self.release.set()
+        await asyncio.sleep(0.01)
+        queue.stop()
+
+        self.assertEqual([[event['index'] for event in frame] for frame in self.frames],
+                         [[0], [1, 2, 3], [4]])
+
+    async def test_drop_oldest_policy(self):
+        dropped = outbound_stats['dropped']
+        queue = OutboundQueue(self.send_frames, self.close, max_size=2)
+        await self.fill(queue, 5)
+
+        # The first event is in flight; of the other four only the two newest fit in the queue.
+        self.release.set()
+        await asyncio.sleep(0.01)
+        queue.stop()
+
+        self.assertEqual([frame[0]['index'] for frame in self.frames], [0, 3, 4])
+        self.assertEqual(outbound_stats['dropped'] - dropped, 2)
+        self.assertFalse(self.closed)
+
+    async def test_disconnect_policy(self):
+        queue = OutboundQueue(self.send_frames, self.close,
+                              max_size=2, policy='disconnect')
+        await self.fill(queue, 5)
+
+        self.assertTrue(self.closed)
+        self.assertTrue(queue.closed)
+        self.assertEqual(len(queue), 0)
+
+    async def test_send_failure_closes_connection(self):
+        async def send_frames(events):
+            raise ConnectionResetError
+
+        failed = outbound_stats['failed']
+        queue = OutboundQueue(send_frames, self.close)
+        queue.start()
+        task = queue._task
+        with self.assertLogs('communications.outbound', 'ERROR'):
+            await queue.put({'index': 0})
+            await queue.put({'index': 1})
+            await asyncio.sleep(0.01)
+
+        self.assertTrue(self.closed)
+        self.assertTrue(queue.closed)
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(task.done())
+        self.assertIsNone(task.exception())
+        self.assertEqual(outbound_stats['failed'] - failed, 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            OutboundQueue(self.send_frames, self.close, policy='ignore')
+
+
+class CodecTests(TestCase):
+    """
+        Test suite for the wire formats of chat connections.
+    """
+
+    def test_negotiation(self):
+        self.assertIsInstance(negotiate_codec([]), JsonCodec)
+        self.assertIsInstance(negotiate_codec(['other', MessagePackCodec.subprotocol]), MessagePackCodec)
+
+    def test_msgpack_compacts_timestamps(self):
+        message = {'id': 1, 'content': 'Hi', 'timestamp': '2024-02-25T08:26:00.500000Z'}
+
+        frame = MessagePackCodec().encode([message, {'type': 'typing'}])['bytes_data']
+        decoded = msgpack.unpackb(frame, raw=False)
+
+        self.assertEqual(decoded[0]['timestamp'], 1708849560500)
+        self.assertEqual(decoded[1], {'type': 'typing'})
+        self.assertLess(len(frame), len(JsonCodec().encode([message, {'type': 'typing'}])['text_data']))
+
+    def test_msgpack_compacts_sync_timestamps(self):
+        messages = [{'id': 1, 'content': 'Hi', 'timestamp': '2024-02-25T08:26:00.500000Z'},
+                    {'id': 2, 'content': 'Bye', 'timestamp': '2024-02-25T08:27:00Z'}]
+        frame = {'type': 'sync', 'messages': messages, 'more': False, 'truncated': False}
+
+        decoded = msgpack.unpackb(MessagePackCodec().encode([frame])['bytes_data'], raw=False)
+
+        self.assertEqual([message['timestamp'] for message in decoded['messages']], [1708849560500, 1708849620000])
+        self.assertEqual(decoded['messages'][1]['content'], 'Bye')
+
+    def test_encoded_frames_are_reused(self):
+        message = {'id': 1, 'content': 'Hi', 'timestamp': '2024-02-25T08:26:00Z'}
+        encoded = Encoded(message, encode_frames(message))
+
+        batch = JsonCodec().encode([encoded, encoded])['text_data']
+        self.assertEqual(json.loads(batch), [message, message])
+
+        batch = MessagePackCodec().encode([encoded, {'type': 'typing'}])['bytes_data']
+        self.assertEqual(msgpack.unpackb(batch, raw=False)[0]['timestamp'], 1708849560000)
+
+
+class CourseRoomTests(TestCase):
+    """
+        Test suite for the chat rooms shared by the teacher and students of a course.
+
+        Verifies that memberships follow enrollments and that membership checks are served from the cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        room_cache.clear()
+        self.teacher = User.objects.create(
+            username='teacher', password='pass', user_type=User.UserType.TEACHER)
+        self.student = User.objects.create(
+            username='student', password='pass', user_type=User.UserType.STUDENT)
+        self.other_student = User.objects.create(
+            username='other', password='pass', user_type=User.UserType.STUDENT)
+        self.course = Course.objects.create(name='Course', teacher=self.teacher)
+        CourseStudent.objects.create(student=self.student, course=self.course)
+
+    def test_room_memberships(self):
+        room_id, _ = resolve_course_room(self.student.pk, self.course.pk)
+
+        self.assertEqual(
+            set(ChatMembership.objects.filter(room_id=room_id).values_list('user_id', flat=True)),
+            {self.teacher.pk, self.student.pk})
+        self.assertTrue(ChatRoom.objects.get(pk=room_id).is_member(self.teacher))
+
+    def test_non_member_rejected(self):
+        with self.assertRaises(PermissionDenied):
+            resolve_course_room(self.other_student.pk, self.course.pk)
+
+    def test_members_served_from_cache(self):
+        resolve_course_room(self.student.pk, self.course.pk)
+
+        with self.assertNumQueries(0):
+            resolve_course_room(self.teacher.pk, self.course.pk)
+            course_member_ids(self.course.pk)
+
+    def test_enrollment_updates_room(self):
+        room_id, _ = resolve_course_room(self.student.pk, self.course.pk)
+
+        enrollment = CourseStudent.objects.create(
+            student=self.other_student, course=self.course)
+        self.assertIn(self.other_student.pk, course_member_ids(self.course.pk))
+        self.assertTrue(ChatMembership.objects.filter(
+            room_id=room_id, user=self.other_student).exists())
+
+        enrollment.delete()
+        self.assertNotIn(self.other_student.pk, course_member_ids(self.course.pk))
+        self.assertFalse(ChatMembership.objects.filter(
+            room_id=room_id, user=self.other_student).exists())
+
+    def test_course_room_in_inbox(self):
+        room_id, _ = resolve_course_room(self.student.pk, self.course.pk)
+        Message.objects.create(sender=self.teacher, room_id=room_id, content='Welcome')
+
+        client = APIClient()
+        client.force_authenticate(user=self.student)
+        response = client.get(reverse('chat_inbox'))
+
+        self.assertEqual(response.data[0]['course'], {'id': self.course.pk, 'name': 'Course'})
+        self.assertIsNone(response.data[0]['other_user'])
+        self.assertEqual(response.data[0]['unread_count'], 1)
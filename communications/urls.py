@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import ChatHistory
+from .views import ChatHistory, ChatInbox, ChatSearch, StatusFeed
 
 # HTTP URL patterns for the communications app.
 urlpatterns = [
@@ -8,4 +8,19 @@ urlpatterns = [
     # This route expects a UUID as the `room_id` parameter, which identifies the chat room
     # whose message history is to be retrieved. The `ChatHistory` view handles the request.
     path('chat/<uuid:room_id>/', ChatHistory.as_view(), name='chat_history'),
+
+    # URL pattern for the inbox of the authenticated user.
+    # Lists the user's chat rooms with the other participant, a preview of the last message
+    # and the number of unread messages, most recently active first.
+    path('inbox/', ChatInbox.as_view(), name='chat_inbox'),
+
+    # URL pattern for searching the messages of the authenticated user's chat rooms.
+    # Expects the search terms in the `q` query parameter and returns ranked hits,
+    # each linking to the room history around the matching message.
+    path('search/', ChatSearch.as_view(), name='chat_search'),
+
+    # URL pattern for the status update feed of the authenticated user.
+    # GET returns the status updates of their teachers, classmates and their own, newest first;
+    # POST posts a new status update.
+    path('feed/', StatusFeed.as_view(), name='status_feed'),
 ]
@@ -1,14 +1,38 @@
-from .models import Message, ChatRoom
+from uuid import UUID
+
+from django.db.models import F
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from codecraft.async_views import AsyncAPIView
 from users.permissions import IsAuthenticated
 
+from .archive import ahistory_after, ahistory_before, history_after, history_before
+from .models import ChatRoom, ChatMembership
 from .permissions import IsMemberOfRoom
-from .serializers import MessageSerializer
+from .feed import aread_feed, post_status, read_feed
+from .search import search_messages
+from .serializers import MessageSerializer, InboxSerializer, SearchHitSerializer, StatusUpdateSerializer
+
+
+def int_param(request, name, default=None, minimum=0, maximum=None):
+    """
+        Reads an optional integer query parameter, clamped to `maximum`.
+
+        Raises:
+            ValueError: If the parameter is not an integer of at least `minimum`.
+    """
+    value = request.query_params.get(name)
+    if value is None or value == '':
+        return default
+
+    value = int(value)
+    if value < minimum:
+        raise ValueError(name)
+    return value if maximum is None else min(value, maximum)
 
 
-class ChatHistory(APIView):
+class ChatHistory(AsyncAPIView):
     """
         API view for retrieving the message history of a chat room.
 
@@ -16,6 +40,10 @@ class ChatHistory(APIView):
         to the chat history of a specific room. It utilizes custom permissions to ensure that
         only authenticated members of the specified room can retrieve its message history.
 
+        Without query parameters the whole history is returned. A page of it can be requested with a message ID
+        as cursor: `before` and `after` return the messages preceding or following it, and `around` returns the
+        message with the messages surrounding it, as linked from search hits. `limit` sets the size of the page.
+
         Attributes:
             permission_classes (list): A list of permission classes that the request must
             satisfy to access this view. Includes checks for user authentication and membership
@@ -23,6 +51,9 @@ class ChatHistory(APIView):
     """
     permission_classes = [IsAuthenticated, IsMemberOfRoom]
 
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
     def get(self, request, room_id):
         """
             Handles GET requests to retrieve the message history for a specified chat room.
@@ -43,10 +74,223 @@ class ChatHistory(APIView):
             # Perform permission checks defined in `permission_classes`.
             self.check_object_permissions(request, obj=room)
 
-            # Retrieve and serialize the messages from the specified room.
-            messages = Message.objects.filter(room=room).order_by('timestamp')
+            # Retrieve and serialize the messages from the specified room, hot and archived.
+            try:
+                messages = self.paginate(request, room.pk)
+            except ValueError:
+                return Response({"error": "Invalid cursor or limit"}, status=400)
             serializer = MessageSerializer(messages, many=True)
 
             return Response(serializer.data)
         except ChatRoom.DoesNotExist:
             return Response({"error": "Chat room not found"}, status=404)
+
+    async def aget(self, request, room_id):
+        try:
+            room = await ChatRoom.objects.aget(id=room_id)
+        except ChatRoom.DoesNotExist:
+            return Response({"error": "Chat room not found"}, status=404)
+
+        await self.acheck_object_permissions(request, room)
+
+        try:
+            messages = await self.apaginate(request, room.pk)
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit"}, status=400)
+        serializer = MessageSerializer(messages, many=True)
+
+        return Response(serializer.data)
+
+    def page(self, request):
+        """
+            Returns the limit and the `around`, `before` and `after` cursors of the requested page.
+
+            Raises:
+                ValueError: If a cursor or the limit is not a valid number.
+        """
+        limit = int_param(request, 'limit', self.PAGE_SIZE, minimum=1, maximum=self.MAX_PAGE_SIZE)
+        return limit, int_param(request, 'around'), int_param(request, 'before'), int_param(request, 'after')
+
+    def paginate(self, request, room_id):
+        """
+            Reads the messages of the room selected by the cursor query parameters.
+
+            Messages moved to archive blocks are read along with the ones still in the message table,
+            so clients page through the whole history the same way.
+
+            Returns:
+                list: The requested messages, oldest first.
+
+            Raises:
+                ValueError: If a cursor or the limit is not a valid number.
+        """
+        limit, around, before, after = self.page(request)
+
+        if around is not None:
+            older = history_before(room_id, around, limit // 2)
+            return older + history_after(room_id, around - 1, limit - limit // 2)
+        if before is not None:
+            return history_before(room_id, before, limit)
+        if after is not None:
+            return history_after(room_id, after, limit)
+
+        return history_before(room_id)
+
+    async def apaginate(self, request, room_id):
+        """
+            Asynchronous version of `paginate`.
+        """
+        limit, around, before, after = self.page(request)
+
+        if around is not None:
+            older = await ahistory_before(room_id, around, limit // 2)
+            return older + await ahistory_after(room_id, around - 1, limit - limit // 2)
+        if before is not None:
+            return await ahistory_before(room_id, before, limit)
+        if after is not None:
+            return await ahistory_after(room_id, after, limit)
+
+        return await ahistory_before(room_id)
+
+
+class ChatInbox(AsyncAPIView):
+    """
+        API view listing the chat rooms of the authenticated user, most recently active first.
+
+        Each entry includes the other participant or the course of the room, a preview of the last message and the number of unread
+        messages. The whole inbox is fetched in a single query: the latest message is denormalized on the
+        room, and unread counters are maintained on the membership as messages are sent and read.
+
+        Attributes:
+            permission_classes (list): Requires the user to be authenticated.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+            Handles GET requests to retrieve the inbox of the authenticated user.
+
+            Returns:
+                Response: Response object containing the serialized chat rooms of the user.
+        """
+        serializer = InboxSerializer(self.get_queryset(request), many=True)
+
+        return Response(serializer.data)
+
+    async def aget(self, request):
+        memberships = [membership async for membership in self.get_queryset(request)]
+        serializer = InboxSerializer(memberships, many=True)
+
+        return Response(serializer.data)
+
+    def get_queryset(self, request):
+        return ChatMembership.objects.filter(user=request.user).select_related(
+            'room__user1', 'room__user2', 'room__course', 'room__last_message'
+        ).order_by(F('room__last_activity').desc(nulls_last=True), '-room__created_at')
+
+
+class ChatSearch(APIView):
+    """
+        API view searching the messages of the chat rooms of the authenticated user.
+
+        Hits are ranked by relevance and carry the URL of the room history centered on the message, so clients
+        can jump from a hit to its context. The query is given by the `q` parameter; `room` restricts the search
+        to one room and `limit` sets the number of hits.
+
+        Attributes:
+            permission_classes (list): Requires the user to be authenticated.
+    """
+    permission_classes = [IsAuthenticated]
+
+    MAX_HITS = 50
+
+    def get(self, request):
+        """
+            Handles GET requests to search the chat history of the authenticated user.
+
+            Returns:
+                Response: Response object containing the serialized hits, best first, or a 400 response
+                if the room or the limit is invalid.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = int_param(request, 'limit', 20, minimum=1, maximum=self.MAX_HITS)
+            room = request.query_params.get('room')
+            room_id = UUID(room) if room else None
+        except ValueError:
+            return Response({"error": "Invalid room or limit"}, status=400)
+
+        hits = search_messages(request.user, query, room_id=room_id, limit=limit)
+        serializer = SearchHitSerializer(hits, many=True)
+
+        return Response(serializer.data)
+
+
+class StatusFeed(AsyncAPIView):
+    """
+        API view for the status update feed of the authenticated user.
+
+        The feed holds the status updates of the teachers of the user's courses, of their classmates and their own,
+        newest first. Most updates are copied into the timeline of each reader when posted, so reading a page of
+        the feed is a range scan of the reader's timeline from the `before` cursor.
+
+        Attributes:
+            permission_classes (list): Requires the user to be authenticated.
+    """
+    permission_classes = [IsAuthenticated]
+
+    PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    def get(self, request):
+        """
+            Handles GET requests to read a page of the feed of the authenticated user.
+
+            Returns:
+                Response: Response object containing the serialized status updates, newest first,
+                or a 400 response if the cursor or the limit is invalid.
+        """
+        try:
+            limit, before = self.page(request)
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit"}, status=400)
+
+        serializer = StatusUpdateSerializer(read_feed(request.user, before=before, limit=limit), many=True)
+
+        return Response(serializer.data)
+
+    async def aget(self, request):
+        try:
+            limit, before = self.page(request)
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit"}, status=400)
+
+        serializer = StatusUpdateSerializer(await aread_feed(request.user, before=before, limit=limit), many=True)
+
+        return Response(serializer.data)
+
+    def page(self, request):
+        """
+            Returns the limit and cursor of the requested page.
+
+            Raises:
+                ValueError: If the cursor or the limit is not a valid number.
+        """
+        limit = int_param(request, 'limit', self.PAGE_SIZE, minimum=1, maximum=self.MAX_PAGE_SIZE)
+        return limit, int_param(request, 'before')
+
+    def post(self, request):
+        """
+            Handles POST requests to post a status update as the authenticated user.
+
+            Returns:
+                Response: Response object containing the serialized status update with a 201 status,
+                or the validation errors with a 400 status.
+        """
+        serializer = StatusUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        status = post_status(request.user, serializer.validated_data['content'])
+
+        return Response(StatusUpdateSerializer(status).data, status=201)
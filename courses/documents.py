@@ -0,0 +1,228 @@
+from functools import partial
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from codecraft.coalescing import SingleFlight, aget_or_build, get_or_build
+from codecraft.compression import CachedVariants
+from codecraft.metrics import record_cache_lookup
+
+from .models import Course
+from .snapshot import catalog_snapshot, catalog_version, version_ttl, write_snapshot
+
+# Builds of course documents running in this process, by cache key.
+document_builds = SingleFlight()
+
+
+def document_version_key(course_id):
+    return 'courses:document-version:{}'.format(course_id)
+
+
+def document_key(course_id, version):
+    return 'courses:document:{}:{}'.format(course_id, version)
+
+
+class CourseDocument:
+    """
+        The serialized details of a course, as served by `CourseDetailView`, along with what its permission
+        checks need.
+
+        Attributes:
+            course_id (int): The ID of the course.
+            teacher_id (int): The ID of the teacher of the course.
+            content (bytes | memoryview): The course serialized as JSON, a view of the catalog snapshot when
+                served from it.
+            version (str): The version of the course the document was serialized from.
+    """
+
+    def __init__(self, course_id, teacher_id, content, version):
+        self.course_id = course_id
+        self.teacher_id = teacher_id
+        self.content = content
+        self.version = version
+
+    def course(self):
+        """
+            Returns an unsaved course standing for the serialized one in permission checks.
+        """
+        return Course(pk=self.course_id, teacher_id=self.teacher_id)
+
+    def response(self):
+        response = HttpResponse(self.content, content_type='application/json')
+        response.compressed_variants = CachedVariants(
+            self.content, document_key(self.course_id, self.version),
+            getattr(settings, 'COURSE_DOCUMENT_TTL', 3600))
+        return response
+
+
+def course_queryset():
+    """
+        Returns the courses with everything their serialization reads, so it runs no further query.
+
+        Courses are read from the primary database: documents are cached under the version the signals just
+        started there, and a lagging replica would cache its former content under it until the document expires.
+    """
+    return Course.objects.using('default').select_related('teacher').prefetch_related(
+        'sections__text_elements', 'sections__video_elements', 'resources')
+
+
+def render_course(course):
+    """
+        Serializes a course fetched with `course_queryset` to JSON.
+    """
+    # Imported here as the signal handlers load this module on startup, and serializers are loaded with the
+    # views, on the first request.
+    from rest_framework.renderers import JSONRenderer
+
+    from .serializers import CourseSerializer
+
+    return JSONRenderer().render(CourseSerializer(course).data)
+
+
+def build_course_document(course_id, version):
+    """
+        Serializes a course from the database.
+
+        Raises:
+            Course.DoesNotExist: If the course does not exist.
+    """
+    course = course_queryset().get(pk=course_id)
+    return CourseDocument(course.pk, course.teacher_id, render_course(course), version)
+
+
+def course_document_version(course_id, initial=None):
+    """
+        Returns the current version of the document of a course, starting a new one if the cache has none.
+
+        Versions are cached for `COURSE_VERSION_TTL` seconds, and only started for courses that exist, so
+        requests for unknown IDs leave nothing behind in the cache.
+
+        Args:
+            initial (str): The version to start, by default a new one. The cache having no version means
+                the course did not change since it was emptied, or since the version expired, so a document of
+                a known version no older than that, such as one of a recent catalog snapshot, remains current.
+
+        Raises:
+            Course.DoesNotExist: If the cache has no version and the course does not exist.
+    """
+    key = document_version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        # Checked on the primary database, where courses created a moment ago already exist.
+        if initial is None and not Course.objects.using('default').filter(pk=course_id).exists():
+            raise Course.DoesNotExist('Course matching query does not exist.')
+        version = initial or uuid4().hex
+        # Another process may have started a version meanwhile, which wins.
+        if not cache.add(key, version, version_ttl()):
+            version = cache.get(key) or version
+    return version
+
+
+async def acourse_document_version(course_id, initial=None):
+    key = document_version_key(course_id)
+    version = await cache.aget(key)
+    if version is None:
+        if initial is None and not await Course.objects.using('default').filter(pk=course_id).aexists():
+            raise Course.DoesNotExist('Course matching query does not exist.')
+        version = initial or uuid4().hex
+        if not await cache.aadd(key, version, version_ttl()):
+            version = await cache.aget(key) or version
+    return version
+
+
+def get_course_document(course_id):
+    """
+        Returns the document of a course, served from the cache when possible.
+
+        Documents are cached under the version of their course, which changes whenever the course, its
+        sections, their elements or its resources do, so a stale document is never served and the compressed
+        variants of a document are only ever built once. When a document is missing, as its course just
+        changed, the requests asking for it while it is built wait for it rather than all building it: within
+        a process they share a single build, and across processes a lock in the cache lets one of them build
+        it while the others wait for it to be cached.
+
+        Documents of the catalog snapshot, if any, are served from it as long as their course did not change
+        since it was built.
+
+        Raises:
+            Course.DoesNotExist: If the course does not exist.
+    """
+    snapshot = catalog_snapshot()
+    entry = snapshot.document(course_id) if snapshot is not None else None
+    version = course_document_version(course_id, entry[1] if entry is not None else None)
+    if entry is not None and entry[1] == version:
+        record_cache_lookup('course_documents', True)
+        return CourseDocument(course_id, entry[0], entry[2], version)
+
+    key = document_key(course_id, version)
+    document = cache.get(key)
+    record_cache_lookup('course_documents', document is not None)
+    if document is None:
+        document = document_builds.do(
+            key, get_or_build, key, partial(build_course_document, course_id, version),
+            getattr(settings, 'COURSE_DOCUMENT_TTL', 3600), getattr(settings, 'COURSE_DOCUMENT_LOCK_TIMEOUT', 10))
+    return document
+
+
+async def aget_course_document(course_id):
+    """
+        Asynchronous version of `get_course_document`, only leaving the event loop on a cache miss.
+    """
+    snapshot = catalog_snapshot()
+    entry = snapshot.document(course_id) if snapshot is not None else None
+    version = await acourse_document_version(course_id, entry[1] if entry is not None else None)
+    if entry is not None and entry[1] == version:
+        record_cache_lookup('course_documents', True)
+        return CourseDocument(course_id, entry[0], entry[2], version)
+
+    key = document_key(course_id, version)
+    document = await cache.aget(key)
+    record_cache_lookup('course_documents', document is not None)
+    if document is None:
+        document = await document_builds.ado(
+            key, aget_or_build, key, partial(sync_to_async(build_course_document), course_id, version),
+            getattr(settings, 'COURSE_DOCUMENT_TTL', 3600), getattr(settings, 'COURSE_DOCUMENT_LOCK_TIMEOUT', 10))
+    return document
+
+
+def invalidate_course_document(course_id):
+    """
+        Starts a new version of the document of a course. Entries of former versions expire on their own.
+    """
+    cache.set(document_version_key(course_id), uuid4().hex, version_ttl())
+
+
+def build_catalog_snapshot(path):
+    """
+        Writes a snapshot of the course list and of the documents of every course.
+
+        Versions are read before the courses, so a course changing while the snapshot is built is served
+        from the database until the next one. Courses are read from the primary database, as the snapshot
+        is served until it is rebuilt and must not hold the content of a lagging replica.
+
+        Returns:
+            tuple: The generation of the snapshot and its number of courses.
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .serializers import CourseSerializer
+
+    list_version = catalog_version()
+    versions = {course_id: course_document_version(course_id)
+                for course_id in Course.objects.using('default').values_list('pk', flat=True)}
+
+    renderer = JSONRenderer()
+    courses = []
+    for course in course_queryset():
+        if course.pk not in versions:
+            continue
+        row = CourseSerializer(course, context={'preview': True, 'enrolled_course_ids': ()}).data
+        # The fields depending on the user come last, and are appended to the row when it is served.
+        del row['enrolled'], row['teaching']
+        courses.append((course.pk, course.teacher_id, versions[course.pk],
+                        renderer.render(row)[:-1], render_course(course)))
+
+    return write_snapshot(path, list_version, courses), len(courses)
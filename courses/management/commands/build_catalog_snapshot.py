@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.documents import build_catalog_snapshot
+
+
+class Command(BaseCommand):
+    """
+        Compiles the course list and the details of every course into the catalog snapshot mapped by the
+        workers. The file is replaced atomically, and workers switch to the new generation on their own.
+        Meant to run after deployments and whenever the catalog changed, e.g. from a periodic job.
+    """
+    help = "Writes the catalog snapshot served by the course list and detail views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="Path of the snapshot file, by default CATALOG_SNAPSHOT_PATH.")
+
+    def handle(self, *args, **options):
+        path = options['path'] or getattr(settings, 'CATALOG_SNAPSHOT_PATH', None)
+        if not path:
+            raise CommandError("No snapshot path: set CATALOG_SNAPSHOT_PATH or pass --path.")
+
+        generation, count = build_catalog_snapshot(path)
+        self.stdout.write("Wrote {} courses to {} (generation {}).".format(count, path, generation))
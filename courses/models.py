@@ -30,6 +30,10 @@ class Course(models.Model):
         return CourseStudent.objects.filter(
             student=student, course=self).exists()
 
+    async def astudent_enrolled(self, student: User):
+        return await CourseStudent.objects.filter(
+            student=student, course=self).aexists()
+
     def is_course_teacher(self, teacher: User):
         return self.teacher == teacher
 
@@ -32,6 +32,12 @@ class IsTeacherOrEnrolledStudent(BasePermission):
 
         return obj.student_enrolled(request.user)
 
+    async def ahas_object_permission(self, request, _, obj):
+        if request.user.user_type == User.UserType.TEACHER:
+            return True
+
+        return await obj.astudent_enrolled(request.user)
+
 
 class IsCourseTeacher(BasePermission):
     """
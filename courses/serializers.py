@@ -82,9 +82,10 @@ class CourseSerializer(serializers.ModelSerializer):
                     additional computed fields for user relationship to the course.
 
         Methods:
-            get_enrolled: Checks if the user specified in the serializer's context is enrolled in the course.
+            get_enrolled: Checks if the user specified in the serializer's context is enrolled in the course,
+                          using the IDs of their courses when the context provides them as 'enrolled_course_ids'.
             get_teaching: Checks if the user specified in the serializer's context is the teacher of the course.
-            to_representation: Customizes the output representation based on 'preview' context, omitting certain fields.
+            get_fields: Omits the sections and resources in the 'preview' context, and the user's relationship otherwise.
     """
     enrolled = serializers.SerializerMethodField()
     teaching = serializers.SerializerMethodField()
@@ -102,6 +103,10 @@ class CourseSerializer(serializers.ModelSerializer):
                   'rating', 'enrolled', 'teaching', 'sections', 'resources']
 
     def get_enrolled(self, obj):
+        enrolled_course_ids = self.context.get('enrolled_course_ids', None)
+        if enrolled_course_ids is not None:
+            return obj.pk in enrolled_course_ids
+
         user_id = self.context.get('user_id', None)
         return obj.student_enrolled(user_id)
 
@@ -113,15 +118,16 @@ class CourseSerializer(serializers.ModelSerializer):
         teacher = obj.teacher
         return str(teacher)
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if (self.context.get('preview', False)):
-            data.pop('sections', None)
-            data.pop('resources', None)
+    def get_fields(self):
+        fields = super().get_fields()
+        # Fields are left out before serializing rather than dropped afterwards, so their queries are not run.
+        if self.context.get('preview', False):
+            omitted = ('sections', 'resources')
         else:
-            data.pop('enrolled', None)
-            data.pop('teaching', None)
-        return data
+            omitted = ('enrolled', 'teaching')
+        for name in omitted:
+            fields.pop(name, None)
+        return fields
 
 
 class CourseStudentSerializer(serializers.ModelSerializer):
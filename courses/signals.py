@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+
+from .documents import invalidate_course_document
+from .models import Course, Resource, Section, TextElement, VideoElement
+from .snapshot import invalidate_catalog
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    """
+        Invalidates the cached document of a course, and the course list, as the course is created, updated
+        or deleted. Created courses are invalidated too, as the cache may still hold the document of a deleted
+        course with the same ID.
+    """
+    invalidate_course_document(instance.pk)
+    invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=Section)
+@receiver([post_save, post_delete], sender=Resource)
+def course_part_changed(sender, instance, **kwargs):
+    invalidate_course_document(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=TextElement)
+@receiver([post_save, post_delete], sender=VideoElement)
+def element_changed(sender, instance, **kwargs):
+    # Elements deleted along with their section are covered by the deletion of the section.
+    course_id = Section.objects.filter(pk=instance.section_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        invalidate_course_document(course_id)
+
+
+# Fields of a teacher the documents of their courses and the course list are rendered from.
+TEACHER_RENDERED_FIELDS = frozenset(['first_name', 'last_name'])
+
+
+@receiver(post_save, sender=User)
+def teacher_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+        Invalidates the documents of the courses of a teacher, and the course list, which include their name.
+        Saves limited to other fields, such as the `last_login` update on every login, run no query.
+    """
+    if created or instance.user_type != User.UserType.TEACHER:
+        return
+    if update_fields is not None and TEACHER_RENDERED_FIELDS.isdisjoint(update_fields):
+        return
+
+    course_ids = list(Course.objects.filter(teacher_id=instance.pk).values_list('pk', flat=True))
+    for course_id in course_ids:
+        invalidate_course_document(course_id)
+    if course_ids:
+        invalidate_catalog()
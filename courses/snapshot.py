@@ -0,0 +1,256 @@
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CCATLOG1'
+
+# Magic, generation, number of courses and catalog version.
+HEADER = struct.Struct('<8sQI32s')
+
+# Course ID, teacher ID, document version, then the offset and length of the list row and of the document.
+# Entries follow the header, sorted by course ID.
+ENTRY = struct.Struct('<qq32sQIQI')
+
+CATALOG_VERSION_KEY = 'courses:catalog-version'
+
+_snapshot = None
+_checked = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def version_ttl():
+    """
+        Returns the number of seconds the versions of course documents and of the course list are cached.
+    """
+    return getattr(settings, 'COURSE_VERSION_TTL', 600)
+
+
+def catalog_version(initial=None):
+    """
+        Returns the current version of the course list, starting a new one if the cache has none.
+
+        Args:
+            initial (str): The version to start, by default a new one, as for `course_document_version`.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = initial or uuid4().hex
+        if not cache.add(CATALOG_VERSION_KEY, version, version_ttl()):
+            version = cache.get(CATALOG_VERSION_KEY) or version
+    return version
+
+
+async def acatalog_version(initial=None):
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        version = initial or uuid4().hex
+        if not await cache.aadd(CATALOG_VERSION_KEY, version, version_ttl()):
+            version = await cache.aget(CATALOG_VERSION_KEY) or version
+    return version
+
+
+def invalidate_catalog():
+    """
+        Starts a new version of the course list, which stops it being served from the snapshot.
+    """
+    cache.set(CATALOG_VERSION_KEY, uuid4().hex, version_ttl())
+
+
+class CatalogSnapshot:
+    """
+        A read-only course catalog compiled by `build_catalog_snapshot` and mapped in memory.
+
+        The file is mapped rather than read, so every worker serves the same pages of the operating system's
+        page cache instead of holding a copy of the catalog of its own, and documents are sliced out of the
+        mapping without being copied until they are written to a response.
+
+        Attributes:
+            path (str): The path of the snapshot file.
+            generation (int): The number of the snapshot, incremented every time it is rebuilt.
+            count (int): The number of courses in the snapshot.
+            catalog_version (str): The version of the course list the snapshot was built from.
+            identity (tuple): The inode and modification time of the file, telling when it is replaced.
+            built_at (float): The time the file was written at.
+
+        Raises:
+            ValueError: If the file is not a catalog snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size < HEADER.size:
+                raise ValueError("{} is not a catalog snapshot".format(self.path))
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.generation, self.count, version = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("{} is not a catalog snapshot".format(self.path))
+        self.catalog_version = version.rstrip(b'\0').decode()
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        self.built_at = stat.st_mtime
+        self.view = memoryview(self.buffer)
+
+    def is_recent(self):
+        """
+            Returns whether the snapshot was built within `COURSE_VERSION_TTL` seconds. Past it, the versions it
+            was built from may have expired from the cache along with any change made since, so its courses can
+            no longer be told current.
+        """
+        return time.time() - self.built_at < version_ttl()
+
+    def entry(self, index):
+        return ENTRY.unpack_from(self.buffer, HEADER.size + index * ENTRY.size)
+
+    def find(self, course_id):
+        """
+            Returns the entry of a course, or None if the snapshot does not hold it.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.entry(middle)
+            if entry[0] < course_id:
+                low = middle + 1
+            elif entry[0] > course_id:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def document(self, course_id):
+        """
+            Returns the (teacher ID, document version, document) of a course, or None if the snapshot does
+            not hold it. The document is a view of the mapping.
+        """
+        entry = self.find(course_id)
+        if entry is None:
+            return None
+        _, teacher_id, version, _, _, offset, length = entry
+        return teacher_id, version.rstrip(b'\0').decode(), self.view[offset:offset + length]
+
+    def course_list(self, user_id, enrolled_course_ids):
+        """
+            Returns the course list as `CourseListView` serializes it for a user, as JSON.
+        """
+        parts = [b'[']
+        for index in range(self.count):
+            course_id, teacher_id, _, offset, length, _, _ = self.entry(index)
+            if index:
+                parts.append(b',')
+            # Rows are stored without their closing brace, followed by the fields depending on the user.
+            parts.append(self.view[offset:offset + length])
+            parts.append(b',"enrolled":%s,"teaching":%s}' % (
+                b'true' if course_id in enrolled_course_ids else b'false',
+                b'true' if teacher_id == user_id else b'false'))
+        parts.append(b']')
+        return b''.join(parts)
+
+
+def read_generation(path):
+    """
+        Returns the generation of the snapshot file at a path, or 0 if there is none.
+    """
+    try:
+        with open(path, 'rb') as file:
+            magic, generation, _, _ = HEADER.unpack(file.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC else 0
+
+
+def write_snapshot(path, catalog_version, courses):
+    """
+        Writes a catalog snapshot, replacing the file at `path` atomically so workers never map a partial one.
+
+        Args:
+            path (str): The path of the snapshot file.
+            catalog_version (str): The version of the course list the snapshot is built from.
+            courses (list): The (course ID, teacher ID, document version, list row, document) of every course,
+                the row being serialized without its closing brace.
+
+        Returns:
+            int: The generation of the new snapshot.
+    """
+    courses = sorted(courses, key=lambda course: course[0])
+    generation = read_generation(path) + 1
+
+    offset = HEADER.size + len(courses) * ENTRY.size
+    entries = []
+    for course_id, teacher_id, version, row, document in courses:
+        entries.append(ENTRY.pack(
+            course_id, teacher_id, version.encode(), offset, len(row), offset + len(row), len(document)))
+        offset += len(row) + len(document)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('wb', dir=directory, prefix='.catalog-', delete=False) as file:
+        try:
+            file.write(HEADER.pack(MAGIC, generation, len(courses), catalog_version.encode()))
+            file.writelines(entries)
+            for _, _, _, row, document in courses:
+                file.write(row)
+                file.write(document)
+            file.flush()
+            os.fsync(file.fileno())
+            os.chmod(file.name, 0o644)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+    return generation
+
+
+def catalog_snapshot():
+    """
+        Returns the catalog snapshot at `CATALOG_SNAPSHOT_PATH`, or None if there is none.
+
+        The file is checked at most every `CATALOG_SNAPSHOT_CHECK_INTERVAL` seconds, and mapped again once
+        `build_catalog_snapshot` replaced it with a new generation. The former mapping stays valid for the
+        requests still reading it, and is released along with its last view. Snapshots built more than
+        `COURSE_VERSION_TTL` seconds ago are not served.
+    """
+    global _snapshot, _checked
+
+    path = getattr(settings, 'CATALOG_SNAPSHOT_PATH', None)
+    if not path:
+        return None
+
+    path = str(path)
+    snapshot = _snapshot
+    now = time.monotonic()
+    if (snapshot is not None and snapshot.path == path
+            and now - _checked < getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 1)):
+        return snapshot if snapshot.is_recent() else None
+
+    with _snapshot_lock:
+        _checked = now
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _snapshot = None
+            return None
+
+        snapshot = _snapshot
+        if snapshot is None or snapshot.path != path or snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            try:
+                loaded = CatalogSnapshot(path)
+            except (OSError, ValueError):
+                logger.exception("Could not load the catalog snapshot %s", path)
+                return snapshot if snapshot is not None and snapshot.path == path and snapshot.is_recent() else None
+
+            if snapshot is None or snapshot.path != path or loaded.generation != snapshot.generation:
+                _snapshot = loaded
+            else:
+                snapshot.identity, snapshot.built_at = loaded.identity, loaded.built_at
+        return _snapshot if _snapshot.is_recent() else None
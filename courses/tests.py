@@ -1,9 +1,27 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
+from codecraft.compression import compress
 from users.models import User
 
+from .documents import (build_course_document, document_version_key, get_course_document,
+                        invalidate_course_document)
 from .models import Course, CourseStudent, Section, TextElement, Resource
+from .snapshot import catalog_snapshot
 
 
 class CourseListViewTests(APITestCase):
@@ -56,6 +74,18 @@ class CourseListViewTests(APITestCase):
             self.assertTrue(course_data['teaching'])
             self.assertFalse(course_data['enrolled'])
 
+    async def test_async_token_authentication(self):
+        token = await Token.objects.acreate(user=self.student_user)
+        response = await self.async_client.get(self.url, headers={'Authorization': 'Token ' + token.key})
+        self.assertEqual(response.status_code, 200)
+
+        enrolled = {course['name']: course['enrolled'] for course in response.json()}
+        self.assertEqual(enrolled, {'Course 1': True, 'Course 2': False})
+        self.assertNotIn('sections', response.json()[0])
+
+        response = await self.async_client.get(self.url, headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, 401)
+
 
 class CourseDetailViewTests(APITestCase):
     """
@@ -112,6 +142,80 @@ class CourseDetailViewTests(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 401)
 
+    async def test_async_object_permissions(self):
+        for user, status in [(self.student, 200), (self.other_student, 403)]:
+            token = await Token.objects.acreate(user=user)
+            response = await self.async_client.get(self.url, headers={'Authorization': 'Token ' + token.key})
+            self.assertEqual(response.status_code, status)
+
+    def test_serialized_without_extra_queries(self):
+        self.client.force_authenticate(user=self.teacher)
+        # The course with its teacher, then its sections, their text and video elements, and its resources.
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['sections'][0]['elements'][0]['content'], 'my_element_content')
+
+    def test_document_cached_until_changed(self):
+        self.client.force_authenticate(user=self.teacher)
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['name'], 'Test Course')
+
+        self.textElement.content = 'edited'
+        self.textElement.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['sections'][0]['elements'][0]['content'], 'edited')
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_compressed_variant_cached(self):
+        self.client.force_authenticate(user=self.teacher)
+        calls = []
+        for _ in range(2):
+            with patch('codecraft.compression.compress', wraps=compress) as compressor:
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+            calls.append(compressor.call_count)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(json.loads(gzip.decompress(response.content))['name'], 'Test Course')
+        # Compressed for the first response only.
+        self.assertEqual(calls, [1, 0])
+
+    def test_teacher_renamed(self):
+        self.client.force_authenticate(user=self.teacher)
+        self.client.get(self.url)
+
+        self.teacher.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.teacher.save(update_fields=['last_login'])
+
+        self.teacher.first_name = 'Ada'
+        self.teacher.save(update_fields=['first_name'])
+        self.assertEqual(self.client.get(self.url).json()['teacher_name'], str(self.teacher))
+
+    def test_document_built_from_primary(self):
+        def lagging_replica(model, instance=None, **hints):
+            # Reads routed to the replica fail, while those on behalf of an object follow it.
+            return instance._state.db if instance is not None else 'lagging'
+
+        cache.clear()
+        with patch('codecraft.db.ReadWriteRouter.db_for_read', side_effect=lagging_replica):
+            document = get_course_document(self.course.pk)
+        self.assertEqual(json.loads(bytes(document.content))['name'], 'Test Course')
+
+    def test_unknown_course_not_cached(self):
+        self.client.force_authenticate(user=self.teacher)
+        with self.assertRaises(Course.DoesNotExist):
+            self.client.get(reverse('course_detail', kwargs={'id': self.course.pk + 1000}))
+        self.assertIsNone(cache.get(document_version_key(self.course.pk + 1000)))
+
+    @override_settings(COURSE_VERSION_TTL=0.1)
+    def test_version_expires(self):
+        invalidate_course_document(self.course.pk)
+        self.assertIsNotNone(cache.get(document_version_key(self.course.pk)))
+
+        time.sleep(0.2)
+        self.assertIsNone(cache.get(document_version_key(self.course.pk)))
+
 
 class StudentEnrollViewTests(APITestCase):
     """
@@ -245,3 +349,108 @@ class CourseViewTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.course.refresh_from_db()
         self.assertEqual(self.course.name, 'Updated Test Course')
+
+
+class CatalogSnapshotTests(APITestCase):
+    """
+        Tests that the course list and details are served from the catalog snapshot until the courses change.
+    """
+
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', password='pass', user_type=User.UserType.TEACHER)
+        self.student = User.objects.create(username='student', password='pass', user_type=User.UserType.STUDENT)
+        self.course = Course.objects.create(name='Course 1', description='Desc 1', rating=5, teacher=self.teacher)
+        self.other_course = Course.objects.create(name='Course 2', description='Desc 2', teacher=self.teacher)
+        self.section = Section.objects.create(course=self.course, name='Section', description='Description')
+        CourseStudent.objects.create(student=self.student, course=self.course)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.snapshot')
+        settings = override_settings(CATALOG_SNAPSHOT_PATH=self.path, CATALOG_SNAPSHOT_CHECK_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client.force_authenticate(user=self.student)
+
+    def test_list_matches_database(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=None):
+            expected = self.client.get(reverse('course_list')).json()
+        call_command('build_catalog_snapshot', stdout=StringIO())
+
+        # Only the courses of the student are read.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('course_list'))
+        self.assertEqual(response.json(), expected)
+
+    def test_built_from_primary(self):
+        def lagging_replica(model, instance=None, **hints):
+            return instance._state.db if instance is not None else 'lagging'
+
+        with patch('codecraft.db.ReadWriteRouter.db_for_read', side_effect=lagging_replica):
+            call_command('build_catalog_snapshot', stdout=StringIO())
+        self.assertEqual(catalog_snapshot().count, 2)
+
+    def test_detail_served_until_changed(self):
+        call_command('build_catalog_snapshot', stdout=StringIO())
+        url = reverse('course_detail', kwargs={'id': self.course.pk})
+
+        # Only the enrollment of the student is checked.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['sections'][0]['name'], 'Section')
+
+        self.section.name = 'Renamed'
+        self.section.save()
+        self.assertEqual(self.client.get(url).json()['sections'][0]['name'], 'Renamed')
+
+    def test_list_falls_back_after_change(self):
+        call_command('build_catalog_snapshot', stdout=StringIO())
+        Course.objects.create(name='Course 3', teacher=self.teacher)
+
+        response = self.client.get(reverse('course_list'))
+        self.assertEqual([course['name'] for course in response.json()], ['Course 1', 'Course 2', 'Course 3'])
+
+    def test_new_generation_reloaded(self):
+        call_command('build_catalog_snapshot', stdout=StringIO())
+        self.assertEqual(catalog_snapshot().generation, 1)
+
+        self.other_course.name = 'Renamed'
+        self.other_course.save()
+        call_command('build_catalog_snapshot', stdout=StringIO())
+
+        self.assertEqual(catalog_snapshot().generation, 2)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('course_list'))
+        self.assertEqual([course['name'] for course in response.json()], ['Course 1', 'Renamed'])
+
+    @override_settings(COURSE_VERSION_TTL=60)
+    def test_old_snapshot_not_served(self):
+        call_command('build_catalog_snapshot', stdout=StringIO())
+        built_at = time.time() - 61
+        os.utime(self.path, (built_at, built_at))
+
+        self.assertIsNone(catalog_snapshot())
+        response = self.client.get(reverse('course_detail', kwargs={'id': self.course.pk}))
+        self.assertEqual(response.json()['sections'][0]['name'], 'Section')
+
+
+class CourseDocumentCoalescingTests(APITestCase):
+    """
+        Tests that concurrent requests for a course document missing from the cache build it once.
+    """
+
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', password='pass', user_type=User.UserType.TEACHER)
+        self.course = Course.objects.create(name='Course', teacher=self.teacher)
+        self.url = reverse('course_detail', kwargs={'id': self.course.pk})
+
+    async def test_concurrent_requests_build_once(self):
+        token = await Token.objects.acreate(user=self.teacher)
+        headers = {'Authorization': 'Token ' + token.key}
+
+        with patch('courses.documents.build_course_document', wraps=build_course_document) as build:
+            responses = await asyncio.gather(*[self.async_client.get(self.url, headers=headers) for _ in range(5)])
+
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(build.call_count, 1)
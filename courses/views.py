@@ -1,16 +1,19 @@
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.generics import ListAPIView
 
+from codecraft.async_views import AsyncAPIView
 from users.models import User
 from users.permissions import IsAuthenticated, IsStudentUser, IsTeacherUser
 
+from .documents import aget_course_document, get_course_document
+from .snapshot import acatalog_version, catalog_snapshot, catalog_version
 from .models import Course, CourseStudent
 from .serializers import CourseSerializer, CourseStudentSerializer
 from .permissions import IsTeacherOrEnrolledStudent, IsCourseTeacher, IsNotEnrolledStudent
 
 
-class CourseListView(ListAPIView):
+class CourseListView(AsyncAPIView):
     """
         Provides a list view of all courses available in the system.
 
@@ -19,19 +22,44 @@ class CourseListView(ListAPIView):
             - IsStudentUser: Further restricts access to authenticated users identified as students.
 
         The view returns a list of courses with a preview context to limit the amount of detailed information returned.
+        The courses of the user are read once, rather than checked course by course. The list is served from the
+        catalog snapshot, if any, as long as no course changed since it was built.
     """
     permission_classes = [IsAuthenticated, IsStudentUser]
 
     def get(self, request):
+        enrolled = set(self.enrolled_course_ids(request))
+        snapshot = catalog_snapshot()
+        if snapshot is not None and catalog_version(snapshot.catalog_version) == snapshot.catalog_version:
+            return self.snapshot_response(request, snapshot, enrolled)
+
+        courses = Course.objects.select_related('teacher')
+        return Response(self.serialize(request, courses, enrolled))
+
+    async def aget(self, request):
+        enrolled = {course_id async for course_id in self.enrolled_course_ids(request)}
+        snapshot = catalog_snapshot()
+        if snapshot is not None and await acatalog_version(snapshot.catalog_version) == snapshot.catalog_version:
+            return self.snapshot_response(request, snapshot, enrolled)
+
+        courses = [course async for course in Course.objects.select_related('teacher')]
+        return Response(self.serialize(request, courses, enrolled))
+
+    def enrolled_course_ids(self, request):
+        return CourseStudent.objects.filter(student=request.user).values_list('course_id', flat=True)
+
+    def serialize(self, request, courses, enrolled):
         user_id: int = request.user.id
-        courses = Course.objects.all()
         serializer = CourseSerializer(
-            courses, many=True, context={'preview': True, 'user_id': user_id})
+            courses, many=True, context={'preview': True, 'user_id': user_id, 'enrolled_course_ids': enrolled})
+
+        return serializer.data
 
-        return Response(serializer.data)
+    def snapshot_response(self, request, snapshot, enrolled):
+        return HttpResponse(snapshot.course_list(request.user.id, enrolled), content_type='application/json')
 
 
-class CourseDetailView(APIView):
+class CourseDetailView(AsyncAPIView):
     """
         Provides detailed information for a specific course identified by its ID.
 
@@ -40,15 +68,21 @@ class CourseDetailView(APIView):
             - IsTeacherOrEnrolledStudent: Restricts access to the course's teacher or students who are enrolled in the course.
 
         Retrieves and serializes detailed information of a course, including sections and resources associated with it.
+        The serialized course is cached until the course changes, and so are its compressed variants.
     """
     permission_classes = [IsAuthenticated, IsTeacherOrEnrolledStudent]
 
     def get(self, request, id):
-        course = Course.objects.get(pk=id)
-        self.check_object_permissions(request, course)
-        serializer = CourseSerializer(course)
+        document = get_course_document(id)
+        self.check_object_permissions(request, document.course())
+
+        return document.response()
+
+    async def aget(self, request, id):
+        document = await aget_course_document(id)
+        await self.acheck_object_permissions(request, document.course())
 
-        return Response(serializer.data)
+        return document.response()
 
 
 class StudentEnrollView(APIView):
@@ -2,7 +2,18 @@ from .models import User
 from rest_framework.permissions import BasePermission
 
 
-class IsAuthenticated(BasePermission):
+class RequestPermission(BasePermission):
+    """
+        Base class of the permissions only checking the authenticated user of the request.
+
+        Asynchronous views call these checks on the event loop, as they never query the database.
+    """
+
+    async def ahas_permission(self, request, view):
+        return self.has_permission(request, view)
+
+
+class IsAuthenticated(RequestPermission):
     """
         Permission check for authenticated users.
 
@@ -17,7 +28,7 @@ class IsAuthenticated(BasePermission):
         return bool(request.user and request.user.is_authenticated)
 
 
-class IsStudentUser(BasePermission):
+class IsStudentUser(RequestPermission):
     """
         Permission check for student users or higher roles.
 
@@ -33,7 +44,7 @@ class IsStudentUser(BasePermission):
         return request.user.user_type in [User.UserType.STUDENT, User.UserType.TEACHER]
 
 
-class IsTeacherUser(BasePermission):
+class IsTeacherUser(RequestPermission):
     """
         Permission check for teacher users.
 
@@ -154,3 +154,10 @@ class UserFetchingTests(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
         response = self.client.get(self.list_teachers_url)
         self.assertEqual(response.status_code, 403)
+
+    async def test_async_search(self):
+        token = await Token.objects.acreate(user=self.users[0])
+        response = await self.async_client.get(
+            self.list_students_url, {'search': 'Last2'}, headers={'Authorization': 'Token ' + token.key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in response.json()], ['user2'])
@@ -1,9 +1,10 @@
 from django.db.models import Q
-from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 
+from codecraft.async_views import AsyncAPIView
+
 from .models import User
 from .permissions import IsAuthenticated, IsStudentUser, IsTeacherUser
 from .serializers import LoginSerializer, SignupSerializer, UserSerializer
@@ -89,14 +90,33 @@ class LogoutAPIView(APIView):
             return Response({"error": "Token not found"}, status=400)
 
 
-class FetchStudents(generics.ListAPIView):
+class UserListView(AsyncAPIView):
+    """
+        Base class of the views listing the users returned by `get_queryset`, on the event loop when served
+        through ASGI.
+    """
+
+    def get(self, request):
+        serializer = UserSerializer(self.get_queryset(), many=True)
+
+        return Response(serializer.data)
+
+    async def aget(self, request):
+        serializer = UserSerializer([user async for user in self.get_queryset()], many=True)
+
+        return Response(serializer.data)
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+
+class FetchStudents(UserListView):
     """
         API view for fetching a list of student users.
 
         Supports searching by username, first name, or last name.
     """
     permission_classes = [IsAuthenticated, IsStudentUser]
-    serializer_class = UserSerializer
 
     def get_queryset(self):
         """
@@ -115,20 +135,18 @@ class FetchStudents(generics.ListAPIView):
         return queryset
 
 
-class FetchTeachers(generics.ListAPIView):
+class FetchTeachers(UserListView):
     """
-        ListAPIView for fetching users designated as teachers in the system.
+        API view for fetching users designated as teachers in the system.
 
-        This view extends Django REST Framework's generics.ListAPIView to provide a list
-        of users with a user_type of TEACHER. It supports searching by username, first name,
-        or last name to allow for easy filtering of teacher records.
+        This view provides a list of users with a user_type of TEACHER, serialized with UserSerializer.
+        It supports searching by username, first name, or last name to allow for easy filtering of teacher
+        records.
 
         Attributes:
             permission_classes: Ensures that the requestor is authenticated and has a teacher user type.
-            serializer_class: Specifies the serializer to use for formatting the teacher user data.
     """
     permission_classes = [IsAuthenticated, IsTeacherUser]
-    serializer_class = UserSerializer
 
     def get_queryset(self):
         """